@@ -64,7 +64,8 @@ class Import_euronext(object):
         self.m_connection = ITradeConnection(cookies = None,
                                            proxy = itrade_config.proxyHostname,
                                            proxyAuth = itrade_config.proxyAuthentication,
-                                           connectionTimeout = itrade_config.connectionTimeout
+                                           connectionTimeout = itrade_config.connectionTimeout,
+                                           useCache = True
                                            )
 
     def name(self):
@@ -79,6 +80,11 @@ class Import_euronext(object):
     def disconnect(self):
         pass
 
+    def threadsafe(self):
+        # no state between the calls : the requests of the import workers
+        # can be in progress at the same time
+        return True
+
     def getstate(self):
         return True
 
@@ -104,17 +110,6 @@ class Import_euronext(object):
             ret = ret+val
         return string.atol(ret)
 
-    def splitLines(self,buf):
-        lines = string.split(buf, '\n')
-        lines = filter(lambda x:x, lines)
-        def removeCarriage(s):
-            if s[-1]=='\r':
-                return s[:-1]
-            else:
-                return s
-        lines = [removeCarriage(l) for l in lines]
-        return lines
-
     def getdata(self,quote,datedebut=None,datefin=None):
 
         #IdInstrument = euronext_InstrumentId(quote)
@@ -159,46 +154,47 @@ class Import_euronext(object):
         url = self.m_url + '?' + query
 
         debug("Import_euronext:getdata: url=%s ",url)
+        # pull data : the lines are decoded as they arrive
+        data = []
+
         try:
-            buf=self.m_connection.getDataFromUrl(url)
+            for eachLine in self.m_connection.getLinesFromUrl(url):
+                sdata = string.split (eachLine, '\t')
+                if len(sdata)==6:
+                    #print sdata
+                    if (sdata[0]<>"Date") and (quote.list() == QLIST_INDICES or sdata[5]<>'-'):
+                        try:
+                            sdate = jjmmaa2yyyymmdd(sdata[0])
+                            open = self.parseFValue(sdata[1])
+                            high = self.parseFValue(sdata[2])
+                            low = self.parseFValue(sdata[3])
+                            value = self.parseFValue(sdata[4])
+                            volume = self.parseLValue(sdata[5])
+                        except (ValueError,IndexError):
+                            # skip the bad line, keep the others
+                            info('Import_euronext:getdata %s: bad line skipped : %s' % (quote.key(),eachLine))
+                            continue
+
+                        # encode in EBP format
+                        # ISIN;DATE;OPEN;HIGH;LOW;CLOSE;VOLUME
+                        line = (
+                          quote.key(),
+                          sdate,
+                          open,
+                          high,
+                          low,
+                          value,
+                          volume
+                        )
+                        line = map(lambda (val): '%s' % str(val), line)
+                        line = string.join(line, ';')
+                        #print line
+
+                        # append
+                        data.append(line)
         except:
             debug('Import_euronext:unable to connect :-(')
             return None
-
-        # pull data
-        lines = self.splitLines(buf)
-        data = ''
-        #print lines
-
-        for eachLine in lines:
-            sdata = string.split (eachLine, '\t')
-            if len(sdata)==6:
-                #print sdata
-                if (sdata[0]<>"Date") and (quote.list() == QLIST_INDICES or sdata[5]<>'-'):
-                    sdate = jjmmaa2yyyymmdd(sdata[0])
-                    open = self.parseFValue(sdata[1])
-                    high = self.parseFValue(sdata[2])
-                    low = self.parseFValue(sdata[3])
-                    value = self.parseFValue(sdata[4])
-                    volume = self.parseLValue(sdata[5])
-
-                    # encode in EBP format
-                    # ISIN;DATE;OPEN;HIGH;LOW;CLOSE;VOLUME
-                    line = (
-                      quote.key(),
-                      sdate,
-                      open,
-                      high,
-                      low,
-                      value,
-                      volume
-                    )
-                    line = map(lambda (val): '%s' % str(val), line)
-                    line = string.join(line, ';')
-                    #print line
-
-                    # append
-                    data = data + line + '\r\n'
         return data
 
 # ============================================================================
@@ -64,7 +64,8 @@ class Import_yahoo(object):
         self.m_connection = ITradeConnection(cookies = None,
                                            proxy = itrade_config.proxyHostname,
                                            proxyAuth = itrade_config.proxyAuthentication,
-                                           connectionTimeout = itrade_config.connectionTimeout
+                                           connectionTimeout = itrade_config.connectionTimeout,
+                                           useCache = True
                                            )
 
     def name(self):
@@ -79,23 +80,17 @@ class Import_yahoo(object):
     def disconnect(self):
         pass
 
+    def threadsafe(self):
+        # no state between the calls : the requests of the import workers
+        # can be in progress at the same time
+        return True
+
     def getstate(self):
         return True
 
     def parseDate(self,d):
         return (d.year, d.month, d.day)
 
-    def splitLines(self,buf):
-        lines = string.split(buf, '\n')
-        lines = filter(lambda x:x, lines)
-        def removeCarriage(s):
-            if s[-1]=='\r':
-                return s[:-1]
-            else:
-                return s
-        lines = [removeCarriage(l) for l in lines]
-        return lines
-
     def getdata(self,quote,datedebut=None,datefin=None):
         if not datefin:
             datefin = date.today()
@@ -138,56 +133,61 @@ class Import_yahoo(object):
         url = yahooUrl(quote.market(),live=False) + '?' + query
 
         debug("Import_yahoo:getdata: url=%s ",url)
+        # pull data : the lines are decoded as they arrive
         try:
-            buf=self.m_connection.getDataFromUrl(url)
+            lines = self.m_connection.getLinesFromUrl(url)
+            header = string.split(lines.next(),',')
+        except StopIteration:
+            # empty content
+            return None
         except:
             debug('Import_yahoo:unable to connect :-(')
             return None
-
-        # pull data
-        lines = self.splitLines(buf)
-        if len(lines)<=0:
-            # empty content
-            return None
-        header = string.split(lines[0],',')
-        data = ""
+        data = []
 
         if (header[0]<>"Date"):
             # no valid content
+            lines.close()
             return None
 
-        for eachLine in lines:
-            sdata = string.split (eachLine, ',')
-            sdate = sdata[0]
-            if (sdate<>"Date"):
-                if re_p3_1.match(sdate):
-                    #print 'already good format ! ',sdate,sdata
-                    pass
-                else:
-                    sdate = dd_mmm_yy2yyyymmdd(sdate)
-                open = string.atof(sdata[1])
-                high = string.atof(sdata[2])
-                low = string.atof(sdata[3])
-                value = string.atof(sdata[6])   #   Adj. Close*
-                volume = string.atoi(sdata[5])
-
-                if volume>=0:
-                    # encode in EBP format
-                    # ISIN;DATE;OPEN;HIGH;LOW;CLOSE;VOLUME
-                    line = (
-                      quote.key(),
-                      sdate,
-                      open,
-                      high,
-                      low,
-                      value,
-                      volume
-                    )
-                    line = map(lambda (val): '%s' % str(val), line)
-                    line = string.join(line, ';')
-
-                    # append
-                    data = data + line + '\r\n'
+        try:
+            for eachLine in lines:
+                if not eachLine:
+                    continue
+                sdata = string.split (eachLine, ',')
+                sdate = sdata[0]
+                if (sdate<>"Date"):
+                    if re_p3_1.match(sdate):
+                        #print 'already good format ! ',sdate,sdata
+                        pass
+                    else:
+                        sdate = dd_mmm_yy2yyyymmdd(sdate)
+                    open = string.atof(sdata[1])
+                    high = string.atof(sdata[2])
+                    low = string.atof(sdata[3])
+                    value = string.atof(sdata[6])   #   Adj. Close*
+                    volume = string.atoi(sdata[5])
+
+                    if volume>=0:
+                        # encode in EBP format
+                        # ISIN;DATE;OPEN;HIGH;LOW;CLOSE;VOLUME
+                        line = (
+                          quote.key(),
+                          sdate,
+                          open,
+                          high,
+                          low,
+                          value,
+                          volume
+                        )
+                        line = map(lambda (val): '%s' % str(val), line)
+                        line = string.join(line, ';')
+
+                        # append
+                        data.append(line)
+        except:
+            debug('Import_yahoo:unable to connect :-(')
+            return None
         return data
 
 # ============================================================================
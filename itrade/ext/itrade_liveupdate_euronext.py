@@ -58,8 +58,8 @@ import itrade_config
 #
 #  Euronext returns all the quotes then we have to extract only the quote
 #  we want to return :-(
-#  design idea : if the quote is requested within the same second, use a
-#  cached data to extract !
+#  the listing of each MEP is kept (indexed by ISIN) and all the quotes of
+#  the MEP are extracted from it until it is not fresh anymore
 # ============================================================================
 
 class LiveUpdate_Euronext(object):
@@ -76,6 +76,9 @@ class LiveUpdate_Euronext(object):
 
         self.m_market = market
 
+        # snapshot per MEP : (time of download, lines by ISIN, column indices)
+        self.m_snapshots = {}
+
         self.m_url = 'http://www.euronext.com/tools/datacentre/dataCentreDownloadExcell.jcsv'
 
         self.m_connection = ITradeConnection(cookies = None,
@@ -180,19 +183,20 @@ class LiveUpdate_Euronext(object):
             ret = ret+val
         return string.atol(ret)
 
-    def getdata(self,quote):
-        self.m_connected = False
-        debug("LiveUpdate_Euronext:getdata quote:%s market:%s" % (quote,self.m_market))
-
-        #IdInstrument = euronext_InstrumentId(quote)
-        #if IdInstrument == None: return None
+    def freshdelay(self):
+        # the data are differed by delay() minutes : a snapshot is used
+        # during delay()*4 seconds (one minute for 15 minutes)
+        return max(itrade_config.cachedDataFreshDelay,self.delay()*4)
 
+    def download(self,mep,isin=''):
+        # download the listing of the MEP (or only one ISIN) : return the
+        # lines indexed by ISIN and the indices of the columns
         query = (
             ('cha', '2593'),
             ('lan', 'EN'),
             #('idInstrument', IdInstrument),
-            ('isinCode', quote.isin()),
-            ('selectedMep', euronext_place2mep(quote.place())),
+            ('isinCode', isin),
+            ('selectedMep', mep),
             ('indexCompo', ''),
             ('opening', 'on'),
             ('high', 'on'),
@@ -206,7 +210,7 @@ class LiveUpdate_Euronext(object):
         query = string.join(query, '&')
         url = self.m_url + '?' + query
 
-        debug("LiveUpdate_Euronext:getdata: url=%s ",url)
+        debug("LiveUpdate_Euronext:download: url=%s ",url)
         try:
             buf=self.m_connection.getDataFromUrl(url)
         except:
@@ -215,9 +219,9 @@ class LiveUpdate_Euronext(object):
 
         # pull data
         lines = self.splitLines(buf)
-        data = ''
 
         indice = {}
+        rows = {}
         """
         "Instrument's name";
         "ISIN";
@@ -266,81 +270,140 @@ class LiveUpdate_Euronext(object):
                         indice[ind] = i
                         i = i + 1
 
-                    iName = indice["Instrument's name"]
-                    iISIN = indice["ISIN"]
-                    iDate = indice["Date - time (CET)"]
-                    iOpen = indice["Day First"]
-                    iLast = indice["Last"]
-                    iHigh = indice["Day High"]
-                    iLow = indice["Day Low"]
-                    iPercent = indice["D/D-1 (%)"]
+                    for ind in ("Instrument's name","ISIN","Date - time (CET)","Day First","Last","Day High","Day Low","D/D-1 (%)"):
+                        if not indice.has_key(ind):
+                            debug('LiveUpdate_Euronext:download: no column %s' % ind)
+                            return None
+                else:
+                    if (sdata[indice["ISIN"]]<>"ISIN") and (sdata[indice["Date - time (CET)"]]!='-'):
+                        rows[sdata[indice["ISIN"]]] = sdata
 
-                    if indice.has_key("Volume"):
-                        iVolume = indice["Volume"]
-                    else:
-                        iVolume = -1
+        if not indice.has_key("ISIN"):
+            return None
 
-                else:
-                    if (sdata[iISIN]<>"ISIN") and (sdata[iDate]!='-'):
-                        c_datetime = datetime.today()
-                        c_date = "%04d%02d%02d" % (c_datetime.year,c_datetime.month,c_datetime.day)
-                        #print 'Today is :', c_date
-
-                        sdate,sclock = self.euronextDate(sdata[iDate])
-
-                        # be sure we have volume (or indices)
-                        if (quote.list() == QLIST_INDICES or sdata[iVolume]<>'-'):
-
-                            # be sure not an oldest day !
-                            if (c_date==sdate) or (quote.list() == QLIST_INDICES):
-                                key = quote.key()
-                                self.m_dcmpd[key] = sdate
-                                self.m_clock[key] = self.convertClock(quote.place(),sclock,sdate)
-
-                            #
-                            open = self.parseFValue(sdata[iOpen])
-                            high = self.parseFValue(sdata[iHigh])
-                            low = self.parseFValue(sdata[iLow])
-                            value = self.parseFValue(sdata[iLast])
-                            percent = self.parseFValue(sdata[iPercent])
-
-                            if iVolume!=-1:
-                                volume = self.parseLValue(sdata[iVolume])
-                            else:
-                                volume = 0
-
-                            # ISIN;DATE;OPEN;HIGH;LOW;CLOSE;VOLUME;PERCENT
-                            data = (
-                              quote.key(),
-                              sdate,
-                              open,
-                              high,
-                              low,
-                              value,
-                              volume,
-                              percent
-                            )
-                            data = map(lambda (val): '%s' % str(val), data)
-                            data = string.join(data, ';')
-
-                            return data
-                    else:
-                        print sdata
-                        pass
+        self.m_connected = True
+        return rows,indice
+
+    def snapshot(self,mep):
+        # parsed listing of the MEP, downloaded again when not fresh
+        snap = self.m_snapshots.get(mep)
+        if snap==None or datetime.today() > snap[0] + timedelta(0,self.freshdelay()):
+            ret = self.download(mep)
+            if ret==None:
+                return None
+            snap = (datetime.today(),ret[0],ret[1])
+            self.m_snapshots[mep] = snap
+        return snap
+
+    def getdata(self,quote):
+        self.m_connected = False
+        debug("LiveUpdate_Euronext:getdata quote:%s market:%s" % (quote,self.m_market))
+
+        #IdInstrument = euronext_InstrumentId(quote)
+        #if IdInstrument == None: return None
+
+        snap = self.snapshot(euronext_place2mep(quote.place()))
+        if snap==None:
+            return None
+        self.m_connected = True
+        when,rows,indice = snap
+
+        if not rows.has_key(quote.isin()):
+            # not in the listing : ask for the ISIN only (once per snapshot)
+            ret = self.download(euronext_place2mep(quote.place()),quote.isin())
+            if ret!=None:
+                rows[quote.isin()] = ret[0].get(quote.isin())
+                indice = ret[1]
+            else:
+                rows[quote.isin()] = None
+
+        sdata = rows[quote.isin()]
+        if sdata==None:
+            return None
+        return self.decode(quote,sdata,indice)
+
+    def getdata_many(self,quotes):
+        # one download per MEP : return the data of each quote (dictionary
+        # keyed by quote.key())
+        ret = {}
+        for eachQuote in quotes:
+            ret[eachQuote.key()] = self.getdata(eachQuote)
+        return ret
+
+    def decode(self,quote,sdata,indice):
+        iDate = indice["Date - time (CET)"]
+        iOpen = indice["Day First"]
+        iLast = indice["Last"]
+        iHigh = indice["Day High"]
+        iLow = indice["Day Low"]
+        iPercent = indice["D/D-1 (%)"]
+
+        if indice.has_key("Volume"):
+            iVolume = indice["Volume"]
+        else:
+            iVolume = -1
+
+        c_datetime = datetime.today()
+        c_date = "%04d%02d%02d" % (c_datetime.year,c_datetime.month,c_datetime.day)
+        #print 'Today is :', c_date
+
+        sdate,sclock = self.euronextDate(sdata[iDate])
+
+        # be sure we have volume (or indices)
+        if (quote.list() == QLIST_INDICES or sdata[iVolume]<>'-'):
+
+            # be sure not an oldest day !
+            if (c_date==sdate) or (quote.list() == QLIST_INDICES):
+                key = quote.key()
+                self.m_dcmpd[key] = sdate
+                self.m_clock[key] = self.convertClock(quote.place(),sclock,sdate)
+
+            #
+            open = self.parseFValue(sdata[iOpen])
+            high = self.parseFValue(sdata[iHigh])
+            low = self.parseFValue(sdata[iLow])
+            value = self.parseFValue(sdata[iLast])
+            percent = self.parseFValue(sdata[iPercent])
+
+            if iVolume!=-1:
+                volume = self.parseLValue(sdata[iVolume])
+            else:
+                volume = 0
+
+            # ISIN;DATE;OPEN;HIGH;LOW;CLOSE;VOLUME;PERCENT
+            data = (
+              quote.key(),
+              sdate,
+              open,
+              high,
+              low,
+              value,
+              volume,
+              percent
+            )
+            data = map(lambda (val): '%s' % str(val), data)
+            data = string.join(data, ';')
+
+            return data
 
         return None
 
     # ---[ cache management on data ] ---
 
     def getcacheddata(self,quote):
-        return None
+        # extracted from the snapshot of the MEP of the quote (downloaded
+        # again if not fresh)
+        return self.getdata(quote)
 
     def iscacheddataenoughfreshq(self):
+        limit = datetime.today() - timedelta(0,self.freshdelay())
+        for eachSnap in self.m_snapshots.values():
+            if eachSnap[0] >= limit:
+                return True
         return False
 
     def cacheddatanotfresh(self):
-        # no cache
-        pass
+        self.m_snapshots = {}
 
     # ---[ notebook of order ] ---
 
@@ -69,6 +69,13 @@ class LiveUpdate_yahoo(object):
         self.m_lastclock = 0
         self.m_lastdate = "20070101"
 
+        # snapshot of the last batch : data per quote key
+        self.m_cache = {}
+        self.m_cachetime = None
+
+        # quotes asked for : refreshed together by the next batch
+        self.m_watched = {}
+
         self.m_connection = ITradeConnection(cookies = None,
                                            proxy = itrade_config.proxyHostname,
                                            proxyAuth = itrade_config.proxyAuthentication,
@@ -144,45 +151,106 @@ class LiveUpdate_yahoo(object):
 
         return "%d:%02d" % (mdatetime.hour,mdatetime.minute)
 
-    def getdata(self,quote):
-        debug("LiveUpdate_yahoo:getdata quote:%s " % quote)
-        self.m_connected = False
-
-        sname = yahooTicker(quote.ticker(),quote.market(),quote.place())
+    def yahooSymbol(self,quote):
+        return yahooTicker(quote.ticker(),quote.market(),quote.place())
 
-        if sname[0]=='^':
-            ss = "%5E" + sname[1:]
-        else:
-            ss = sname
+    def yahooQuery(self,market,snames):
+        # url of the quotes.csv request of several symbols of one market
+        ss = []
+        for sname in snames:
+            if sname[0]=='^':
+                ss.append("%5E" + sname[1:])
+            else:
+                ss.append(sname)
 
         query = (
-          ('s', ss),
+          ('s', string.join(ss, '+')),
           ('f', 'sl1d1t1c1ohgvbap'),
           ('e', '.csv'),
         )
         query = map(lambda (var, val): '%s=%s' % (var, str(val)), query)
         query = string.join(query, '&')
-        url = yahooUrl(quote.market(),live=True) + '?' + query
+        return yahooUrl(market,live=True) + '?' + query
 
-        debug("LiveUpdate_yahoo:getdata: url=%s",url)
-        try:
-            data=self.m_connection.getDataFromUrl(url)[:-2] # Get rid of CRLF
-        except:
-            debug('LiveUpdate_yahoo:unable to connect :-(')
-            return None
+    def getdata(self,quote):
+        debug("LiveUpdate_yahoo:getdata quote:%s " % quote)
 
-        # pull data
-        s400 = re.search("400 Bad Request",data,re.IGNORECASE|re.MULTILINE)
-        if s400:
-            if itrade_config.verbose:
-                info('unknown %s quote (400 Bad Request) from Yahoo' % (quote.ticker()))
-            return None
+        # refresh the other quotes asked for recently in the same request
+        now = time.time()
+        self.m_watched[quote.key()] = (quote,now)
+        quotes = [quote]
+        for key,(eachQuote,last) in self.m_watched.items():
+            if now - last > itrade_config.cachedDataFreshDelay * 10:
+                del self.m_watched[key]
+            elif eachQuote is not quote:
+                quotes.append(eachQuote)
+
+        return self.getdata_many(quotes).get(quote.key())
+
+    def getdata_many(self,quotes):
+        # one request per market and per batch of symbols : return the data
+        # of each quote (dictionary keyed by quote.key()) and cache them
+        debug("LiveUpdate_yahoo:getdata_many %d quotes" % len(quotes))
+        self.m_connected = False
 
-        sdata = string.split (data, ',')
-        if len (sdata) < 9:
-            if itrade_config.verbose:
-                info('invalid data (bad answer length) for %s quote' % (quote.ticker()))
-            return None
+        markets = {}
+        for eachQuote in quotes:
+            url = yahooUrl(eachQuote.market(),live=True)
+            markets.setdefault(url,[]).append(eachQuote)
+
+        ret = {}
+        for eachList in markets.values():
+            for n in range(0,len(eachList),itrade_config.liveBatchSize):
+                batch = eachList[n:n+itrade_config.liveBatchSize]
+                snames = map(self.yahooSymbol,batch)
+                url = self.yahooQuery(batch[0].market(),snames)
+
+                debug("LiveUpdate_yahoo:getdata_many: url=%s",url)
+                try:
+                    data=self.m_connection.getDataFromUrl(url)
+                except:
+                    debug('LiveUpdate_yahoo:unable to connect :-(')
+                    continue
+
+                # pull data
+                s400 = re.search("400 Bad Request",data,re.IGNORECASE|re.MULTILINE)
+                if s400:
+                    if itrade_config.verbose:
+                        info('unknown quote (400 Bad Request) from Yahoo : %s' % string.join(snames,','))
+                    continue
+
+                # one line per symbol, in the order of the request
+                lines = {}
+                for eachLine in string.split(data, '\r\n'):
+                    sdata = string.split (eachLine, ',')
+                    if len (sdata) >= 9:
+                        lines[sdata[0][1:-1]] = sdata
+
+                # None for a quote without valid data : not asked again
+                # until the snapshot is too old
+                for eachQuote,sname in zip(batch,snames):
+                    sdata = lines.get(sname)
+                    if sdata==None:
+                        if itrade_config.verbose:
+                            info('invalid data (bad answer length) for %s quote' % (eachQuote.ticker()))
+                        ret[eachQuote.key()] = None
+                    else:
+                        # a field 'N/A' (or a null price) on one line
+                        # must not lose the other quotes of the batch
+                        try:
+                            ret[eachQuote.key()] = self.decode(eachQuote,sname,sdata)
+                        except (ValueError,ZeroDivisionError):
+                            if itrade_config.verbose:
+                                info('invalid data for %s quote : %s' % (eachQuote.ticker(),string.join(sdata,',')))
+                            ret[eachQuote.key()] = None
+
+        # snapshot for getcacheddata()
+        self.m_cache.update(ret)
+        self.m_cachetime = datetime.today()
+        return ret
+
+    def decode(self,quote,sname,sdata):
+        # decode the fields of one line of quotes.csv (sdata) for quote
 
         #print sdata
 
@@ -275,16 +343,24 @@ class LiveUpdate_yahoo(object):
     # ---[ cache management on data ] ---
 
     def getcacheddata(self,quote):
-        # no cache
-        return None
+        if self.m_cache.has_key(quote.key()):
+            self.m_watched[quote.key()] = (quote,time.time())
+            return self.m_cache[quote.key()]
+        # not in the snapshot : ask for it (and refresh the snapshot)
+        return self.getdata(quote)
 
     def iscacheddataenoughfreshq(self):
-        # no cache
-        return False
+        if self.m_cachetime==None:
+            debug('iscacheddataenoughfreshq : no cache !')
+            return False
+        delta = timedelta(0,itrade_config.cachedDataFreshDelay)
+        if datetime.today() > self.m_cachetime + delta:
+            return False
+        return True
 
     def cacheddatanotfresh(self):
-        # no cache
-        pass
+        self.m_cache = {}
+        self.m_cachetime = None
 
     # ---[ notebook of order ] ---
 
@@ -63,7 +63,8 @@ def Import_ListOfQuotes_ASX(quotes,market='ASX',dlg=None,x=0):
     connection = ITradeConnection(cookies = None,
                                proxy = itrade_config.proxyHostname,
                                proxyAuth = itrade_config.proxyAuthentication,
-                               connectionTimeout = itrade_config.connectionTimeout
+                               connectionTimeout = itrade_config.connectionTimeout,
+                               useCache = True
                                )
 
     if market=='ASX':
@@ -66,7 +66,8 @@ def Import_ListOfQuotes_BARCHART(quotes,market='NASDAQ',dlg=None,x=0):
     connection = ITradeConnection(cookies = None,
                                proxy = itrade_config.proxyHostname,
                                proxyAuth = itrade_config.proxyAuthentication,
-                               connectionTimeout = itrade_config.connectionTimeout
+                               connectionTimeout = itrade_config.connectionTimeout,
+                               useCache = True
                                )
 
     if market=='NASDAQ' or market=='AMEX' or market=='OTCBB':
@@ -60,7 +60,8 @@ def Import_ListOfQuotes_LSE(quotes,market='LSE SETS',dlg=None,x=0):
     connection = ITradeConnection(cookies = None,
                                proxy = itrade_config.proxyHostname,
                                proxyAuth = itrade_config.proxyAuthentication,
-                               connectionTimeout = itrade_config.connectionTimeout
+                               connectionTimeout = itrade_config.connectionTimeout,
+                               useCache = True
                                )
 
     import xlrd
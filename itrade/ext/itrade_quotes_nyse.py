@@ -61,45 +61,35 @@ def Import_ListOfQuotes_NYSE(quotes,market='NYSE',dlg=None,x=0):
     connection = ITradeConnection(cookies = None,
                                proxy = itrade_config.proxyHostname,
                                proxyAuth = itrade_config.proxyAuthentication,
-                               connectionTimeout = itrade_config.connectionTimeout
+                               connectionTimeout = itrade_config.connectionTimeout,
+                               useCache = True
                                )
     if market=='NYSE':
         url = "http://www.nysedata.com/nysedata/asp/download.asp?s=txt&prod=symbols"
     else:
         return False
 
-    def splitLines(buf):
-        lines = string.split(buf, '\n')
-        lines = filter(lambda x:x, lines)
-        def removeCarriage(s):
-            if s[-1]=='\r':
-                return s[:-1]
-            else:
-                return s
-        lines = [removeCarriage(l) for l in lines]
-        return lines
-
+    # the lines are decoded as they arrive : the list is never in memory
+    count = 0
     try:
-        data=connection.getDataFromUrl(url)
+        for line in connection.getLinesFromUrl(url):
+            if not line:
+                continue
+            count = count + 1
+            data = string.split (line, '|')
+            if len(data)==5:
+                country,issuer,issue = extractCUSIP(data[1])
+                if issue=='10':
+                    #print data[1],country,issuer,issue,data[2]
+                    if country=='US':
+                        isin = buildISIN(country,data[1])
+                        name = filterName(data[2])
+                        quotes.addQuote(isin=isin,name=name,ticker=data[0],market='NYSE',currency='USD',place='NYC',country='US')
     except:
         debug('Import_ListOfQuotes_NYSE:unable to connect :-(')
         return False
 
-    # returns the data
-    lines = splitLines(data)
-
-    for line in lines:
-        data = string.split (line, '|')
-        if len(data)==5:
-            country,issuer,issue = extractCUSIP(data[1])
-            if issue=='10':
-                #print data[1],country,issuer,issue,data[2]
-                if country=='US':
-                    isin = buildISIN(country,data[1])
-                    name = filterName(data[2])
-                    quotes.addQuote(isin=isin,name=name,ticker=data[0],market='NYSE',currency='USD',place='NYC',country='US')
-
-    print 'Imported %d lines from NYSE data.' % len(lines)
+    print 'Imported %d lines from NYSE data.' % count
 
     return True
 
@@ -50,6 +50,7 @@ import itrade_ext
 import itrade_import
 import itrade_portfolio
 import itrade_matrix
+import itrade_screener
 
 # ============================================================================
 # Usage
@@ -62,6 +63,8 @@ def usage():
     print "-e           connect live and display portfolio evaluation   "
     print "-i           connect and import a ticker (or isin)           "
     print "-d           disconnected (no live update / no network)      "
+    print "-s <expr>    list the quotes matching an expression          "
+    print "             (i.e. \"rsi14 < 30 and close > ma150\")          "
     print
     print "--file=<f>   import or export using a file (EBP file format) "
     print "--quote=<n>  select a quote by its isin                      "
@@ -81,7 +84,7 @@ def usage():
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "xeho:vt:iq:f:l:du:", ["verbose","help", "output=", "ticker=", "quote=","file=","lang=","user=","nopsyco"])
+        opts, args = getopt.getopt(sys.argv[1:], "xeho:vt:iq:f:l:du:s:", ["verbose","help", "output=", "ticker=", "quote=","file=","lang=","user=","nopsyco","screen="])
     except getopt.GetoptError:
         # print help information and exit:
         usage()
@@ -96,6 +99,7 @@ def main():
 
     vticker = None
     vquote  = None
+    vscreen = None
 
     lang = gMessage.getAutoDetectedLang('us')
     for o, a in opts:
@@ -157,6 +161,10 @@ def main():
         if o == "-q" or o == "--quote":
             vquote = a
 
+        if o == "-s" or o == "--screen":
+            vscreen = a
+            wx = False
+
     # Import Psyco if available
     if not nopsyco:
         try:
@@ -198,6 +206,9 @@ def main():
             print 'quote %s not found ! format is : <ISINorTICKER>.<EXCHANGE>.<PLACE>' % vquote
             sys.exit()
 
+    if vscreen:
+        itrade_screener.cmdline_screen(vscreen)
+
     if wx:
         import itrade_wxmain
         itrade_wxmain.start_iTradeWindow()
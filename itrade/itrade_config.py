@@ -194,13 +194,88 @@ if not os.path.exists(dirRes):
 # number of trading years
 numTradeYears = 12
 
+# trades are cached in binary columnar files (cache/<key>.bin) instead of
+# EBP text files (cache/<key>.txt)
+useTradesCache = True
+
+# new or changed days are appended to a journal (cache/<key>.jnl) which is
+# merged into the binary cache when it reaches this number of records
+tradesJournalMaxRecords = 250
+
+# memory budget (in MB) for the histories loaded on demand : least recently
+# used ones are unloaded when it is exceeded
+tradesMemoryBudget = 256
+
+# memory budget (in MB) for the indicators computed on demand (i.e. other
+# periods than the default ones) : least recently used ones are forgotten
+indicatorsMemoryBudget = 32
+
+# default filter expression of the screener view (see itrade_screener)
+screenerExpression = 'rsi14 < 30 and close > ma150'
+
+# parallel imports of historic data : number of worker threads, number of
+# requests in progress for one connector (only one if the connector is not
+# thread-safe) and minimal delay (in seconds) between two requests for one
+# connector
+importWorkers = 4
+importMaxPerConnector = 2
+importMinInterval = 0.2
+
+# gap-aware imports of historic data : holes of less than importMinGap
+# trading days are ignored, missing ranges separated by less than
+# importGapMerge days are imported with one request
+importMinGap = 3
+importGapMerge = 5
+
+# http cache of the import, lists of quotes and news connectors : maximum
+# size (in MB) and time to live (in seconds) of the responses of the urls
+# matching a regular expression (the first one), used for the servers not
+# giving ETag or Last-Modified
+httpCacheSize = 64
+httpCacheTTL = (
+    # historic data
+    (r'finance\.yahoo\.com', 3600),
+    (r'euronext\.com/tools/datacentre', 3600),
+    # lists of quotes
+    (r'trapridownload|ISIN\.xls|equityList|securities\.xls|prod=symbols|reference_data|xetrawerte|lookup\.asp', 86400),
+    # news
+    (r'balo|boursorama', 900),
+    )
+
 # refresh in seconds for a view
 refreshView = 6
 refreshLive = 1.5
 
+# fuzzy search of the quotes (see itrade_search) : ratio of the trigrams of
+# the query a quote must match and maximum number of results of a search
+searchMinMatch = 0.6
+searchLimit = 500
+
+# lists of symbols are compiled in the cache folder (see itrade_symbcache) :
+# the quotes are created on first use
+symbolsCache = True
+
 # refresh in seconds for a currency view
 refreshCurrencyView = 15
 
+# currency rates : all the currencies are downloaded against currencyBase in
+# one request, then kept currencyTTL seconds (the other pairs are derived)
+currencyBase = 'USD'
+currencyTTL = 10
+
+# live updates : number of worker threads of the scheduler and delay (in
+# seconds) to group the quotes of one live connector in a single poll
+liveWorkers = 2
+liveGroupDelay = 0.5
+
+# live updates : polls before the open of a market (in seconds), factor of
+# the period for the quotes of the portfolio or near a stop (within
+# liveNearStop), maximum factor for the quotes which price does not change
+liveWakeBefore = 60
+liveFastFactor = 0.5
+liveNearStop = 0.02
+liveMaxBackoff = 8
+
 # auto refresh the matrix view
 default_bAutoRefreshMatrixView = True
 global bAutoRefreshMatrixView
@@ -224,6 +299,10 @@ operationFontSize = default_operationFontSize
 # is data cached fresh ? (in seconds)
 cachedDataFreshDelay = 3
 
+# number of quotes asked for in one request by the live connectors able to
+# batch (i.e. yahoo)
+liveBatchSize = 50
+
 # Taxes Threshold (in current currency)
 taxesThreshold = 15000.00
 
@@ -44,13 +44,485 @@ import urlparse
 import socket
 import time
 import string
-from gzip import GzipFile
-from StringIO import StringIO
-from threading import Lock, currentThread
+import os
+import re
+import hashlib
+import zlib
+from threading import Lock, Condition, local, currentThread
 from urllib import urlencode
 
 # iTrade system
 from itrade_logging import *
+import itrade_config
+
+# ============================================================================
+# ITradeConnectionPool()
+# ============================================================================
+
+class ITradeConnectionPool(object):
+    """Keep-alive http(s) connections, at most maxPerHost connections per host.
+    A connection is checked out by one thread for one request (and its response)
+    then given back to the pool for the next request to the same host"""
+    def __init__(self, maxPerHost = 4, idleTimeout = 60):
+        """@param maxPerHost: maximum number of connections (idle or in use) to one host
+        @param idleTimeout: idle connections are closed after idleTimeout seconds"""
+        self.m_maxPerHost=maxPerHost
+        self.m_idleTimeout=idleTimeout
+        self.m_idle={}             # dict of lists of (connection, time of checkin) (key is (protocole, host))
+        self.m_count={}            # dict of number of opened connections (key is (protocole, host))
+        self.m_generation=0        # connections of an older generation are closed at checkin
+        self.m_condition=Condition()
+
+    def checkout(self, protocole, host):
+        """Get a connection to host : the last idle one, a new one if the host has less
+        than maxPerHost connections, or wait for a connection to be given back
+        @return: (connection, generation) to be given to checkin() or discard()"""
+        key = (protocole.lower(), host)
+        self.m_condition.acquire()
+        try:
+            while True:
+                self.evict()
+                idle = self.m_idle.get(key)
+                if idle:
+                    connection, last = idle.pop()
+                    return connection, self.m_generation
+                if self.m_count.get(key, 0) < self.m_maxPerHost:
+                    self.m_count[key] = self.m_count.get(key, 0) + 1
+                    generation = self.m_generation
+                    break
+                self.m_condition.wait(self.m_idleTimeout)
+        finally:
+            self.m_condition.release()
+
+        # Open the new connection outside the lock
+        if key[0]=="http":
+            connection = httplib.HTTPConnection(host)
+        else:
+            connection = httplib.HTTPSConnection(host)
+        return connection, generation
+
+    def checkin(self, protocole, host, connection, generation):
+        """Give back a connection after a complete request/response cycle"""
+        key = (protocole.lower(), host)
+        self.m_condition.acquire()
+        try:
+            if generation == self.m_generation:
+                self.m_idle.setdefault(key, []).append((connection, time.time()))
+            else:
+                connection.close()
+            self.m_condition.notify()
+        finally:
+            self.m_condition.release()
+
+    def discard(self, protocole, host, connection, generation):
+        """Give back a connection in an unknown state : close it"""
+        key = (protocole.lower(), host)
+        connection.close()
+        self.m_condition.acquire()
+        try:
+            if generation == self.m_generation:
+                self.m_count[key] = self.m_count[key] - 1
+            self.m_condition.notify()
+        finally:
+            self.m_condition.release()
+
+    def evict(self):
+        """Close connections idle for more than idleTimeout seconds (called with the lock)"""
+        limit = time.time() - self.m_idleTimeout
+        for key, idle in self.m_idle.items():
+            while idle and idle[0][1] < limit:
+                connection, last = idle.pop(0)
+                connection.close()
+                self.m_count[key] = self.m_count[key] - 1
+
+    def clear(self, protocole=None, host=None):
+        """Close idle connections of the given host (or all hosts). Connections in use
+        are closed when given back (all hosts only)"""
+        self.m_condition.acquire()
+        try:
+            if host:
+                key = (protocole.lower(), host)
+                idle = self.m_idle.get(key, [])
+                for connection, last in idle:
+                    connection.close()
+                self.m_count[key] = self.m_count.get(key, 0) - len(idle)
+                self.m_idle[key] = []
+            else:
+                for idle in self.m_idle.values():
+                    for connection, last in idle:
+                        connection.close()
+                self.m_idle = {}
+                self.m_count = {}
+                self.m_generation = self.m_generation + 1
+            self.m_condition.notifyAll()
+        finally:
+            self.m_condition.release()
+
+# ============================================================================
+# Streaming of the http responses
+# ============================================================================
+
+class ITradeDecoder(object):
+    """Incremental decoding of a response body : the chunks are gunzipped or
+    inflated as they arrive (Content-Encoding gzip or deflate)"""
+    def __init__(self, contentEncoding=None):
+        """@param contentEncoding: value of the Content-Encoding header of the response"""
+        self.m_encoding=contentEncoding
+        if contentEncoding=='gzip':
+            self.m_zlib=zlib.decompressobj(16+zlib.MAX_WBITS)
+        elif contentEncoding=='deflate':
+            self.m_zlib=zlib.decompressobj()
+        else:
+            self.m_zlib=None
+        self.m_started=False
+
+    def decode(self, chunk):
+        """@return: decoded data of the chunk (maybe empty)"""
+        if self.m_zlib==None:
+            return chunk
+        if not self.m_started and self.m_encoding=='deflate':
+            # some servers send a raw deflate stream without the zlib header
+            self.m_started=True
+            try:
+                return self.m_zlib.decompress(chunk)
+            except zlib.error:
+                self.m_zlib=zlib.decompressobj(-zlib.MAX_WBITS)
+        self.m_started=True
+        return self.m_zlib.decompress(chunk)
+
+    def flush(self):
+        """@return: last decoded data at the end of the body"""
+        if self.m_zlib==None:
+            return ""
+        return self.m_zlib.flush()
+
+def readChunks(response, chunkSize=16384, done=None):
+    """Generator of the decoded chunks of the body of a response
+    @param response: HTTPResponse with an unread body
+    @param chunkSize: maximum size of a chunk read on the socket
+    @param done: list, True is appended once the body is read until the end
+    and the connection can be reused (optional, default is None)"""
+    decoder=ITradeDecoder(response.getheader('Content-Encoding'))
+    length=None
+    bReusable=True
+    ldata = response.getheader('content-length')
+    if ldata:
+        # some servers can return min,max or max,max
+        #  i.e. "http://www.nysedata.com/nysedata/asp/download.asp?s=txt&prod=symbols" is doing that !
+        # only min bytes are read : the end of the body (if any) stays unread
+        ldata = string.split(ldata, ',')
+        try:
+            ldata = map(int, ldata)
+        except ValueError:
+            # malformed length
+            bReusable = False
+        else:
+            if len(ldata)>1:
+                bReusable = False
+                if decoder.m_zlib==None:
+                    length = ldata[0]
+    bEnd = False
+    while length==None or length>0:
+        if length==None:
+            chunk = response.read(chunkSize)
+        else:
+            chunk = response.read(min(chunkSize, length))
+            length = length - len(chunk)
+        if not chunk:
+            bEnd = True
+            break
+        chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    chunk = decoder.flush()
+    if chunk:
+        yield chunk
+    if bEnd and bReusable and done!=None:
+        done.append(True)
+
+def readFileChunks(f, chunkSize=16384):
+    """Generator of the chunks of an opened file (closed at the end)"""
+    try:
+        while True:
+            chunk = f.read(chunkSize)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+def splitLines(chunks):
+    """Generator of the lines (without end of line) of a sequence of chunks :
+    only the current line is kept in memory"""
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk).split('\n')
+        rest = lines.pop()
+        for eachLine in lines:
+            if eachLine[-1:]=='\r':
+                eachLine = eachLine[:-1]
+            yield eachLine
+    if rest:
+        if rest[-1:]=='\r':
+            rest = rest[:-1]
+        yield rest
+
+# ============================================================================
+# ITradeHTTPCache()
+# ============================================================================
+
+class ITradeHTTPCache(object):
+    """On disk cache of the responses to GET requests. The data are stored once
+    per content (file named by the SHA-1 of the data) whatever the number of urls
+    returning them. An entry is used without request during the TTL of the first
+    pattern matching its url (see itrade_config.httpCacheTTL) then revalidated
+    with a conditional request when the server gave an ETag or a Last-Modified
+    header"""
+    def __init__(self, directory, maxSize, ttls=()):
+        """@param directory: directory of the cache files (created if needed)
+        @param maxSize: maximum size of the data in bytes (least recently used first out)
+        @param ttls: list of (url regular expression, TTL in seconds)"""
+        self.m_directory=directory
+        self.m_maxSize=maxSize
+        self.m_ttls=[(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self.m_entries={}          # dict of [digest, etag, lastModified, time of store, time of use] (key is url)
+        self.m_sizes={}            # dict of size of the data files (key is digest)
+        self.m_hits=0              # requests served from the cache without request
+        self.m_revalidated=0       # requests served from the cache after a 304 answer
+        self.m_misses=0            # requests served by the server
+        self.m_tmp=0               # counter of the temporary data files
+        self.m_locker=Lock()
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+        self.load()
+
+    def indexFile(self):
+        return os.path.join(self.m_directory, "index.txt")
+
+    def dataFile(self, digest):
+        return os.path.join(self.m_directory, digest)
+
+    def load(self):
+        """Read the index : url, digest, ETag, Last-Modified, times (tab separated)"""
+        try:
+            f=open(self.indexFile(), "r")
+        except IOError:
+            return
+        for eachLine in f.readlines():
+            item = eachLine.rstrip("\r\n").split("\t")
+            if len(item)==6 and os.path.exists(self.dataFile(item[1])):
+                self.m_entries[item[0]] = [item[1], item[2], item[3], float(item[4]), float(item[5])]
+                self.m_sizes[item[1]] = os.path.getsize(self.dataFile(item[1]))
+        f.close()
+
+    def save(self):
+        """Write the index (called with the lock)"""
+        fn = self.indexFile()
+        try:
+            f=open(fn+".tmp", "w")
+            for url, entry in self.m_entries.items():
+                f.write("%s\t%s\t%s\t%s\t%f\t%f\n" % (url, entry[0], entry[1], entry[2], entry[3], entry[4]))
+            f.close()
+            if os.path.exists(fn):
+                os.remove(fn)
+            os.rename(fn+".tmp", fn)
+        except (IOError, OSError):
+            info("Can't write the http cache index %s" % fn)
+
+    def ttl(self, url):
+        """@return: TTL in seconds of the first pattern matching url, 0 if none"""
+        for pattern, ttl in self.m_ttls:
+            if pattern.search(url):
+                return ttl
+        return 0
+
+    def lookup(self, url, bOpen=False):
+        """@return: (data, bFresh, headers for a conditional request) or None if url is not cached
+        @param bOpen: return the opened data file instead of the data"""
+        self.m_locker.acquire()
+        try:
+            entry = self.m_entries.get(url)
+            if entry==None:
+                return None
+            try:
+                f=open(self.dataFile(entry[0]), "rb")
+                if bOpen:
+                    data=f
+                else:
+                    data=f.read()
+                    f.close()
+            except IOError:
+                del self.m_entries[url]
+                return None
+            now = time.time()
+            entry[4] = now
+            bFresh = now < entry[3] + self.ttl(url)
+            if bFresh:
+                self.m_hits = self.m_hits + 1
+            headers = {}
+            if entry[1]:
+                headers["If-None-Match"] = entry[1]
+            if entry[2]:
+                headers["If-Modified-Since"] = entry[2]
+            return data, bFresh, headers
+        finally:
+            self.m_locker.release()
+
+    def revalidated(self, url):
+        """The server answered 304 : the entry is fresh again"""
+        self.m_locker.acquire()
+        try:
+            entry = self.m_entries.get(url)
+            if entry:
+                entry[3] = time.time()
+                self.m_revalidated = self.m_revalidated + 1
+                self.save()
+        finally:
+            self.m_locker.release()
+
+    def store(self, url, data, etag=None, lastModified=None):
+        """Store the data returned by the server for url"""
+        writer = self.writer(url, etag, lastModified)
+        if writer:
+            writer.write(data)
+            writer.close()
+
+    def writer(self, url, etag=None, lastModified=None):
+        """@return: ITradeHTTPCacheWriter to store the data of url chunk by chunk, None if
+        the entry would never be usable"""
+        self.m_locker.acquire()
+        try:
+            self.m_misses = self.m_misses + 1
+            if not etag and not lastModified and not self.ttl(url):
+                # never usable
+                if self.m_entries.has_key(url):
+                    del self.m_entries[url]
+                    self.save()
+                return None
+            self.m_tmp = self.m_tmp + 1
+            fn = self.dataFile("tmp-%d-%d" % (os.getpid(), self.m_tmp))
+        finally:
+            self.m_locker.release()
+        try:
+            return ITradeHTTPCacheWriter(self, fn, url, etag, lastModified)
+        except IOError:
+            info("Can't write the http cache file %s" % fn)
+            return None
+
+    def commit(self, url, fn, digest, size, etag=None, lastModified=None):
+        """Record the data file fn written by a ITradeHTTPCacheWriter"""
+        self.m_locker.acquire()
+        try:
+            try:
+                if self.m_sizes.has_key(digest):
+                    os.remove(fn)
+                else:
+                    os.rename(fn, self.dataFile(digest))
+                    self.m_sizes[digest] = size
+            except OSError:
+                info("Can't write the http cache file %s" % digest)
+                return
+            now = time.time()
+            self.m_entries[url] = [digest, etag or "", lastModified or "", now, now]
+            self.evict()
+            self.save()
+        finally:
+            self.m_locker.release()
+
+    def evict(self):
+        """Remove the least recently used entries over maxSize (called with the lock)"""
+        size = 0
+        for eachSize in self.m_sizes.values():
+            size = size + eachSize
+        if size <= self.m_maxSize:
+            return
+        entries = [(entry[4], url) for url, entry in self.m_entries.items()]
+        entries.sort()
+        for last, url in entries:
+            if size <= self.m_maxSize:
+                break
+            digest = self.m_entries[url][0]
+            del self.m_entries[url]
+            for entry in self.m_entries.values():
+                if entry[0]==digest:
+                    break
+            else:
+                # no other url with this content
+                size = size - self.m_sizes[digest]
+                del self.m_sizes[digest]
+                try:
+                    os.remove(self.dataFile(digest))
+                except OSError:
+                    pass
+
+    def stats(self):
+        """@return: hits, revalidated, misses, number of urls, size in bytes"""
+        self.m_locker.acquire()
+        try:
+            size = 0
+            for eachSize in self.m_sizes.values():
+                size = size + eachSize
+            return self.m_hits, self.m_revalidated, self.m_misses, len(self.m_entries), size
+        finally:
+            self.m_locker.release()
+
+class ITradeHTTPCacheWriter(object):
+    """Data of one url written to a temporary file as they arrive (the digest is
+    computed on the fly) then recorded by the cache at close(). Nothing is
+    stored on abort()"""
+    def __init__(self, cache, fn, url, etag=None, lastModified=None):
+        self.m_cache=cache
+        self.m_fn=fn
+        self.m_url=url
+        self.m_etag=etag
+        self.m_lastModified=lastModified
+        self.m_sha1=hashlib.sha1()
+        self.m_size=0
+        self.m_file=open(fn, "wb")
+
+    def write(self, chunk):
+        self.m_file.write(chunk)
+        self.m_sha1.update(chunk)
+        self.m_size = self.m_size + len(chunk)
+
+    def close(self):
+        self.m_file.close()
+        self.m_cache.commit(self.m_url, self.m_fn, self.m_sha1.hexdigest(), self.m_size, self.m_etag, self.m_lastModified)
+
+    def abort(self):
+        self.m_file.close()
+        try:
+            os.remove(self.m_fn)
+        except OSError:
+            pass
+
+    def tee(self, chunks):
+        """Generator of the chunks, stored in the cache when the sequence is read until the end"""
+        bDone = False
+        try:
+            for chunk in chunks:
+                self.write(chunk)
+                yield chunk
+            bDone = True
+        finally:
+            if bDone:
+                self.close()
+            else:
+                self.abort()
+
+def getHTTPCache():
+    """@return: the http cache shared by the connections (created at first use)"""
+    global gHTTPCache
+    if gHTTPCache==None:
+        gHTTPCache = ITradeHTTPCache(os.path.join(itrade_config.dirCacheData, "http"),
+                                     itrade_config.httpCacheSize*1024*1024,
+                                     itrade_config.httpCacheTTL)
+    return gHTTPCache
+
+try:
+    ignore(gHTTPCache)
+except NameError:
+    gHTTPCache = None
 
 # ============================================================================
 # ITradeConnection()
@@ -58,11 +530,13 @@ from itrade_logging import *
 
 class ITradeConnection(object):
     """Class designed to handle request in HTTP 1.1"""
-    def __init__(self, cookies = None, proxy = None, proxyAuth = None, connectionTimeout = 20):
+    def __init__(self, cookies = None, proxy = None, proxyAuth = None, connectionTimeout = 20, maxPerHost = 4, useCache = False):
         """@param cookies: cookie handler (instance of ITradeCookies class). If None, a private cookie
         handler is created.
         @param proxy: proxy host name or IP
-        @param proxyAuth: authentication string for proxy in the form 'user:password'"""
+        @param proxyAuth: authentication string for proxy in the form 'user:password'
+        @param maxPerHost: number of requests to one host in progress at the same time
+        @param useCache: GET requests use the http cache (see ITradeHTTPCache)"""
 
         if cookies:
             self.m_cookies=cookies
@@ -80,41 +554,74 @@ class ITradeConnection(object):
         else:
             self.m_proxyAuth=None
 
-        self.m_httpConnection={}   # dict of httplib.HTTPConnection instances (key is host)
-        self.m_httpsConnection={}  # dict of httplib.HTTPSConnection instances (key is host)
-        self.m_response=None       # HTTPResponse of last request
-        self.m_responseData=""     # Content of the http response
-        self.m_duration=0          # Duration of last request
-        self.m_retrying=False      # Flag to indicate if we are retrying after connection failure
-        self.m_locker=Lock()       # Lock to protect httplib strict cycle (get/response) in multithreading
+        self.m_pool=ITradeConnectionPool(maxPerHost) # keep-alive http(s) connections
+        self.m_useCache=useCache
+        self.m_local=local()       # state of the last request, per thread (see state())
+        self.m_locker=Lock()       # Lock to protect proxy settings in multithreading
         self.m_defaultHeader={"acceptEncoding":"gzip, deflate",
                               "accept":"*/*",
                               "userAgent":"Mozilla/5.0 (compatible; iTrade)",
                               "Connection":"Keep-Alive"} # Default HTTP header
 
     def getDataFromUrl(self, url, header=None, data=None):
-        """Thread safe method to get data from an URL. See put() and getData() method for details"""
-        self.m_locker.acquire()
-        result=""
-        try:
+        """Thread safe method to get data from an URL. See put() and getData() method for details.
+        Each thread uses its own connection of the pool : requests are not serialized"""
+        if data or not self.m_useCache:
             self.put(url, header, data)
-            result=self.getData()
-        finally:
-            self.m_locker.release()
-        return result
-
-    def put(self, url, header=None, data=None):
+            return self.getData()
+
+        cache = getHTTPCache()
+        cached = cache.lookup(url)
+        if cached:
+            cachedData, bFresh, conditional = cached
+            if bFresh:
+                return cachedData
+            if conditional:
+                # Conditional request : 304 if the data did not change
+                if header:
+                    header=dict(header)
+                else:
+                    header=dict(self.m_defaultHeader)
+                header.update(conditional)
+
+        self.put(url, header, data)
+        if self.getStatus()==304 and cached:
+            cache.revalidated(url)
+            return cachedData
+        cache.store(url, self.getData(), self.getHeader("etag"), self.getHeader("last-modified"))
+        return self.getData()
+
+    def state(self):
+        """@return: state of the last request of the current thread"""
+        state = self.m_local
+        if not hasattr(state, "response"):
+            state.response=None        # HTTPResponse of last request
+            state.responseData=""      # Content of the http response
+            state.duration=0           # Duration of last request
+            state.retrying=False       # Flag to indicate if we are retrying after connection failure
+            state.stream=None          # (protocole, host, connection, generation) of an unread body
+        return state
+
+    def put(self, url, header=None, data=None, bStream=False):
         """Put a request to url with data parameters (for POST request only).
         No data imply GET request
         @param url: a complete url like http://www.somehost.com/somepath/somepage
         @param header: addon headers for connection (optional, default is None)
-        @param data: dictionary of parameters for POST (optional, default is None)"""
+        @param data: dictionary of parameters for POST (optional, default is None)
+        @param bStream: the body of a 200 answer is not read : see iterChunks()"""
+
+        state = self.state()
+        if state.stream:
+            # Body of the previous response never read
+            self.m_pool.discard(*state.stream)
+            state.stream = None
 
         # Parse URL
         (protocole, host, page, params, query, fragments) = urlparse.urlparse(url)
 
         # print "==>", currentThread().getName(), protocole, host, page, params, query, fragments
 
+        connection = None
         try:
             # Prepare new header
             nextHeader={}
@@ -124,31 +631,23 @@ class ITradeConnection(object):
                 nextHeader=dict(self.m_defaultHeader)
 
             # Go through proxy if defined
-            if self.m_proxy:
-                host = self.m_proxy
+            self.m_locker.acquire()
+            try:
+                proxy = self.m_proxy
+                proxyAuth = self.m_proxyAuth
+            finally:
+                self.m_locker.release()
+            if proxy:
+                host = proxy
                 request = url
-                if self.m_proxyAuth:
-                    nextHeader["Proxy-Authorization"] = self.m_proxyAuth
+                if proxyAuth:
+                    nextHeader["Proxy-Authorization"] = proxyAuth
             else:
                 # Http request does not have host value for direct connection
                 request = "%s?%s" % (page, query)
 
-            if protocole.lower()=="http":
-                if self.m_httpConnection.has_key(host):
-                    # Reuse already opened connection
-                    connection = self.m_httpConnection[host]
-                else:
-                    # Open a new one and save it
-                    connection = httplib.HTTPConnection(host)
-                    self.m_httpConnection[host] = connection
-            else:
-                if self.m_httpsConnection.has_key(host):
-                    # Reuse already opened connection
-                    connection = self.m_httpsConnection[host]
-                else:
-                    # Open a new one and save it
-                    connection = httplib.HTTPSConnection(host)
-                    self.m_httpsConnection[host] = connection
+            # Reuse an already opened connection or open a new one
+            connection, generation = self.m_pool.checkout(protocole, host)
 
             # Add cookie
             if self.m_cookies:
@@ -169,47 +668,44 @@ class ITradeConnection(object):
                     #print "GET", request, nextHeader
                     connection.request("GET", request, None, nextHeader)
 
-                self.response = connection.getresponse()
+                state.response = connection.getresponse()
+                state.stream = None
 
-                if self.response:
-                    if self.response.getheader('Content-Encoding') == 'gzip':
-                        #print "==>", currentThread().getName(), "gzip response"
-                        self.m_responseData = GzipFile(fileobj=StringIO(self.response.read())).read()
+                if bStream and self.getStatus()==200:
+                    # The body is read by iterChunks() : the connection is given back at the end
+                    state.responseData = ""
+                    state.stream = (protocole, host, connection, generation)
+                else:
+                    done = []
+                    if state.response:
+                        state.responseData = "".join(readChunks(state.response, done=done))
                     else:
-                        ldata = self.response.getheader('content-length')
-                        if ldata:
-                            # some servers can return min,max or max,max
-                            #  i.e. "http://www.nysedata.com/nysedata/asp/download.asp?s=txt&prod=symbols" is doing that !
-                            ldata = string.split(ldata, ',')
-                            if ldata and len(ldata)>1:
-                                ldata = int(ldata[0])
-                                self.m_responseData = self.response.read(ldata)
-                            else:
-                                self.m_responseData = self.response.read()
-                        else:
-                            self.m_responseData = self.response.read()
+                        #print "==>", currentThread().getName(), "empty response"
+                        state.responseData = ""
 
-                else:
-                    #print "==>", currentThread().getName(), "empty response"
-                    self.m_responseData = ""
+                    # The response has been read until the end : give back the connection
+                    if done and self.getStatus() in (200, 301, 302, 304):
+                        self.m_pool.checkin(protocole, host, connection, generation)
+                    else:
+                        self.m_pool.discard(protocole, host, connection, generation)
+                connection = None
 
                 # Follow redirect if any with recursion
                 if self.getStatus() in (301, 302):
-                    url = urlparse.urljoin(url, self.response.getheader("location", ""))
-                    self.put(url, nextHeader)
+                    url = urlparse.urljoin(url, state.response.getheader("location", ""))
+                    self.put(url, nextHeader, bStream=bStream)
 
-                self.m_duration = time.time()-start
+                state.duration = time.time()-start
 
-                if self.getStatus() != 200:
+                if self.getStatus() not in (200, 304):
                     msg="Receive bad answer from server (code %s) while requesting : %s" % \
                                                                       (self.getStatus(), url)
                     #info(msg)
-                    self.m_responseData=""
-                    self.clearConnection(protocole, host)
+                    state.responseData=""
                     raise msg
 
                 #Save cookie string
-                for cookieHeader in self.response.msg.getallmatchingheaders("set-cookie"):
+                for cookieHeader in state.response.msg.getallmatchingheaders("set-cookie"):
                     if  cookieHeader and self.m_cookies:
                         if cookieHeader.count(";")>=1 and cookieHeader.count(":")>=1:
                             cookieString=cookieHeader.split(":")[1]
@@ -221,60 +717,143 @@ class ITradeConnection(object):
             except socket.timeout, e:
                 msg="Connexion timeout while requesting the remote server : %s" % url
                 error(msg)
-                self.m_responseData=""
-                self.clearConnection(protocole, host)
+                state.responseData=""
+                if connection:
+                    self.m_pool.discard(protocole, host, connection, generation)
+                    connection = None
                 raise msg
 
             except (socket.gaierror, httplib.CannotSendRequest, httplib.BadStatusLine) , e:
-                self.clearConnection(protocole, host)
-                if not self.m_retrying:
+                if connection:
+                    self.m_pool.discard(protocole, host, connection, generation)
+                    connection = None
+                if not state.retrying:
                     # Retry one time because this kind of error can be "normal"
                     # Eg. after a connection keep-alive timeout
                     #debug("An error occured while requesting the remote server : %s. Retrying" % e)
-                    self.m_retrying=True
-                    self.put(url, header, data) # Retrying one time
-                    self.m_retrying=False
+                    state.retrying=True
+                    self.put(url, header, data, bStream) # Retrying one time
+                    state.retrying=False
                 else:
                     msg="An error occured while requesting the remote server : %s (retry fail)" % e
                     error(msg)
-                    self.m_retrying=False
+                    state.retrying=False
                     raise msg
 
         except Exception, e:
-            self.clearConnections() # Clean all connection
+            if connection:
+                # Connection in an unknown state
+                self.m_pool.discard(protocole, host, connection, generation)
+            state.retrying=False
             msg = "Unhandled exception on ITrade_Connexion (%s)" % e
             error(msg)
             raise msg
 
+    def getLinesFromUrl(self, url, header=None, data=None):
+        """Generator of the lines (without end of line) of an URL : the body is read,
+        decoded and split as it arrives, the memory used does not depend on its size.
+        Same requests and http cache as getDataFromUrl()"""
+        if data or not self.m_useCache:
+            self.put(url, header, data, bStream=True)
+            for eachLine in splitLines(self.iterChunks()):
+                yield eachLine
+            return
+
+        cache = getHTTPCache()
+        cached = cache.lookup(url, bOpen=True)
+        if cached:
+            cachedFile, bFresh, conditional = cached
+            if bFresh:
+                for eachLine in splitLines(readFileChunks(cachedFile)):
+                    yield eachLine
+                return
+            if conditional:
+                # Conditional request : 304 if the data did not change
+                if header:
+                    header=dict(header)
+                else:
+                    header=dict(self.m_defaultHeader)
+                header.update(conditional)
+
+        try:
+            self.put(url, header, data, bStream=True)
+        except:
+            if cached:
+                cachedFile.close()
+            raise
+        if self.getStatus()==304 and cached:
+            cache.revalidated(url)
+            for eachLine in splitLines(readFileChunks(cachedFile)):
+                yield eachLine
+            return
+        if cached:
+            cachedFile.close()
+
+        chunks = self.iterChunks()
+        writer = cache.writer(url, self.getHeader("etag"), self.getHeader("last-modified"))
+        if writer:
+            chunks = writer.tee(chunks)
+        for eachLine in splitLines(chunks):
+            yield eachLine
+
+    def iterChunks(self, chunkSize=16384):
+        """Generator of the decoded chunks of the body of the last response of the
+        current thread. The body of a put(bStream=True) is read from the connection,
+        given back to the pool at the end (closed if the body is not read until the end)"""
+        state = self.state()
+        stream = state.stream
+        state.stream = None
+        if stream==None:
+            # the body is already read
+            if state.responseData:
+                yield state.responseData
+            return
+
+        protocole, host, connection, generation = stream
+        done = []
+        try:
+            for chunk in readChunks(state.response, chunkSize, done):
+                yield chunk
+        finally:
+            if done:
+                self.m_pool.checkin(protocole, host, connection, generation)
+            else:
+                self.m_pool.discard(protocole, host, connection, generation)
+
     def getData(self):
         """@return:  page source code (gunzip if needed) or binary data as a str"""
-        return self.m_responseData
+        return self.state().responseData
 
     def getStatus(self):
         """@return:  http status code of last request"""
-        if self.response:
-            return self.response.status
+        state = self.state()
+        if state.response:
+            return state.response.status
         else:
             return 0
 
+    def getHeader(self, name):
+        """@return:  value of the header of the last response (None if not present)"""
+        state = self.state()
+        if state.response:
+            return state.response.getheader(name)
+        else:
+            return None
+
     def getDuration(self):
         """@return:  last request duration in seconds"""
-        return self.m_duration
+        return self.state().duration
 
     def clearConnection(self, protocole, host):
-        """Clear connexion for given host and protocole
+        """Clear idle connexions for given host and protocole
         @param protocole: protocole of connection to be cleared (http or https, not case sensitive)
         @param host: host of connection to be cleared"""
-        if protocole.lower()=="http":
-            del self.m_httpConnection[host]
-        else:
-            del self.m_httpsConnection[host]
+        self.m_pool.clear(protocole, host)
 
     def clearConnections(self):
         """Clear all http and https connexion to start up on clean base"""
         debug("Cleaning up http(s) connections")
-        self.m_httpConnection={}
-        self.m_httpsConnection={}
+        self.m_pool.clear()
 
     def setProxy(self, proxy=None, proxyAuth=None):
         """Use the given proxy for connexions. All connexions will be cleared to use proxy at next connextion.
@@ -39,6 +39,8 @@
 # python system
 import logging
 import string
+import time
+from threading import Lock
 
 # iTrade system
 from itrade_logging import *
@@ -95,10 +97,11 @@ def buildListOfSupportedCurrencies():
 
 class Currencies(object):
     def __init__(self):
-        # url
-        self.m_url = 'http://finance.yahoo.com/d/quotes.csv?s=%s%s=X&f=s4l1t1c1ghov&e=.csv'
+        # url : one request for a list of symbols (i.e. EURUSD=X+GBPUSD=X)
+        self.m_url = 'http://finance.yahoo.com/d/quotes.csv?s=%s&f=sl1&e=.csv'
 
         self.m_connection = None
+        self.m_locker = Lock()
 
         # to-from
         self.m_currencies = {}
@@ -107,6 +110,15 @@ class Currencies(object):
             curTo,curFrom = eachCur
             self.update(curTo,curFrom,1.0)
 
+        # base rates : value of one unit of each currency in the base currency
+        # (itrade_config.currencyBase) and time of the last download
+        self.m_base = {}
+        self.m_basetime = 0
+
+        # (to,from) -> rate of all the pairs (see convert())
+        self.m_matrix = {}
+        self.rebuild()
+
     def list(self):
         return self.m_list
 
@@ -133,6 +145,16 @@ class Currencies(object):
                     # debug('%s ::: %s' % (eachLine,item))
                     self.update(item[0],item[1],float(item[2]))
 
+            # base rates of the cached pairs (to be refreshed : no time)
+            base = itrade_config.currencyBase
+            for curFrom in self.symbols():
+                key = self.key(base,curFrom)
+                if self.m_currencies.has_key(key):
+                    used,rate = self.m_currencies[key]
+                    self.m_base[curFrom] = rate
+            self.m_base[base] = 1.0
+            self.rebuild()
+
     def save(self,fn=None):
         # generate list of strings TO;FROM;RATE
         curs = []
@@ -148,6 +170,16 @@ class Currencies(object):
     def key(self,curTo,curFrom):
         return curTo.upper() + curFrom.upper()
 
+    def rebuild(self):
+        # flat matrix of the rates of all the pairs, the same currency included
+        matrix = {}
+        for key in self.m_currencies.keys():
+            used,rate = self.m_currencies[key]
+            matrix[(key[:3],key[3:])] = rate
+        for eachCur in currencies_CUR.keys():
+            matrix[(eachCur,eachCur)] = 1.0
+        self.m_matrix = matrix
+
     def rate(self,curTo,curFrom):
         if curTo == curFrom:
             return 1.0
@@ -159,7 +191,10 @@ class Currencies(object):
             return 1.0
 
     def convert(self,curTo,curFrom,Value):
-        rate = self.rate(curTo,curFrom)
+        try:
+            rate = self.m_matrix[(curTo,curFrom)]
+        except KeyError:
+            rate = self.rate(curTo,curFrom)
         #print 'convert: value:%f from:%s to:%s rate=%f retval=%f' % (Value,curFrom,curTo,rate,Value*rate)
         return Value * rate
 
@@ -198,58 +233,93 @@ class Currencies(object):
     _s1 = { "GBX": "GBP", }
     _s2 = { "GBX": 100.0, }
 
-    def get(self,curTo,curFrom):
+    def symbols(self):
+        # currencies downloaded against the base currency : the pence and the
+        # other pairs are derived
+        base = itrade_config.currencyBase
+        lst = []
+        for eachCur in list_of_currencies():
+            if eachCur!=base and not eachCur in self._s1.keys():
+                lst.append(eachCur)
+        return lst
+
+    def isfresh(self):
+        return time.time() < self.m_basetime + itrade_config.currencyTTL
+
+    def refresh(self,bForce=False):
+        # download the base rates in one request (if they are stale) then
+        # derive the rates of all the pairs. Return True if the rates are fresh
         if not itrade_config.isConnected():
-            return None
-
-        if self.m_connection==None:
-            self.m_connection = ITradeConnection(cookies = None,
-                               proxy = itrade_config.proxyHostname,
-                               proxyAuth = itrade_config.proxyAuthentication,
-                               connectionTimeout = itrade_config.connectionTimeout
-                               )
-            #print "**** Create Currency Connection"
-
-        # pence
-        if curFrom in self._s1.keys():
-            a = self._s1[curFrom]
-        else:
-            a = curFrom
-        if curTo in self._s1.keys():
-            b = self._s1[curTo]
-        else:
-            b = curTo
+            return False
 
-        # get data
-        url = self.m_url % (a,b)
+        self.m_locker.acquire()
         try:
-            buf = self.m_connection.getDataFromUrl(url)
-        except:
-            return None
-
-        # extract data
-        #print url,buf
-        sdata = string.split(buf, ',')
-        f = float(sdata[1])
-
-        # pence
-        if curFrom in self._s2.keys():
-            f = f / self._s2[curFrom]
-        if curTo in self._s2.keys():
-            f = f * self._s2[curTo]
+            if not bForce and self.isfresh():
+                return True
+
+            if self.m_connection==None:
+                self.m_connection = ITradeConnection(cookies = None,
+                                   proxy = itrade_config.proxyHostname,
+                                   proxyAuth = itrade_config.proxyAuthentication,
+                                   connectionTimeout = itrade_config.connectionTimeout
+                                   )
+                #print "**** Create Currency Connection"
+
+            # get data
+            base = itrade_config.currencyBase
+            lst = self.symbols()
+            url = self.m_url % string.join(['%s%s=X' % (eachCur,base) for eachCur in lst],'+')
+            try:
+                buf = self.m_connection.getDataFromUrl(url)
+            except:
+                return False
+
+            # extract data : "EURUSD=X",1.0850
+            #print url,buf
+            nb = 0
+            for eachLine in string.split(buf,'\n'):
+                sdata = string.split(eachLine.strip(),',')
+                if len(sdata)<2:
+                    continue
+                cur = sdata[0].strip('"')[:3]
+                if not cur in lst:
+                    continue
+                try:
+                    f = float(sdata[1])
+                except ValueError:
+                    continue
+                if f>0.0:
+                    self.m_base[cur] = f
+                    nb = nb + 1
+            if nb==0:
+                return False
+            self.m_base[base] = 1.0
+            self.m_basetime = time.time()
+
+            # derive the pairs : 1 curFrom = base[curFrom]/base[curTo] curTo
+            bases = self.m_base.copy()
+            for eachCur in self._s1.keys():
+                if bases.has_key(self._s1[eachCur]):
+                    bases[eachCur] = bases[self._s1[eachCur]] / self._s2[eachCur]
+            for curTo,curFrom in self.m_list:
+                if bases.has_key(curTo) and bases.has_key(curFrom):
+                    self.update(curTo,curFrom,bases[curFrom] / bases[curTo])
+            self.rebuild()
+            return True
+        finally:
+            self.m_locker.release()
 
-        #print 'get: %s %s rate = %.4f' %(curTo,curFrom,float(sdata[1]))
-        return self.update(curTo,curFrom,f)
+    def get(self,curTo,curFrom):
+        # rate of the pair : the base rates are downloaded once per
+        # itrade_config.currencyTTL for all the pairs
+        if not self.refresh():
+            return None
+        return self.rate(curTo,curFrom)
 
     def getlasttrade(self,bAllEvenNotInUse=False):
-        if not itrade_config.isConnected():
-            return
-        for eachCurrency in self.m_currencies:
-            curTo = eachCurrency[:3]
-            curFrom = eachCurrency[3:]
-            if bAllEvenNotInUse or self.used(curTo,curFrom):
-                self.get(curTo,curFrom)
-        self.save()
+        # one request whatever the number of pairs in use
+        if self.refresh(bForce=True):
+            self.save()
 
 # ============================================================================
 # Export
@@ -44,6 +44,9 @@ import logging
 import string
 import re
 
+# numpy
+import numpy
+
 # iTrade system
 from itrade_logging import *
 from itrade_local import getShortDateFmt
@@ -90,6 +93,19 @@ def jjmmaa2yyyymmdd(d):
     year = yy2yyyy(d[2])
     return year + month + day
 
+def str2date(d):
+    # YYYY-MM-DD or YYYYMMDD to date (without the Datation overhead)
+    if d[4]=='-':
+        return date(int(d[0:4]),int(d[5:7]),int(d[8:10]))
+    else:
+        return date(int(d[0:4]),int(d[4:6]),int(d[6:8]))
+
+def date2ordinal(d):
+    # date or ordinal to ordinal
+    if isinstance(d,date):
+        return d.toordinal()
+    return int(d)
+
 # ============================================================================
 # date2str
 # ============================================================================
@@ -119,10 +135,12 @@ SUNDAY = 6
 class Calendar(object):
     def __init__(self):
         self.m_closed = {}
-        self.m_index = {}
-        self.m_date = {}
+        self.m_closeddates = {}
+        self.m_markets = {}
         self.m_srd = {}
         self.m_maxidx = 0
+        self.m_first = 0
+        self.m_base = 0
         self.load()
         self.indexme()
 
@@ -217,6 +235,9 @@ class Calendar(object):
         else:
             # add it in the closed list
             self.m_closed[k] = (market,title)
+            self.m_closeddates.setdefault(market,[]).append(d.date())
+            if self.m_markets.has_key(market):
+                del self.m_markets[market]
             debug('Calendar::addClosed(): %s k=%s: %s - added' % (d,k,self.m_closed[k]));
             return True
 
@@ -266,49 +287,88 @@ class Calendar(object):
                         info("can't import item=%s" % item)
 
     # --- [ index management ] ------------------------------------
+    #
+    # each weekday from the 1st january of the first trading year to the 5th
+    # january after the current year has an index (0 for the first one).
+    #
+    # The index is computed : weekdays are counted from m_base, the ordinal
+    # of the monday of the first week, i.e. 5 weekdays per week plus the
+    # weekday in the week. m_first is the count of the first indexed day.
+
+    def _count(self,o):
+        # number of weekdays between m_base and ordinal o (o is a weekday)
+        weeks,wd = divmod(o - self.m_base,7)
+        return weeks*5 + wd
 
     def indexme(self):
-        self.m_maxidx = 0
         year = date.today().year - itrade_config.numTradeYears + 1
-        num = (itrade_config.numTradeYears * (12*31)) + 5
-        while num > 0:
-            #print '--- index datation --%d--' % year
-            month = 1
-            while month <= 12 and num>0:
-                #print '--- index datation --%d--' % month
-                day = 1
-                while day <= 31 and num>0:
-                    #print '--- index datation --%d--' % day
-                    try:
-                        d = date(year,month,day)
-                        #d = Datation(d)
-                        if d.weekday()<SATURDAY:
-                        #if self.isopen(d):
-                            #print 'num=%d - index %s = %d' % (num,d,self.m_maxidx)
-                            self.m_index[d] = self.m_maxidx
-                            self.m_date[self.m_maxidx] = d
-                            self.m_maxidx = self.m_maxidx + 1
-                        else:
-                            #print 'num=%d - index %s = closed' % (num,d)
-                            pass
-                    except ValueError:
-                        pass
-                    day = day + 1
-                    num = num - 1
-                month = month + 1
-            year = year + 1
+        first = date(year,1,1)
+        last = date(year + itrade_config.numTradeYears,1,5)
+        self.m_base = first.toordinal() - first.weekday()
+
+        # first and last weekdays
+        while first.weekday()>=SATURDAY:
+            first = first + timedelta(1)
+        while last.weekday()>=SATURDAY:
+            last = last - timedelta(1)
+
+        self.m_first = self._count(first.toordinal())
+        self.m_maxidx = self._count(last.toordinal()) - self.m_first + 1
 
     def index(self,_date):
-        if self.m_index.has_key(_date):
-            return self.m_index[_date]
-        else:
+        if not isinstance(_date,date):
+            return -1
+        o = _date.toordinal()
+        weeks,wd = divmod(o - self.m_base,7)
+        if wd>=SATURDAY:
             return -1
+        idx = weeks*5 + wd - self.m_first
+        if idx<0 or idx>=self.m_maxidx:
+            return -1
+        return idx
+
+    def ordinal(self,_index):
+        # ordinal of the date at a given index (no check)
+        weeks,wd = divmod(_index + self.m_first,5)
+        return self.m_base + weeks*7 + wd
 
     def date(self,_index):
-        if self.m_date.has_key(_index):
-            return self.m_date[_index]
-        else:
+        try:
+            i = int(_index)
+        except (TypeError,ValueError):
             return None
+        if i!=_index or i<0 or i>=self.m_maxidx:
+            return None
+        return date.fromordinal(self.ordinal(i))
+
+    # --- [ vectorized index management ] -------------------------
+
+    def index_many(self,dates):
+        # dates are date objects or ordinals ; return a numpy array of indexes
+        # (-1 for week-end or out of range dates)
+        if isinstance(dates,numpy.ndarray) and dates.dtype.kind in 'iu':
+            o = dates.astype(numpy.int64)
+        else:
+            o = numpy.array([date2ordinal(d) for d in dates],numpy.int64)
+        weeks,wd = numpy.divmod(o - self.m_base,7)
+        idx = weeks*5 + wd - self.m_first
+        return numpy.where((wd<SATURDAY) & (idx>=0) & (idx<self.m_maxidx),idx,-1)
+
+    def ordinal_many(self,indices):
+        # return a numpy array of ordinals (0 for invalid indexes)
+        i = numpy.asarray(indices,numpy.int64)
+        weeks,wd = numpy.divmod(i + self.m_first,5)
+        return numpy.where((i>=0) & (i<self.m_maxidx),self.m_base + weeks*7 + wd,0)
+
+    def date_many(self,indices):
+        # return a list of date objects (None for invalid indexes)
+        ret = []
+        for o in self.ordinal_many(indices).tolist():
+            if o>0:
+                ret.append(date.fromordinal(o))
+            else:
+                ret.append(None)
+        return ret
 
     def lastindex(self):
         return self.m_maxidx - 1
@@ -316,6 +376,83 @@ class Calendar(object):
     def lastdate(self):
         return self.date(self.lastindex())
 
+    # --- [ per market index ] ------------------------------------
+
+    def marketcalendar(self,market=None):
+        # default Market Entry Place
+        if market==None:
+            market = 'EURONEXT'
+
+        if not self.m_markets.has_key(market):
+            closed = self.index_many(self.m_closeddates.get(market,[]))
+            self.m_markets[market] = MarketCalendar(self,market,closed[closed>=0])
+        return self.m_markets[market]
+
+# ============================================================================
+# MarketCalendar
+#
+# trading days of one market : weekdays of the Calendar minus the days
+# closed for this market (closed.txt). Days are indexed from 0 without
+# holes ; the global index (gCal) and the market index are mapped both ways.
+# ============================================================================
+
+class MarketCalendar(object):
+    def __init__(self,cal,market,closed):
+        self.m_cal = cal
+        self.m_market = market
+
+        mask = numpy.ones(cal.lastindex()+1,bool)
+        mask[closed] = False
+
+        # market index -> global index
+        self.m_globals = numpy.flatnonzero(mask)
+
+        # global index -> market index (-1 if the market is closed)
+        self.m_locals = numpy.cumsum(mask) - 1
+        self.m_locals[~mask] = -1
+
+    def market(self):
+        return self.m_market
+
+    def lastindex(self):
+        return len(self.m_globals) - 1
+
+    def globals(self):
+        # array of the global indexes of the trading days
+        return self.m_globals
+
+    def toglobal(self,i):
+        if i<0 or i>=len(self.m_globals):
+            return -1
+        return int(self.m_globals[i])
+
+    def fromglobal(self,gi):
+        if gi<0 or gi>=len(self.m_locals):
+            return -1
+        return int(self.m_locals[gi])
+
+    def toglobal_many(self,indices):
+        i = numpy.asarray(indices,numpy.int64)
+        ok = (i>=0) & (i<len(self.m_globals))
+        return numpy.where(ok,self.m_globals[numpy.where(ok,i,0)],-1)
+
+    def fromglobal_many(self,indices):
+        gi = numpy.asarray(indices,numpy.int64)
+        ok = (gi>=0) & (gi<len(self.m_locals))
+        return numpy.where(ok,self.m_locals[numpy.where(ok,gi,0)],-1)
+
+    def isopen(self,d):
+        return self.index(d)!=-1
+
+    def index(self,_date):
+        return self.fromglobal(self.m_cal.index(_date))
+
+    def date(self,_index):
+        gi = self.toglobal(_index)
+        if gi==-1:
+            return None
+        return self.m_cal.date(gi)
+
 # ============================================================================
 # Datation
 #
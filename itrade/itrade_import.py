@@ -38,27 +38,31 @@
 
 # python system
 import logging
+import threading
 from datetime import *
+import time
 
 # iTrade system
 from itrade_logging import *
 import itrade_config
+from itrade_datation import Datation
 
 # ============================================================================
 # Importation from internet : HISTORIC
 # (update) a quote
 # ============================================================================
 
-def import_from_internet(quote,fromdate=None,todate=None):
-    bRet = False
+def fetch_from_internet(quote,fromdate=None,todate=None):
+    # network part of import_from_internet() : return the data or None
+    data = None
 
     if quote.ticker()=='':
         info("import_from_internet(%s): no ticker" % quote.isin())
-        #return bRet
+        #return data
 
     if not itrade_config.isConnected():
         info("import_from_internet(%s): no connexion" % quote.ticker())
-        return bRet
+        return data
 
     abc = quote.importconnector()
     if abc and abc.connect():
@@ -68,28 +72,326 @@ def import_from_internet(quote,fromdate=None,todate=None):
             #debug("state=%s" % (state))
             #debug('import historic %s from %s ...' % (quote.ticker(),abc.name()))
             data = abc.getdata(quote,fromdate,todate)
-            if data!=None:
-                if data:
-                    #debug('import_from_internet(%s): data:%s'% (quote.ticker(),data))
-                    quote.importTrades(data,bLive=False)
-                    bRet = True
-                else:
-                    if itrade_config.verbose:
-                        print "import_from_internet(%s): nodata [%s,%s)" % (quote.ticker(),fromdate,todate)
-                    bRet = False
-            else:
-                if itrade_config.verbose:
-                    print "import_from_internet(%s): nodata [%s,%s)" % (quote.ticker(),fromdate,todate)
-                bRet = False
         else:
             print "import_from_internet(%s): getstate() failure :-(" % quote.ticker()
-            bRet = False
 
         abc.disconnect()
-        return bRet
+        return data
     else:
         print "import_from_internet(%s): connect() failure :-(" % quote.ticker()
-        return bRet
+        return data
+
+def merge_from_internet(quote,data,fromdate=None,todate=None):
+    # merge the data returned by fetch_from_internet() into the trades
+    if data:
+        #debug('import_from_internet(%s): data:%s'% (quote.ticker(),data))
+        quote.importTrades(data,bLive=False)
+        return True
+    else:
+        if itrade_config.verbose:
+            print "import_from_internet(%s): nodata [%s,%s)" % (quote.ticker(),fromdate,todate)
+        return False
+
+def import_from_internet(quote,fromdate=None,todate=None):
+    data = fetch_from_internet(quote,fromdate,todate)
+    return merge_from_internet(quote,data,fromdate,todate)
+
+# ============================================================================
+# ImportPool
+#
+# historic imports of several quotes and/or periods : the data are fetched
+# in parallel by a pool of worker threads, with a limit of requests in
+# progress and a minimal delay between two requests for each connector.
+# The data are merged into the trades by the caller thread, in the order of
+# the jobs (quotes of the portfolio first), whatever the order of arrival.
+# ============================================================================
+
+class ImportJob(object):
+    def __init__(self,quote,fromdate,todate,priority,period=0,bOptional=False,bCanStop=False):
+        self.m_quote = quote
+        self.m_fromdate = fromdate
+        self.m_todate = todate
+        self.m_priority = priority
+        abc = quote.importconnector()
+        if abc:
+            self.m_connector = abc.name()
+        else:
+            self.m_connector = None
+
+        # requests in progress at the same time on the connector : the
+        # connect()/getstate()/getdata()/disconnect() sequence of a connector
+        # keeping a state between the calls can not be shared by the workers
+        if abc and hasattr(abc,'threadsafe') and abc.threadsafe():
+            self.m_maxactive = itrade_config.importMaxPerConnector
+        else:
+            self.m_maxactive = 1
+
+        # history of a quote : periods (older last), stop after the first
+        # period without data
+        self.m_period = period
+        self.m_optional = bOptional
+        self.m_canstop = bCanStop
+
+        # hole inside the history : the days still missing once the
+        # connector has answered are known gaps (see Trades.addKnownGaps)
+        self.m_knowngaps = False
+
+        self.m_fetched = False
+        self.m_data = None
+        self.m_ok = False
+        self.m_skipped = False
+
+class ImportPool(object):
+    def __init__(self,workers=None):
+        if workers==None:
+            workers = itrade_config.importWorkers
+        self.m_workers = max(workers,1)
+        self.m_jobs = []
+        self.m_pending = []
+        self.m_stop = {}
+        self.m_active = {}
+        self.m_last = {}
+        self.m_cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.m_jobs)
+
+    def add(self,quote,fromdate,todate,priority=None,period=0,bOptional=False,bCanStop=False):
+        if priority==None:
+            # portfolio first
+            if quote.isTraded():
+                priority = 0
+            else:
+                priority = 1
+        job = ImportJob(quote,fromdate,todate,priority,period,bOptional,bCanStop)
+        self.m_jobs.append(job)
+        return job
+
+    def addHistory(self,quote,priority=None):
+        # same periods as a full import of the quote (see
+        # cmdline_importQuoteFromInternet)
+        year = date.today().year
+        ic = quote.importconnector()
+        spl = False
+        if ic:
+            step = ic.interval_year()
+            if step == 0.5:
+                spl = True
+                step = 1
+        else:
+            step = 1
+        nyear = 0
+        while nyear < itrade_config.numTradeYears:
+            # SF bug 1625731 : at the year begins, it's possible there is no
+            # data but iTrade needs to continue importing previous years ...
+            bCanStop = year != date.today().year
+            if spl:
+                self.add(quote,date(year-step+1,1,1),date(year,6,30),priority,nyear,True,bCanStop)
+                self.add(quote,date(year-step+1,7,1),date(year,12,31),priority,nyear,True,bCanStop)
+            else:
+                self.add(quote,date(year-step+1,1,1),date(year,12,31),priority,nyear,True,bCanStop)
+            nyear = nyear + step
+            year = year - step
+
+    def addGaps(self,quote,fromdate=None,todate=None,priority=None):
+        # import only the ranges of trading days missing in the history of the
+        # quote between fromdate (default: first trade) and todate (default:
+        # last open day). Near ranges are merged (itrade_config.importGapMerge)
+        # then split on the periods of the connector. The ranges before the
+        # first trade are periods of history (stop after the first period
+        # without data), the other ones are optional except the last one.
+        # The known gaps are not requested again (see Trades.addKnownGaps).
+        if quote.trades()==None:
+            quote.loadTrades()
+        if todate==None:
+            todate = Datation(date.today()).prevopen(quote.market()).date()
+        first = quote.trades().firsttrade()
+        if fromdate==None:
+            if first:
+                fromdate = first.date()
+            else:
+                fromdate = date(date.today().year-itrade_config.numTradeYears+1,1,1)
+        if fromdate>todate:
+            return 0
+
+        ranges = []
+        for start,end in quote.gaps(fromdate,todate,itrade_config.importMinGap):
+            if ranges and (start-ranges[-1][1]).days <= itrade_config.importGapMerge:
+                ranges[-1] = (ranges[-1][0],end)
+            else:
+                ranges.append((start,end))
+
+        ic = quote.importconnector()
+        if ic:
+            step = ic.interval_year()
+        else:
+            step = 1
+
+        nb = 0
+        for start,end in ranges:
+            bLeading = first==None or end<first.date()
+            bOptional = end!=todate
+            # periods of the connector, the most recent first (stop rule)
+            year = end.year
+            period = 0
+            while year >= start.year:
+                if step == 0.5:
+                    windows = [(date(year,7,1),date(year,12,31)),(date(year,1,1),date(year,6,30))]
+                    nstep = 1
+                else:
+                    nstep = max(int(step),1)
+                    windows = [(date(year-nstep+1,1,1),date(year,12,31))]
+                for wstart,wend in windows:
+                    wstart = max(wstart,start)
+                    wend = min(wend,end)
+                    if wstart<=wend:
+                        if bLeading:
+                            bCanStop = year != date.today().year
+                            self.add(quote,wstart,wend,priority,period,bOptional,bCanStop)
+                        else:
+                            job = self.add(quote,wstart,wend,priority,0,bOptional)
+                            # not the last range : its days are published
+                            job.m_knowngaps = bOptional
+                        nb = nb + 1
+                year = year - nstep
+                period = period + nstep
+        return nb
+
+    def status(self,quote):
+        # None if nothing to import for the quote, True if all the mandatory
+        # imports succeeded
+        ret = None
+        for eachJob in self.m_jobs:
+            if eachJob.m_quote is quote:
+                if eachJob.m_optional:
+                    if ret==None:
+                        ret = True
+                else:
+                    ret = (ret!=False) and eachJob.m_ok
+        return ret
+
+    # --- [ workers ] ---
+
+    def _stopped(self,job):
+        stop = self.m_stop.get(id(job.m_quote))
+        return stop!=None and job.m_period>stop
+
+    def _next(self):
+        # (called with the lock) first pending job allowed to start now or
+        # (None,delay before the next one)
+        now = time.time()
+        delay = None
+        for eachJob in self.m_pending[:]:
+            if self._stopped(eachJob):
+                eachJob.m_skipped = True
+                self.m_pending.remove(eachJob)
+                continue
+            name = eachJob.m_connector
+            if self.m_active.get(name,0) >= eachJob.m_maxactive:
+                continue
+            wait = self.m_last.get(name,0.0) + itrade_config.importMinInterval - now
+            if wait>0:
+                if delay==None or wait<delay:
+                    delay = wait
+                continue
+            self.m_pending.remove(eachJob)
+            self.m_active[name] = self.m_active.get(name,0) + 1
+            self.m_last[name] = now
+            return eachJob,None
+        return None,delay
+
+    def _worker(self):
+        while True:
+            self.m_cond.acquire()
+            try:
+                job = None
+                while job==None:
+                    if not self.m_pending:
+                        return
+                    job,delay = self._next()
+                    # _next() can empty the pending jobs (stopped history)
+                    if job==None and self.m_pending:
+                        self.m_cond.wait(delay)
+            finally:
+                self.m_cond.release()
+
+            try:
+                data = fetch_from_internet(job.m_quote,job.m_fromdate,job.m_todate)
+            except:
+                print "import_from_internet(%s): exception :-(" % job.m_quote.ticker()
+                data = None
+
+            self.m_cond.acquire()
+            job.m_data = data
+            job.m_fetched = True
+            self.m_active[job.m_connector] = self.m_active[job.m_connector] - 1
+            self.m_cond.notifyAll()
+            self.m_cond.release()
+
+    def run(self,progress=None):
+        # fetch and merge all the jobs ; progress(done,total,quote) is called
+        # after each merge and can return False to cancel the remaining jobs.
+        # Return the number of jobs merged with data
+        order = [(eachJob.m_priority,n,eachJob) for n,eachJob in enumerate(self.m_jobs)]
+        order.sort()
+        jobs = [eachJob for p,n,eachJob in order]
+        self.m_pending = jobs[:]
+
+        threads = []
+        for n in range(min(self.m_workers,len(jobs))):
+            t = threading.Thread(target=self._worker,name='ImportPool-%d' % n)
+            t.setDaemon(True)
+            t.start()
+            threads.append(t)
+
+        nok = 0
+        done = 0
+        for eachJob in jobs:
+            self.m_cond.acquire()
+            while not eachJob.m_fetched and not eachJob.m_skipped and not self._stopped(eachJob):
+                self.m_cond.wait(1.0)
+            self.m_cond.release()
+
+            if eachJob.m_fetched and not self._stopped(eachJob):
+                eachJob.m_ok = merge_from_internet(eachJob.m_quote,eachJob.m_data,eachJob.m_fromdate,eachJob.m_todate)
+                if eachJob.m_knowngaps and eachJob.m_data!=None:
+                    # the connector answered (None is a failure) : do not
+                    # request again the days it has no trade for
+                    eachJob.m_quote.addKnownGaps(eachJob.m_fromdate,eachJob.m_todate)
+                if eachJob.m_ok:
+                    nok = nok + 1
+                elif eachJob.m_canstop:
+                    self.m_cond.acquire()
+                    self.m_stop[id(eachJob.m_quote)] = eachJob.m_period
+                    self.m_cond.release()
+            else:
+                eachJob.m_skipped = True
+            eachJob.m_data = None
+
+            done = done + 1
+            if progress:
+                if progress(done,len(jobs),eachJob.m_quote)==False:
+                    # cancel what is not started yet
+                    self.m_cond.acquire()
+                    for eachPending in self.m_pending:
+                        eachPending.m_skipped = True
+                    self.m_pending = []
+                    self.m_cond.notifyAll()
+                    self.m_cond.release()
+                    progress = None
+
+        for t in threads:
+            t.join()
+        return nok
+
+def dlgProgress(dlg,maxval,bName=False):
+    # ImportPool.run() progress on a wx.ProgressDialog of 'maxval' steps
+    # (with the name of the quote just imported if bName)
+    def progress(done,total,quote):
+        if bName:
+            return dlg.Update(done*(maxval-1)/total,quote.name())
+        return dlg.Update(done*(maxval-1)/total)
+    return progress
 
 # ============================================================================
 # LiveUpdate from internet : LIVE
@@ -159,42 +461,57 @@ def liveupdate_from_internet(quote):
         abc.release()
         return bRet
 
+def liveupdate_prefetch(quotes):
+    # one request for the open quotes of each live connector able to batch
+    # (getdata_many) : liveupdate_from_internet() of these quotes is then
+    # served from the cache of the connector
+    if not itrade_config.isConnected():
+        return
+
+    connectors = {}
+    for eachQuote in quotes:
+        abc = eachQuote.liveconnector()
+        if abc and hasattr(abc,'getdata_many') and eachQuote.isOpen():
+            connectors.setdefault(id(abc),(abc,[]))[1].append(eachQuote)
+
+    for abc,eachList in connectors.values():
+        abc.acquire()
+        try:
+            if abc.connect():
+                if abc.getstate():
+                    abc.getdata_many(eachList)
+                abc.disconnect()
+        finally:
+            abc.release()
+
+def liveupdate_many_from_internet(quotes):
+    # return the number of quotes updated
+    liveupdate_prefetch(quotes)
+    n = 0
+    for eachQuote in quotes:
+        if liveupdate_from_internet(eachQuote):
+            n = n + 1
+    return n
+
 # ============================================================================
 # CommandLine : -i / import a quote
 # ============================================================================
 
 def cmdline_importQuoteFromInternet(quote,dlg=None):
-    year = date.today().year
-    ic = quote.importconnector()
-    spl = False
-    if ic:
-        step = ic.interval_year()
-        if step == 0.5:
-            spl = True
-            step = 1
+    if itrade_config.verbose:
+        print '--- update the quote -- %d years ---' % itrade_config.numTradeYears
+    pool = ImportPool()
+    if quote.trades()==None:
+        quote.loadTrades()
+    if quote.trades().lastimport():
+        # only the missing ranges of the history
+        pool.addGaps(quote,date(date.today().year-itrade_config.numTradeYears+1,1,1))
     else:
-        step = 1
-    nyear = 0
-    bStop = False
-    while (not bStop) and (nyear < itrade_config.numTradeYears):
-        if itrade_config.verbose:
-            print '--- update the quote -- %d to %d ---' % (year-step+1,year)
-        if spl:
-            if not import_from_internet(quote,date(year-step+1,1,1),date(year,6,30)):
-                bStop = True
-            if not import_from_internet(quote,date(year-step+1,7,1),date(year,12,31)):
-                bStop = True
-        else:
-            if not import_from_internet(quote,date(year-step+1,1,1),date(year,12,31)):
-                bStop = True
-        if year == date.today().year:
-            # SF bug 1625731 : at the year begins, it's possible import_from_internet returns no data
-            # but iTrade needs to continue importing previous years ...
-            bStop = False
-        if dlg:
-            dlg.Update(nyear)
-        nyear = nyear + step
-        year = year - step
+        pool.addHistory(quote)
+    if dlg:
+        pool.run(dlgProgress(dlg,itrade_config.numTradeYears))
+    else:
+        pool.run()
     if itrade_config.verbose:
         print '--- save the quote data ------'
     quote.saveTrades()
@@ -219,16 +536,18 @@ def cmdline_importQuoteFromFile(quote,file):
 # ============================================================================
 
 def cmdline_importMatrixFromInternet(matrix,dlg=None):
-    year = date.today().year
-    nyear = 0
-    while nyear < itrade_config.numTradeYears:
-        if itrade_config.verbose:
-            print '--- update the matrix --%d--' % year
-        matrix.update(date(year,1,1),date(year,12,31))
-        if dlg:
-            dlg.Update(nyear)
-        nyear = nyear + 1
-        year = year -1
+    pool = ImportPool()
+    for eachQuote in matrix.list():
+        # only the missing ranges of the history
+        pool.addGaps(eachQuote,date(date.today().year-itrade_config.numTradeYears+1,1,1))
+    if itrade_config.verbose:
+        print '--- update the matrix -- %d quotes, %d years ---' % (len(matrix.list()),itrade_config.numTradeYears)
+    if dlg:
+        pool.run(dlgProgress(dlg,itrade_config.numTradeYears))
+    else:
+        pool.run()
+    for eachQuote in matrix.list():
+        eachQuote.compute()
     if itrade_config.verbose:
         print '--- save the matrix data -----'
     matrix.saveTrades()
@@ -38,6 +38,9 @@
 # python system
 import logging
 
+# numpy
+import numpy
+
 # iTrade system
 from itrade_logging import *
 import itrade_config
@@ -55,6 +58,455 @@ class BasicIndicator:
     def name(self):
         return self.m_name
 
+# ============================================================================
+# Vectorized indicators
+#
+# Each function computes one indicator column over the whole history in one
+# pass. Columns are the global calendar arrays of Trades where a missing day
+# has a -1 close ; definitions are the ones of the scalar Trades computation :
+#
+#   - moving averages walk back over the last 'period' days with a close,
+#   - a missing close is replaced by the previous known close (0.0 if none),
+#   - min/max windows are 'period' slots long, missing days included.
+#
+# The columns may also be 2D arrays (one row per history, see itrade_panel) :
+# the computation runs along the last axis.
+# ============================================================================
+
+def _shift(a,n,fill):
+    # a[i-n] at index i, fill for i<n
+    ret = numpy.empty_like(a)
+    ret[...,:n] = fill
+    ret[...,n:] = a[...,:a.shape[-1]-n]
+    return ret
+
+def _take(a,idx):
+    # a[idx] of each row (idx : indexes on the last axis, one row per row)
+    if a.ndim==1:
+        return a[idx]
+    return a.ravel().take(idx + numpy.arange(a.shape[0])[:,numpy.newaxis] * a.shape[1])
+
+def lastclose(close):
+    # close of the day or the previous known close (0.0 if none)
+    valid = close>=0.0
+    last = numpy.maximum.accumulate(numpy.where(valid,numpy.arange(close.shape[-1]),-1),axis=-1)
+    return numpy.where(last>=0,_take(close,numpy.maximum(last,0)),0.0)
+
+def prevclose(close):
+    # previous known close, strictly before the day (0.0 if none)
+    return _shift(lastclose(close),1,0.0)
+
+def _window(close,period):
+    # for each day : number of known closes in the window, and the index of
+    # the window bounds in the dense list of known closes
+    valid = close>=0.0
+    k = numpy.cumsum(valid,axis=-1)
+    n = numpy.minimum(k,period)
+    return valid,k,n
+
+def _sums(a,valid,k,n):
+    # sum of the values of the known days of each window : cumulated sums of
+    # the known values only (kept in order, first in each row)
+    if a.ndim==1:
+        known = a[valid]
+    else:
+        known = numpy.zeros(a.shape,a.dtype)
+        rank = k - 1 + numpy.arange(a.shape[0])[:,numpy.newaxis] * a.shape[1]
+        known.ravel()[rank[valid]] = a[valid]
+    cs = numpy.zeros(a.shape[:-1]+(known.shape[-1]+1,),a.dtype)
+    cs[...,1:] = numpy.cumsum(known,axis=-1)
+    return _take(cs,k) - _take(cs,k-n)
+
+def ma(close,period):
+    valid,k,n = _window(close,period)
+    s = _sums(close,valid,k,n)
+    ret = numpy.empty(close.shape)
+    ok = n>0
+    ret[ok] = s[ok] / n[ok]
+    ret[~ok] = -1.0
+    return ret
+
+def vma(close,volume,period):
+    # mean of the volumes of the days with a close (integer division)
+    valid,k,n = _window(close,period)
+    s = _sums(volume.astype(numpy.int64),valid,k,n)
+    ret = numpy.empty(close.shape)
+    ok = n>0
+    ret[ok] = s[ok] // n[ok]
+    ret[~ok] = -1.0
+    return ret
+
+def bollinger(close,period=20):
+    # return (down,middle,up) : MA +/- 2 standard deviations
+    valid,k,n = _window(close,period)
+    s1 = _sums(close,valid,k,n)
+    s2 = _sums(close*close,valid,k,n)
+    dn = numpy.empty(close.shape)
+    m = numpy.empty(close.shape)
+    up = numpy.empty(close.shape)
+    ok = n>0
+    no = n[ok]
+    sm = s1[ok]
+    m[ok] = sm / no
+    ecart = numpy.maximum(s2[ok] - sm*m[ok],0.0)
+    ecart = 2*numpy.sqrt(ecart/no)
+    up[ok] = m[ok] + ecart
+    dn[ok] = m[ok] - ecart
+    dn[~ok] = m[~ok] = up[~ok] = -1.0
+    return dn,m,up
+
+def rsi(close,period=14,depth=140):
+    # Wilder RSI computed for each day over the last 'depth'+1 slots
+    valid = close>=0.0
+    t = numpy.where(valid,close - prevclose(close),0.0)
+    th = numpy.where(t>0,t,0.0)
+    tb = numpy.where(t<0,-t,0.0)
+    p = float(period)
+    h = numpy.zeros(close.shape)
+    b = numpy.zeros(close.shape)
+    idx = numpy.arange(close.shape[-1])
+    # oldest slot of the window first : same accumulation as the scalar code
+    for w in xrange(depth,-1,-1):
+        j = idx - w
+        jj = numpy.maximum(j,0)
+        ok = (j>=0) & valid[...,jj]
+        b = numpy.where(ok,(((p-1.0)*b) + tb[...,jj]) / p,b)
+        h = numpy.where(ok,(((p-1.0)*h) + th[...,jj]) / p,h)
+    ret = numpy.empty(close.shape)
+    zero = b==0.0
+    ret[zero] = 100.0
+    ret[~zero] = 100.0 - (100.0/(1.0+(h[~zero] / b[~zero])))
+    return ret
+
+def _rolling_max(a,w,fill):
+    # max over [i-w+1,i] (van Herk/Gil-Werman : prefix and suffix max by
+    # blocks of w, O(n) whatever the window)
+    n = a.shape[-1]
+    m = n + w - 1
+    nb = (m + w - 1) // w
+    b = numpy.empty(a.shape[:-1]+(nb*w,))
+    b.fill(fill)
+    b[...,w-1:w-1+n] = a
+    blocks = b.reshape(a.shape[:-1]+(nb,w))
+    prefix = numpy.maximum.accumulate(blocks,axis=-1).reshape(b.shape)
+    suffix = numpy.maximum.accumulate(blocks[...,::-1],axis=-1)[...,::-1].reshape(b.shape)
+    return numpy.maximum(suffix[...,0:n],prefix[...,w-1:w-1+n])
+
+def minmax(high,low,period):
+    # (low,high) over the last 'period' slots
+    h = numpy.maximum(_rolling_max(numpy.asarray(high,float),period,-numpy.inf),0.0)
+    l = numpy.minimum(-_rolling_max(-numpy.asarray(low,float),period,-numpy.inf),9999999.0)
+    return l,h
+
+def stoK(close,high,low,period=14):
+    lc = lastclose(close)
+    mc = (lc + _shift(lc,1,0.0) + _shift(lc,2,0.0))/3
+    l1,h1 = minmax(high,low,period)
+    ml = (l1 + _shift(l1,1,9999999.0) + _shift(l1,2,9999999.0)) / 3
+    mh = (h1 + _shift(h1,1,0.0) + _shift(h1,2,0.0)) / 3
+    den = mh - ml
+    ret = numpy.zeros(close.shape)
+    ok = den!=0.0
+    ret[ok] = ((mc[ok] - ml[ok]) / den[ok]) * 100.0
+    return numpy.clip(ret,0.0,100.0)
+
+def stoD(k,period=5):
+    # mean of the last 'period' stochastic K values
+    s = numpy.zeros(k.shape)
+    n = numpy.zeros(k.shape)
+    for w in xrange(period):
+        ok = numpy.arange(k.shape[-1]) >= w
+        s = numpy.where(ok,s + _shift(k,w,0.0),s)
+        n = n + ok
+    return s / n
+
+def ovb(close,volume):
+    # on balance volume : cumulated volume, signed by the close variation
+    valid = close>=0.0
+    sign = numpy.where(close>=prevclose(close),1,-1)
+    return numpy.cumsum(numpy.where(valid,sign*volume.astype(numpy.int64),0),axis=-1)
+
+# ============================================================================
+# RunningIndicators
+#
+# Running state over the raw columns of a Trades : prefix sums of the known
+# closes and volumes, last known close and the Wilder averages of the slots
+# before the live one. When only the last bar changes, each indicator of that
+# slot is recomputed in constant time with exactly the same operations as the
+# vectorized functions above.
+#
+# advance(i) must be called each time the raw values of slot i changed ; the
+# slots before i are expected to be up-to-date.
+# ============================================================================
+
+class RunningIndicators(object):
+    def __init__(self,close,high,low,volume,rsiperiod=14,rsidepth=140,stoperiod=14):
+        self.m_close = close
+        self.m_high = high
+        self.m_low = low
+        self.m_volume = volume
+        self.m_rsiperiod = float(rsiperiod)
+        self.m_rsidepth = rsidepth
+        self.m_stoperiod = stoperiod
+
+        n = len(close)
+        valid = close>=0.0
+        vc = close[valid]
+
+        # number of known closes up to each slot, and prefix sums indexed by
+        # this number (one more entry than the number of slots)
+        self.m_count = numpy.cumsum(valid)
+        self.m_s1 = numpy.zeros(n+1)
+        self.m_s2 = numpy.zeros(n+1)
+        self.m_sv = numpy.zeros(n+1,numpy.int64)
+        self.m_s1[1:len(vc)+1] = numpy.cumsum(vc)
+        self.m_s2[1:len(vc)+1] = numpy.cumsum(vc*vc)
+        self.m_sv[1:len(vc)+1] = numpy.cumsum(volume[valid].astype(numpy.int64))
+        self.m_last = lastclose(close)
+
+        # all slots are up-to-date
+        self.m_next = n
+
+        # Wilder averages of the window of the live slot, without the slot
+        self.m_rsibase = None
+
+    def memsize(self):
+        n = 0
+        for eachArray in (self.m_count,self.m_s1,self.m_s2,self.m_sv,self.m_last):
+            n = n + eachArray.nbytes
+        return n
+
+    def advance(self,i):
+        start = min(self.m_next,i)
+        if start<i:
+            self.m_rsibase = None
+        for j in xrange(start,i+1):
+            self._slot(j)
+        self.m_next = i + 1
+
+    def _slot(self,j):
+        c = self.m_close[j]
+        if j>0:
+            kp = self.m_count[j-1]
+            prev = self.m_last[j-1]
+        else:
+            kp = 0
+            prev = 0.0
+        if c>=0.0:
+            k = kp + 1
+            self.m_s1[k] = self.m_s1[kp] + c
+            self.m_s2[k] = self.m_s2[kp] + c*c
+            self.m_sv[k] = self.m_sv[kp] + self.m_volume[j]
+            self.m_last[j] = c
+        else:
+            k = kp
+            self.m_last[j] = prev
+        self.m_count[j] = k
+
+    def _window(self,i,period):
+        k = self.m_count[i]
+        return k,min(k,period)
+
+    def ma(self,i,period):
+        k,n = self._window(i,period)
+        if n==0:
+            return -1.0
+        return (self.m_s1[k] - self.m_s1[k-n]) / n
+
+    def vma(self,i,period):
+        k,n = self._window(i,period)
+        if n==0:
+            return -1.0
+        return float((self.m_sv[k] - self.m_sv[k-n]) // n)
+
+    def bollinger(self,i,period=20):
+        k,n = self._window(i,period)
+        if n==0:
+            return -1.0,-1.0,-1.0
+        sm = self.m_s1[k] - self.m_s1[k-n]
+        m = sm / n
+        ecart = max((self.m_s2[k] - self.m_s2[k-n]) - sm*m,0.0)
+        ecart = 2*numpy.sqrt(ecart/n)
+        return m - ecart,m,m + ecart
+
+    def _variation(self,j):
+        # (up,down) close variation of slot j
+        t = self.m_close[j] - (self.m_last[j-1] if j>0 else 0.0)
+        if t>0:
+            return t,0.0
+        if t<0:
+            return 0.0,-t
+        return 0.0,0.0
+
+    def rsi(self,i):
+        p = self.m_rsiperiod
+        if self.m_rsibase==None or self.m_rsibase[0]!=i:
+            # once per live slot : Wilder averages over the older slots
+            h = 0.0
+            b = 0.0
+            for j in xrange(max(i-self.m_rsidepth,0),i):
+                if self.m_close[j]>=0.0:
+                    th,tb = self._variation(j)
+                    b = (((p-1.0)*b) + tb) / p
+                    h = (((p-1.0)*h) + th) / p
+            self.m_rsibase = (i,h,b)
+        i,h,b = self.m_rsibase
+        if self.m_close[i]>=0.0:
+            th,tb = self._variation(i)
+            b = (((p-1.0)*b) + tb) / p
+            h = (((p-1.0)*h) + th) / p
+        if b==0.0:
+            return 100.0
+        return 100.0 - (100.0/(1.0+(h / b)))
+
+    def _minmax(self,j):
+        if j<0:
+            return 9999999.0,0.0
+        f = max(j-self.m_stoperiod+1,0)
+        return min(self.m_low[f:j+1].min(),9999999.0),max(self.m_high[f:j+1].max(),0.0)
+
+    def _lastclose(self,j):
+        if j<0:
+            return 0.0
+        return self.m_last[j]
+
+    def stoK(self,i):
+        mc = (self.m_last[i] + self._lastclose(i-1) + self._lastclose(i-2))/3
+        l1,h1 = self._minmax(i)
+        l2,h2 = self._minmax(i-1)
+        l3,h3 = self._minmax(i-2)
+        ml = (l1 + l2 + l3) / 3
+        mh = (h1 + h2 + h3) / 3
+        if mh==ml:
+            return 0.0
+        return min(max(((mc - ml) / (mh - ml)) * 100.0,0.0),100.0)
+
+    def stoD(self,i,k,period=5):
+        # k : stochastic K column, up-to-date up to slot i
+        s = 0.0
+        n = 0
+        for w in xrange(min(period,i+1)):
+            s = s + k[i-w]
+            n = n + 1
+        return s / n
+
+    def ovb(self,i,ovb):
+        # ovb : on balance volume column, up-to-date before slot i
+        prev = ovb[i-1] if i>0 else 0
+        c = self.m_close[i]
+        if c<0.0:
+            return prev
+        if c>=self._lastclose(i-1):
+            return prev + self.m_volume[i]
+        return prev - self.m_volume[i]
+
+# ============================================================================
+# IndicatorRegistry
+#
+# indicators available by name to Trades.indicator(). A function gets the raw
+# columns (close,high,low,volume) followed by the parameters and returns one
+# column or a tuple of columns. 'lookback' gives, for some parameters, the
+# (number of known closes,number of slots) needed before a slot to compute
+# it : only the tail of a column is then recomputed when new bars arrive.
+# None means the whole column depends on the whole history. 'bPanel' tells
+# the function also accepts 2D columns (one row per history, see itrade_panel).
+# ============================================================================
+
+class IndicatorRegistry(object):
+    def __init__(self):
+        self.m_ind = {}
+        self.m_panel = {}
+
+    def register(self,name,func,lookback=None,bPanel=False):
+        self.m_ind[name] = (func,lookback)
+        self.m_panel[name] = bPanel
+        return True
+
+    def get(self,name):
+        return self.m_ind.get(name)
+
+    def isPanel(self,name):
+        return self.m_panel.get(name,False)
+
+    def list(self):
+        lst = self.m_ind.keys()
+        lst.sort()
+        return lst
+
+try:
+    ignore(gIndicatorRegistry)
+except NameError:
+    gIndicatorRegistry = IndicatorRegistry()
+
+registerIndicator = gIndicatorRegistry.register
+getIndicator = gIndicatorRegistry.get
+isPanelIndicator = gIndicatorRegistry.isPanel
+listIndicators = gIndicatorRegistry.list
+
+def _lookback_start(close,start,nknown,nslots):
+    # first slot to use to compute the slots from 'start' : enough known
+    # closes and slots before, plus one known close for the previous close
+    known = numpy.flatnonzero(close[:start]>=0.0)
+    b = start - nslots
+    if nknown>0:
+        if len(known)<nknown:
+            return 0
+        b = min(b,known[-nknown])
+    known = known[known<b]
+    if len(known)==0:
+        return 0
+    return known[-1]
+
+def compute(name,params,close,high,low,volume,start=0,columns=None):
+    # compute the indicator 'name' ; with 'columns' (previous result) only the
+    # slots from 'start' are recomputed and written in place
+    ind = getIndicator(name)
+    if ind==None:
+        return None
+    func,lookback = ind
+    if columns is None or start<=0 or lookback==None:
+        return func(close,high,low,volume,*params)
+    nknown,nslots = lookback(*params)
+    b = _lookback_start(close,start,nknown,nslots)
+    ret = func(close[b:],high[b:],low[b:],volume[b:],*params)
+    if isinstance(columns,tuple):
+        for eachCol,eachRet in zip(columns,ret):
+            eachCol[start:] = eachRet[start-b:]
+    else:
+        columns[start:] = ret[start-b:]
+    return columns
+
+# --- [ built-in indicators ] ---
+
+def _ma(close,high,low,volume,period):
+    return ma(close,period)
+
+def _vma(close,high,low,volume,period):
+    return vma(close,volume,period)
+
+def _bollinger(close,high,low,volume,period=20):
+    return bollinger(close,period)
+
+def _rsi(close,high,low,volume,period=14):
+    return rsi(close,period,period*10)
+
+def _stoK(close,high,low,volume,period=14):
+    return stoK(close,high,low,period)
+
+def _stoD(close,high,low,volume,kperiod=14,dperiod=5):
+    return stoD(stoK(close,high,low,kperiod),dperiod)
+
+def _ovb(close,high,low,volume):
+    return ovb(close,volume)
+
+registerIndicator('ma',_ma,lambda period: (period,0),bPanel=True)
+registerIndicator('vma',_vma,lambda period: (period,0),bPanel=True)
+registerIndicator('bollinger',_bollinger,lambda period=20: (period,0),bPanel=True)
+registerIndicator('rsi',_rsi,lambda period=14: (0,period*10+1),bPanel=True)
+registerIndicator('stoK',_stoK,lambda period=14: (0,period+2),bPanel=True)
+registerIndicator('stoD',_stoD,lambda kperiod=14,dperiod=5: (0,kperiod+dperiod+2),bPanel=True)
+registerIndicator('ovb',_ovb,bPanel=True)
+
 # ============================================================================
 # Test Indicators
 # ============================================================================
@@ -40,8 +40,9 @@
 import logging
 import re
 import string
+from datetime import datetime,time,timedelta
 
-from pytz import timezone
+from pytz import timezone,utc
 
 # iTrade system
 from itrade_logging import *
@@ -49,6 +50,7 @@ from itrade_local import message
 import itrade_csv
 from itrade_defs import *
 from itrade_connection import ITradeConnection
+from itrade_datation import gCal
 import itrade_config
 
 # ============================================================================
@@ -373,6 +375,66 @@ def convertConnectorTimeToPlaceTime(mdatetime,zone,place):
 
     return place_dt
 
+# ============================================================================
+# market hours (hours.txt)
+#
+#   PHASE;START;END;MARKET;DESCRIPTION with START/END = HH:MM:SS ZONE
+#   the market is trading from the start of its first phase to the end of
+#   its last phase, on the open days of the calendar
+# ============================================================================
+
+market_hours = {}
+
+def parseMarketHour(s):
+    # 'HH:MM:SS ZONE' -> time,zone
+    s = s.strip().split(' ')
+    hms = s[0].split(':')
+    return time(int(hms[0]),int(hms[1]),int(hms[2])),s[-1]
+
+infile = itrade_csv.read(None,os.path.join(itrade_config.dirSysData,'hours.txt'))
+if infile:
+    # scan each line to read each phase
+    for eachLine in infile:
+        item = itrade_csv.parse(eachLine,5)
+        if item and len(item)>=4:
+            start,zone = parseMarketHour(item[1])
+            end,zone = parseMarketHour(item[2])
+            market = item[3].strip()
+            if market_hours.has_key(market):
+                start = min(start,market_hours[market][0])
+                end = max(end,market_hours[market][1])
+            market_hours[market] = (start,end,zone)
+
+def market_isopen(market,when=None):
+    # is the market trading at 'when' (datetime with tzinfo, default is now) ?
+    # True if the hours of the market are unknown
+    if not market_hours.has_key(market):
+        return True
+    start,end,zone = market_hours[market]
+    if when==None:
+        when = datetime.now(utc)
+    local = when.astimezone(timezone(zone))
+    if not gCal.isopen(local.date(),market):
+        return False
+    return start <= local.time().replace(tzinfo=None) < end
+
+def market_nextopen(market,when=None):
+    # next opening of the market after 'when' (datetime with tzinfo, default
+    # is now) or None if the hours of the market are unknown
+    if not market_hours.has_key(market):
+        return None
+    start,end,zone = market_hours[market]
+    if when==None:
+        when = datetime.now(utc)
+    tz = timezone(zone)
+    local = when.astimezone(tz)
+    d = local.date()
+    if local.time().replace(tzinfo=None) >= start:
+        d = d + timedelta(1)
+    while not gCal.isopen(d,market):
+        d = d + timedelta(1)
+    return tz.localize(datetime.combine(d,start))
+
 # ============================================================================
 # yahooTicker
 # ============================================================================
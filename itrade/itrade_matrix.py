@@ -39,10 +39,14 @@
 import datetime
 import logging
 
+# numpy
+import numpy
+
 # iTrade system
 from itrade_logging import *
-from itrade_quotes import quotes,quote_reference
+from itrade_quotes import quotes,quote_reference,updateQuotes
 from itrade_portfolio import *
+from itrade_panel import PricePanel
 import itrade_csv
 
 # ============================================================================
@@ -52,6 +56,10 @@ import itrade_csv
 #
 # ============================================================================
 
+# indicators of the matrix views (name,params of itrade_indicators), computed
+# for all the quotes at once on the panel
+MATRIX_INDICATORS = (('ma',(20,)),('ma',(50,)),('ma',(100,)),('rsi',(14,)),('stoK',(14,)),('stoD',(14,5)))
+
 class TradingMatrix(object):
     def __init__(self):
         self._init_()
@@ -61,6 +69,8 @@ class TradingMatrix(object):
 
     def _init_(self):
         self.m_quotes = {}
+        self.m_panel = None
+        self.m_computed = None
 
     def reinit(self):
         self._init_()
@@ -112,6 +122,15 @@ class TradingMatrix(object):
     def flushTrades(self):
         for eachQuote in self.list():
             eachQuote.flushTrades()
+        self.m_panel = None
+
+    # OHLCV of all the quotes of the matrix in 2D arrays (see itrade_panel)
+    def panel(self):
+        if self.m_panel==None:
+            self.m_panel = PricePanel(self.list())
+        else:
+            self.m_panel.sync()
+        return self.m_panel
 
     # flush historic caches on the matrix
     def flushNews(self):
@@ -126,7 +145,7 @@ class TradingMatrix(object):
     # (re-)build the matrix list using quotes (monitored or traded)
     def build(self):
         self.reinit()
-        for eachQuote in quotes.list():
+        for eachQuote in quotes.materialized():
             if eachQuote.isMatrix():
                 self.m_quotes[eachQuote.key()] = eachQuote
                 debug('matrix:build: add %s',eachQuote.ticker())
@@ -137,17 +156,45 @@ class TradingMatrix(object):
 
     # update the matrix
     def update(self,fromdate=None,todate=None):
-        for eachQuote in self.list():
-            # update information
-            if itrade_config.verbose:
-                info('matrix::update: %s - %s' % (eachQuote.key(),eachQuote.ticker()))
-            eachQuote.update(fromdate,todate)
+        # import all the quotes at once (see updateQuotes)
+        updateQuotes(self.list(),fromdate,todate)
+        self.compute(todate)
 
-            # compute information
+    # compute the matrix : candle of each quote, then MATRIX_INDICATORS of
+    # all the quotes at once on the panel, at the last trade of each quote
+    def compute(self,todate=None):
+        for eachQuote in self.list():
             if itrade_config.verbose:
                 info('matrix::compute: %s - %s' % (eachQuote.key(),eachQuote.ticker()))
             eachQuote.compute(todate)
 
+        panel = self.panel()
+        last = panel.lastindices()
+        rows = numpy.arange(len(panel))
+        values = {}
+        for eachIndicator in MATRIX_INDICATORS:
+            values[eachIndicator] = panel.indicator(*eachIndicator)[rows,last]
+        stamps = [panel.modified(row) for row in rows]
+        self.m_computed = (panel,last,stamps,values)
+
+    # values of MATRIX_INDICATORS for the quote (None if unknown) : from the
+    # last compute() while its history did not change since, else from the
+    # quote itself (i.e. a live update between two refreshes)
+    def indicators(self,quote):
+        if self.m_computed:
+            panel,last,stamps,values = self.m_computed
+            row = panel.row(quote.key())
+            if panel is self.m_panel and row>=0 and stamps[row]==panel.modified(row):
+                ret = []
+                for eachIndicator in MATRIX_INDICATORS:
+                    x = values[eachIndicator][row]
+                    if last[row]>=0 and numpy.isfinite(x):
+                        ret.append(float(x))
+                    else:
+                        ret.append(None)
+                return tuple(ret)
+        return (quote.nv_ma(20),quote.nv_ma(50),quote.nv_ma(100),quote.nv_rsi(14),quote.nv_stoK(),quote.nv_stoD())
+
     # add a quote in the matrix
     def addKey(self,i):
         q = quotes.lookupKey(i)
@@ -155,6 +202,7 @@ class TradingMatrix(object):
         if q:
             debug('addKey: add %s',q.ticker())
             self.m_quotes[q.key()] = q
+            self.m_panel = None
             debug('addKey: monitor %s' % i)
             q.monitorIt(True)
             return True
@@ -167,6 +215,7 @@ class TradingMatrix(object):
         if q:
             debug('removeKey: add %s',q.ticker())
             del self.m_quotes[q.key()]
+            self.m_panel = None
             debug('removeKey: un-monitor %s' % i)
             q.monitorIt(False)
 
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# ============================================================================
+# Project Name : iTrade
+# Module Name  : itrade_panel.py
+#
+# Description: Price panel of a set of quotes
+#
+# The Original Code is iTrade code (http://itrade.sourceforge.net).
+#
+# The Initial Developer of the Original Code is	Gilles Dumortier.
+#
+# Portions created by the Initial Developer are Copyright (C) 2004-2008 the
+# Initial Developer. All Rights Reserved.
+#
+# Contributor(s):
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see http://www.gnu.org/licenses/gpl.html
+#
+# History       Rev   Description
+# 2026-10-18          Wrote it from scratch
+# ============================================================================
+
+# ============================================================================
+# Imports
+# ============================================================================
+
+# python system
+import logging
+
+# numpy
+import numpy
+
+# iTrade system
+from itrade_logging import *
+import itrade_trades
+import itrade_indicators
+from itrade_datation import gCal
+
+# ============================================================================
+# PricePanel
+#
+# OHLCV columns of a set of quotes stacked in 2D arrays (quote x day) on the
+# global calendar index : row 'r' holds a copy of the history of the r-th
+# quote. Days without trade are -1 like in Trades.
+#
+# The histories are loaded one after the other through LazyTrades (the
+# memory budget of the histories is kept) and keep their own storage.
+# sync() copies again the histories changed since (i.e. live updates).
+#
+# The indicators accepting 2D columns are computed by blocks of rows : the
+# arrays of a block stay in the processor cache.
+# ============================================================================
+
+PANEL_BLOCK_ROWS = 32
+
+def _daytrades(quote):
+    if quote.m_daytrades==None:
+        quote.loadTrades()
+    if isinstance(quote.m_daytrades,itrade_trades.LazyTrades):
+        return quote.m_daytrades.daytrades()
+    return quote.m_daytrades
+
+def _modified(quote):
+    # None if the history has never been loaded
+    if quote.m_daytrades==None:
+        return None
+    return quote.m_daytrades.modified()
+
+class PricePanel(object):
+    def __init__(self,quotes):
+        self.m_quotes = list(quotes)
+        self.m_row = {}
+        for row,eachQuote in enumerate(self.m_quotes):
+            self.m_row[eachQuote.key()] = row
+
+        shape = (len(self.m_quotes),gCal.lastindex()+1)
+        self.m_open = numpy.empty(shape)
+        self.m_high = numpy.empty(shape)
+        self.m_low = numpy.empty(shape)
+        self.m_close = numpy.empty(shape)
+        self.m_volume = numpy.empty(shape,numpy.int64)
+        for eachArray in (self.m_open,self.m_high,self.m_low,self.m_close,self.m_volume):
+            eachArray.fill(-1)
+
+        # stamp of the history of each row when it was copied
+        self.m_modified = [None] * len(self.m_quotes)
+        self.sync()
+
+    def __len__(self):
+        return len(self.m_quotes)
+
+    def quotes(self):
+        return self.m_quotes
+
+    def keys(self):
+        return [eachQuote.key() for eachQuote in self.m_quotes]
+
+    def row(self,key):
+        # row of the quote (or -1)
+        return self.m_row.get(key,-1)
+
+    def modified(self,row):
+        # stamp of the history of the quote of the row (None if not loaded)
+        return _modified(self.m_quotes[row])
+
+    def sync(self):
+        for row,eachQuote in enumerate(self.m_quotes):
+            modified = _modified(eachQuote)
+            if modified==None or self.m_modified[row]==None or modified>self.m_modified[row]:
+                self.copy(row,_daytrades(eachQuote))
+                self.m_modified[row] = _modified(eachQuote)
+
+    def copy(self,row,trades):
+        # the frame of the history into the row
+        first,last = trades.frame()
+        for eachArray,eachColumn in ((self.m_open,trades.m_inOpen),(self.m_high,trades.m_inHigh),(self.m_low,trades.m_inLow),(self.m_close,trades.m_inClose),(self.m_volume,trades.m_inVol)):
+            eachArray[row].fill(eachColumn.m_fill)
+            eachArray[row,first:last+1] = eachColumn.m_data
+
+    def lastindex(self):
+        # last day with at least one trade (or -1)
+        days = numpy.flatnonzero((self.m_close>=0.0).any(axis=0))
+        if len(days)==0:
+            return -1
+        return days[-1]
+
+    def lastindices(self):
+        # last day with a trade of each row (-1 if none)
+        traded = self.m_close>=0.0
+        last = self.m_close.shape[1] - 1 - numpy.argmax(traded[:,::-1],axis=1)
+        last[~traded.any(axis=1)] = -1
+        return last
+
+    # --- [ cross-sectional computation ] ------------------------------------
+
+    def lastclose(self):
+        # close of the day or the previous known close (0.0 if none)
+        return itrade_indicators.lastclose(self.m_close)
+
+    def returns(self,period=1):
+        # variation of the close over 'period' days (0.0 when unknown)
+        lc = self.lastclose()
+        prev = numpy.zeros(lc.shape)
+        prev[:,period:] = lc[:,:lc.shape[1]-period]
+        ok = prev>0.0
+        ret = numpy.zeros(lc.shape)
+        ret[ok] = lc[ok] / prev[ok] - 1.0
+        return ret
+
+    def ma(self,period):
+        # same values as Trades.ma() for all the quotes at once
+        return self.indicator('ma',(period,))
+
+    def vma(self,period):
+        return self.indicator('vma',(period,))
+
+    def indicator(self,name,params=()):
+        # any registered indicator (see itrade_indicators), one row per quote :
+        # by blocks of rows, or row by row if the indicator only knows about
+        # one history
+        bPanel = itrade_indicators.isPanelIndicator(name)
+        ret = None
+        for first in range(0,len(self.m_quotes),bPanel and PANEL_BLOCK_ROWS or 1):
+            if bPanel:
+                rows = slice(first,first+PANEL_BLOCK_ROWS)
+            else:
+                rows = first
+            cols = itrade_indicators.compute(name,tuple(params),self.m_close[rows],self.m_high[rows],self.m_low[rows],self.m_volume[rows])
+            if cols is None:
+                return None
+            if not isinstance(cols,tuple):
+                cols = (cols,)
+            if ret==None:
+                ret = [numpy.empty(self.m_close.shape,eachCol.dtype) for eachCol in cols]
+            for eachRet,eachCol in zip(ret,cols):
+                eachRet[rows] = eachCol
+        if ret==None:
+            return None
+        if len(ret)==1:
+            return ret[0]
+        return tuple(ret)
+
+    def value(self,numbers,idx=None):
+        # value of 'numbers' shares of each quote (in the quote currency) at
+        # day 'idx' (default: last day) ; numbers : sequence aligned on the
+        # rows or dict key->number
+        if idx==None:
+            idx = self.lastindex()
+        if isinstance(numbers,dict):
+            numbers = [numbers.get(eachQuote.key(),0) for eachQuote in self.m_quotes]
+        if idx<0:
+            # no trade at all : no value
+            return numpy.zeros(len(self.m_quotes))
+        return self.lastclose()[:,idx] * numpy.asarray(numbers,float)
+
+# ============================================================================
+# Test
+# ============================================================================
+
+if __name__=='__main__':
+    setLevel(logging.INFO)
+
+    from itrade_matrix import createMatrix
+
+    m = createMatrix()
+    panel = m.panel()
+    info('test1 %d quotes, last index %d' % (len(panel),panel.lastindex()))
+    ma20 = panel.ma(20)
+    for eachKey in panel.keys():
+        info('test2 %s ma20=%.3f' % (eachKey,ma20[panel.row(eachKey),panel.lastindex()]))
+
+# ============================================================================
+# That's all folks !
+# ============================================================================
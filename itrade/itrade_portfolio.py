@@ -813,7 +813,7 @@ class Portfolio(object):
             if quote:
                 login(quote)
             else:
-                for eachQuote in quotes.list():
+                for eachQuote in quotes.materialized():
                     if eachQuote.isMatrix():
                         login(eachQuote)
 
@@ -823,7 +823,7 @@ class Portfolio(object):
             maperr = {}
 
             # log to service
-            for eachQuote in quotes.list():
+            for eachQuote in quotes.materialized():
                 if eachQuote.isMatrix():
                     name = eachQuote.liveconnector().name()
                     if not maperr.has_key(name):
@@ -837,12 +837,12 @@ class Portfolio(object):
 
     def setupCurrencies(self):
         currencies.reset()
-        for eachQuote in quotes.list():
+        for eachQuote in quotes.materialized():
             if eachQuote.isMatrix():
                 currencies.inuse(self.m_currency,eachQuote.currency(),bInUse=True)
 
     def is_multicurrencies(self):
-        for eachQuote in quotes.list():
+        for eachQuote in quotes.materialized():
             if eachQuote.isMatrix():
                 if eachQuote.currency()!=self.m_currency:
                     return True
@@ -950,7 +950,7 @@ class Portfolio(object):
     def computeValue(self):
         self.m_cDIRValue = 0.0
         self.m_cSRDValue = 0.0
-        for eachQuote in quotes.list():
+        for eachQuote in quotes.materialized():
             if eachQuote.isTraded():
                 self.m_cDIRValue = self.m_cDIRValue + eachQuote.nv_pv(self.m_currency,QUOTE_CASH)
                 self.m_cSRDValue = self.m_cSRDValue + eachQuote.nv_pv(self.m_currency,QUOTE_CREDIT)
@@ -958,7 +958,7 @@ class Portfolio(object):
     def computeBuy(self):
         self.m_cDIRBuy = 0.0
         self.m_cSRDBuy = 0.0
-        for eachQuote in quotes.list():
+        for eachQuote in quotes.materialized():
             if eachQuote.isTraded():
                 self.m_cDIRBuy = self.m_cDIRBuy + eachQuote.nv_pr(QUOTE_CASH)
                 self.m_cSRDBuy = self.m_cSRDBuy + eachQuote.nv_pr(QUOTE_CREDIT)
@@ -39,11 +39,13 @@
 # python system
 from datetime import *
 import logging
+from bisect import bisect_left
 
 # iTrade system
 from itrade_logging import *
 from itrade_local import message,getGroupChar
 import itrade_csv
+import itrade_symbcache
 import itrade_trades
 from itrade_import import *
 from itrade_defs import *
@@ -51,6 +53,7 @@ from itrade_ext import *
 from itrade_datation import *
 from itrade_market import market2currency,compute_country,isin2market,market2place,list_of_markets,set_market_loaded,is_market_loaded
 import itrade_currency
+from itrade_search import QuoteSearchIndex
 
 # ============================================================================
 # color
@@ -122,11 +125,109 @@ def quote_reference(isin,ticker,market,place):
 
     return '%s.%s.%s' % (ticker,market,place)
 
+def quote_record(isin,name,ticker,market,currency,place,country,list):
+    # what Quotes keeps of a quote until its first use :
+    #   key,isin,name,ticker,market,currency,place,country,list (the arguments
+    #   of Quote) and the key of the same quote without isin
+    if country:
+        country = country.upper()
+    if place:
+        place = place.upper()
+    key = quote_reference(isin,ticker,market,place)
+    if isin:
+        key2 = quote_reference(None,ticker,market,place)
+    else:
+        key2 = None
+    name = name.upper()
+    return (key,isin,name,ticker.upper(),market,currency.upper(),place,country,list,key2)
+
+# ============================================================================
+# QuoteState
+#
+#   position, stops and trades of a quote. Most of the quotes of the lists of
+#   symbols are never traded nor displayed : the state of a Quote is created
+#   on the first change, the defaults are read from gNoQuoteState until then.
+# ============================================================================
+
+class QuoteState(object):
+    __slots__ = ('m_DIR_number','m_DIR_pru','m_SRD_number','m_SRD_pru','m_SRD_accnum','m_SRD_prevacc',
+                 'm_isTraded','m_wasTraded','m_isMonitored',
+                 'm_stoploss','m_stopwin','m_hasStops',
+                 'm_daytrades','m_weektrades','m_monthtrades','m_percent')
+
+    def __init__(self):
+        # NB: PRU currency *is* portfolio currency
+        self.m_DIR_number = 0
+        self.m_DIR_pru = 0.0
+        self.m_SRD_number = 0
+        self.m_SRD_pru = 0.0
+        self.m_SRD_accnum = 0
+        self.m_SRD_prevacc = 0
+
+        self.m_isTraded = False
+        self.m_wasTraded = False
+        self.m_isMonitored = False
+
+        self.m_stoploss = 0.0
+        self.m_stopwin = 0.0
+        self.m_hasStops = False
+
+        self.m_daytrades = None
+        self.m_weektrades = None
+        self.m_monthtrades = None
+
+        self.m_percent = None
+
+gNoQuoteState = QuoteState()
+
+def _stateattr(name):
+    # attribute of Quote kept in its QuoteState
+    slot = QuoteState.__dict__[name]
+    default = slot.__get__(gNoQuoteState)
+
+    def get(self):
+        state = self.m_state
+        if state is None:
+            state = gNoQuoteState
+        return slot.__get__(state)
+
+    def set(self,value):
+        state = self.m_state
+        if state is None:
+            if value is default:
+                return
+            state = self.m_state = QuoteState()
+        slot.__set__(state,value)
+
+    return property(get,set)
+
 # ============================================================================
 # Quote
 # ============================================================================
 
 class Quote(object):
+    __slots__ = ('m_key','m_isin','m_defaultname','m_defaultticker','m_list','m_place','m_country',
+                 'm_market','m_currency','m_symbcurr','m_name','m_ticker',
+                 'm_userliveconnector','m_liveconnector','m_defaultimportconnector','m_importconnector',
+                 'm_pluginId','m_registry','m_state')
+
+    m_DIR_number = _stateattr('m_DIR_number')
+    m_DIR_pru = _stateattr('m_DIR_pru')
+    m_SRD_number = _stateattr('m_SRD_number')
+    m_SRD_pru = _stateattr('m_SRD_pru')
+    m_SRD_accnum = _stateattr('m_SRD_accnum')
+    m_SRD_prevacc = _stateattr('m_SRD_prevacc')
+    m_isTraded = _stateattr('m_isTraded')
+    m_wasTraded = _stateattr('m_wasTraded')
+    m_isMonitored = _stateattr('m_isMonitored')
+    m_stoploss = _stateattr('m_stoploss')
+    m_stopwin = _stateattr('m_stopwin')
+    m_hasStops = _stateattr('m_hasStops')
+    m_daytrades = _stateattr('m_daytrades')
+    m_weektrades = _stateattr('m_weektrades')
+    m_monthtrades = _stateattr('m_monthtrades')
+    m_percent = _stateattr('m_percent')
+
     def __init__(self,key,isin,name,ticker,market,currency,place,country,list=QLIST_SYSTEM):
         self.m_key = key
         self.m_isin = isin
@@ -164,42 +265,30 @@ class Quote(object):
         # data for the connector plugin
         self.m_pluginId = None
 
+        # Quotes registry maintaining the indexes on the name and the ticker
+        self.m_registry = None
+
         self._init_()
 
     # ---[ initialisation ]--------------------------------
 
     def _init_(self):
         # can be overloaded later ...
-        # NB: PRU currency *is* portfolio currency
-        self.m_DIR_number = 0
-        self.m_DIR_pru = 0.0
-        self.m_SRD_number = 0
-        self.m_SRD_pru = 0.0
-        self.m_SRD_accnum = 0
-        self.m_SRD_prevacc = 0
+        # position, stops and trades (see QuoteState)
+        self.m_state = None
 
-        self.m_isTraded = False
-        self.m_wasTraded = False
-        self.m_isMonitored = False
-
-        self.m_stoploss = 0.0
-        self.m_stopwin = 0.0
-        self.m_hasStops = False
         self.m_liveconnector = None
         self.m_importconnector = self.m_defaultimportconnector
         self.m_name = self.m_defaultname
         self.m_ticker = self.m_defaultticker
         self.m_symbcurr = itrade_currency.currency2symbol(self.m_currency)
 
-        self.m_daytrades = None
-        self.m_weektrades = None
-        self.m_monthtrades = None
-
-        self.m_percent = None
-
     def reinit(self):
         #info('%s::reinit' %(self.name()))
+        name,ticker = self.m_name,self.m_ticker
         self._init_()
+        if self.m_registry:
+            self.m_registry.reindex(self,name,ticker)
 
     # ---[ properties ] -----------------------------------
 
@@ -248,7 +337,10 @@ class Quote(object):
         return self.m_defaultname
 
     def set_name(self,name):
+        old = self.m_name
         self.m_name = name
+        if self.m_registry:
+            self.m_registry.reindex(self,old,self.m_ticker)
 
     def ticker(self):
         return self.m_ticker
@@ -257,7 +349,10 @@ class Quote(object):
         return self.m_defaultticker
 
     def set_ticker(self,ticker):
+        old = self.m_ticker
         self.m_ticker = ticker
+        if self.m_registry:
+            self.m_registry.reindex(self,self.m_name,old)
 
     def nv_number(self,box=QUOTE_BOTH):
         if box==QUOTE_CASH:
@@ -616,15 +711,19 @@ class Quote(object):
     def loadTrades(self,fn=None):
         #debug('Quote:loadTrades %s' % self.ticker)
         if self.m_daytrades==None:
-            self.m_daytrades = itrade_trades.Trades(self)
-        self.m_daytrades.load(fn)
+            # the history will be read on first use
+            self.m_daytrades = itrade_trades.LazyTrades(self)
+        if fn:
+            self.m_daytrades.load(fn)
 
     def importTrades(self,data,bLive):
         #debug('Quote:importTrades %s %s bLive=%s' % (self.ticker,data,bLive))
         if self.m_daytrades==None:
-            self.m_daytrades = itrade_trades.Trades(self)
+            self.loadTrades()
 
-        data = data.split('\r\n')
+        # data : EBP lines as one string or a list of lines
+        if isinstance(data,str):
+            data = data.split('\r\n')
         self.m_daytrades.imp(data,bLive)
 
         # only one line
@@ -634,6 +733,19 @@ class Quote(object):
                 # percent is included !
                 self.m_percent = string.atof (item[7])
 
+    def gaps(self,fromdate,todate,mingap=1):
+        # trading days missing in the history (see Trades.gaps)
+        if self.m_daytrades==None:
+            self.loadTrades()
+        return self.m_daytrades.gaps(fromdate,todate,mingap)
+
+    def addKnownGaps(self,fromdate,todate):
+        # trading days without trade at the import connector (see
+        # Trades.addKnownGaps)
+        if self.m_daytrades==None:
+            self.loadTrades()
+        self.m_daytrades.addKnownGaps(fromdate,todate)
+
     # ---[ save or export trades / date is unique key ] ---
 
     def saveTrades(self,fn=None):
@@ -647,8 +759,15 @@ class Quote(object):
 
     def update(self,fromdate=None,todate=None):
         #debug('update %s from:%s to:%s' % (self.ticker(),fromdate,todate))
+        pool = ImportPool()
+        self.scheduleUpdate(pool,fromdate,todate)
+        pool.run()
+        return self.endUpdate(pool,fromdate,todate)
+
+    def scheduleUpdate(self,pool,fromdate=None,todate=None):
+        # first half of update() : add the imports needed by the quote to
+        # the pool (see ImportPool)
         if self.m_daytrades==None:
-            self.m_daytrades = itrade_trades.Trades(self)
             self.loadTrades()
         if fromdate==date.today() or fromdate==None:
             # import until 'yesterday' (be sure the day is or will open !)
@@ -663,15 +782,29 @@ class Quote(object):
             if tr==None:
                 if itrade_config.verbose:
                     print '%s *** no trade at all ! : need to import ...' % self.key()
-                if not cmdline_importQuoteFromInternet(self):
-                    print 'error importing full data ...'
-                    return False
-            elif tr.date() != ajd:
-                if itrade_config.verbose:
-                    print '%s *** from = %s today = %s : need to import ...' % (self.key(),tr.date(),ajd)
-                if not import_from_internet(self,tr.date(),ajd):
-                    print 'error importing partial data ...'
-                    return False
+                pool.addHistory(self)
+            else:
+                if tr.date() != ajd:
+                    if itrade_config.verbose:
+                        print '%s *** from = %s today = %s : need to import ...' % (self.key(),tr.date(),ajd)
+                    pool.add(self,tr.date(),ajd)
+                # holes in the history
+                pool.addGaps(self,None,tr.date())
+        else:
+            # history importation
+            if itrade_config.verbose:
+                print 'history importation for %s ' %self.key()
+            pool.add(self,fromdate,todate)
+
+    def endUpdate(self,pool,fromdate=None,todate=None):
+        # second half of update() : once the pool has run, save the imported
+        # trades and live update today
+        ret = pool.status(self)
+        if fromdate==date.today() or fromdate==None:
+            if ret==False:
+                print 'error importing data ...'
+                return False
+            if ret!=None:
                 self.saveTrades()
 
             # live update today
@@ -683,13 +816,7 @@ class Quote(object):
                 return True
         else:
             # history importation
-            if itrade_config.verbose:
-                print 'history importation for %s ' %self.key()
-            if import_from_internet(self,fromdate,todate):
-                #self.saveTrades()
-                return True
-            else:
-                return False
+            return ret==True
 
     # ---[ operations on the quote ] ---
 
@@ -1243,6 +1370,25 @@ class Quote(object):
             prop.append('%s;%s;%s' % (self.key(),'import',self.importconnector().name()))
         return prop
 
+# ============================================================================
+# updateQuotes
+#
+#   update() of several quotes at once : the imports of all the quotes run in
+#   one ImportPool and the live quotes of today are requested by batches
+#
+#   progress(done,total,quote) : see ImportPool.run()
+# ============================================================================
+
+def updateQuotes(quotes,fromdate=None,todate=None,progress=None):
+    quotes = list(quotes)
+    pool = ImportPool()
+    for eachQuote in quotes:
+        eachQuote.scheduleUpdate(pool,fromdate,todate)
+    pool.run(progress)
+    if fromdate==None or fromdate==date.today():
+        liveupdate_prefetch(quotes)
+    return [eachQuote.endUpdate(pool,fromdate,todate) for eachQuote in quotes]
+
 # ============================================================================
 # Quotes
 # ============================================================================
@@ -1257,18 +1403,56 @@ class Quotes(object):
         self._init_()
 
     def _init_(self):
+        # quotes by key : a Quote, or the record of the quote (see
+        # quote_record) until the quote is used for the first time
         self.m_quotes = {}
 
+        # secondary indexes : lists of keys by isin, ticker and name, sorted
+        # tickers for the prefix lookup (built on first use)
+        self.m_isins = {}
+        self.m_tickers = {}
+        self.m_names = {}
+        self.m_sortedtickers = None
+
+        # fuzzy search (built on first search)
+        self.m_search = None
+
     def reinit(self):
         debug('Quotes::reinit')
-        for eachQuote in self.list():
+        for eachQuote in self.materialized():
             eachQuote.reinit()
 
     def list(self):
-        items = self.m_quotes.values()
+        items = [self._quote(eachKey) for eachKey in self.m_quotes.keys()]
+        items.sort(key=Quote.name)
+        return items
+
+    def materialized(self):
+        # only the quotes already used : the other ones are neither traded,
+        # monitored nor have stops or properties
+        items = [eachQuote for eachQuote in self.m_quotes.values() if isinstance(eachQuote,Quote)]
         items.sort(key=Quote.name)
         return items
 
+    def records(self):
+        # (key,isin,name,ticker,market,place,list) of all the quotes sorted by
+        # name, without creating the quotes : use lookupKey() for the rows the
+        # user acts on
+        items = []
+        for eachKey,eachQuote in self.m_quotes.iteritems():
+            items.append((eachKey,) + self._info(eachQuote))
+        items.sort(key=lambda item: item[2])
+        return iter(items)
+
+    def connectors(self,key):
+        # (live connector,import connector) of the quote of key : the default
+        # ones of its market if the quote has not been created yet
+        quote = self.m_quotes[key]
+        if isinstance(quote,Quote):
+            return quote.liveconnector(),quote.importconnector()
+        isin,name,ticker,market,place,list = self._info(quote)
+        return getDefaultLiveConnector(market,list,place),getImportConnector(market,list,QTAG_IMPORT,place)
+
     # ---[ Properties ] ---
 
     def addProperty(self,key,prop,val):
@@ -1289,7 +1473,7 @@ class Quotes(object):
 
     def saveProperties(self):
         props = []
-        for eachQuote in self.list():
+        for eachQuote in self.materialized():
             for eachProp in eachQuote.listProperties():
                 #print eachProp
                 props.append(eachProp)
@@ -1320,26 +1504,44 @@ class Quotes(object):
 
     def saveStops(self,fp=None):
         stops = []
-        for eachQuote in self.list():
+        for eachQuote in self.materialized():
             if eachQuote.hasStops():
                 stops.append(eachQuote.getStops())
         itrade_csv.write(fp,os.path.join(itrade_config.dirUserData,'default.stops.txt'),stops)
 
     # ---[ Quotes ] ---
 
+    def _quote(self,key):
+        # the quote of key, created from its record on first use
+        quote = self.m_quotes[key]
+        if not isinstance(quote,Quote):
+            quote = Quote(*quote[:9])
+            quote.m_registry = self
+            self.m_quotes[key] = quote
+        return quote
+
+    def _info(self,quote):
+        # (isin,name,ticker,market,place,list) of a quote or of a record
+        if isinstance(quote,Quote):
+            return quote.isin(),quote.name(),quote.ticker(),quote.market(),quote.place(),quote.list()
+        return quote[1],quote[2],quote[3],quote[4],quote[6] or market2place(quote[4]),quote[8]
+
+    def _match(self,key,market,place):
+        if market==None and place==None:
+            return True
+        fields = self._info(self.m_quotes[key])
+        return (market==None or market==fields[3]) and (place==None or place==fields[4])
+
     def addQuote(self,isin,name,ticker,market,currency,place,country=None,list=QLIST_SYSTEM,debug=False):
+        return self._addRecord(quote_record(isin,name,ticker,market,currency,place,country,list),debug)
 
-        # right case
-        if country:
-            country = country.upper()
-        if place:
-            place = place.upper()
+    def _addRecord(self,record,debug=False):
+        key,isin,name,ticker,market,currency,place,country,list,key2 = record
 
-        # get a key and check strict duplicate (i.e. same key)
-        key = quote_reference(isin,ticker,market,place)
+        # check strict duplicate (i.e. same key)
         if self.m_quotes.has_key(key):
             if debug:
-                print '%r/%s already exists - keep it (ignore %s)' % (self.m_quotes[key],self.m_quotes[key].ticker(),ticker)
+                print '%s/%s already exists - keep it (ignore %s)' % (key,self._info(self.m_quotes[key])[2],ticker)
             return True
 
         # depending on isin
@@ -1348,21 +1550,21 @@ class Quotes(object):
             quote = None # __perf: self.lookupTicker(ticker,market)
             if quote:
                 if debug:
-                    print '%r already exists - ignore' % self.m_quotes[key]
+                    print '%s already exists - ignore' % quote.key()
                 return True
         else:
             # isin : check if we can replace the same quote without isin
-            key2 = quote_reference(None,ticker,market,place)
             if self.m_quotes.has_key(key2):
                 if debug:
-                    print '%r already exists but without ISIN - replace' % self.m_quotes[key2]
-                del self.m_quotes[key2]
+                    print '%s already exists but without ISIN - replace' % key2
+                self.removeQuote(key2)
 
-        # new quote
-        self.m_quotes[key] = Quote(key,isin,name.upper(),ticker.upper(),market,currency.upper(),place,country,list)
+        # new quote : created on first use
+        self.m_quotes[key] = record
+        self._index(key,isin,name,ticker,market,place or market2place(market))
 
         if debug:
-            print 'Add %s in quotes list' % self.m_quotes[key]
+            print 'Add %s in quotes list' % key
 
         return True
 
@@ -1373,29 +1575,47 @@ class Quotes(object):
             if item and len(item)>=7:
                 self.addQuote(item[0],item[1],item[2],item[3],item[4],item[5],item[6],list,debug)
 
+    def _compileLines(self,infile,list):
+        # records of the lines, or None if a key depends on the quotes
+        # already loaded (no market or no place)
+        records = []
+        for eachLine in infile:
+            item = itrade_csv.parse(eachLine,7)
+            if item and len(item)>=7:
+                if not item[3] or not item[5]:
+                    return None
+                records.append(quote_record(item[0],item[1],item[2],item[3],item[4],item[5],item[6],list))
+        return records
+
+    def _loadFile(self,fn,list,debug=False):
+        # the compiled records if the text file has not changed since
+        records = itrade_symbcache.read(fn,list)
+        if records==None:
+            infile = itrade_csv.read(None,fn)
+            if not infile:
+                return
+            records = self._compileLines(infile,list)
+            if records==None:
+                self._addLines(infile,list,debug)
+                return
+            itrade_symbcache.write(fn,list,records)
+        for eachRecord in records:
+            self._addRecord(eachRecord,debug)
+
     # ---[ load list of quotes / indices / trackers / ... ] ---------------------------------------------------
 
     def loadMarket(self,market):
         # open and read the file to load these quotes information
         if not is_market_loaded(market):
-            infile = itrade_csv.read(None,os.path.join(itrade_config.dirSymbData,'quotes.%s.txt' % market))
-            if infile:
-                self._addLines(infile,list=QLIST_SYSTEM,debug=False)
+            self._loadFile(os.path.join(itrade_config.dirSymbData,'quotes.%s.txt' % market),list=QLIST_SYSTEM)
             set_market_loaded(market)
 
     def loadListOfQuotes(self):
-        infile = itrade_csv.read(None,os.path.join(itrade_config.dirSymbData,'indices.txt'))
-        if infile:
-            self._addLines(infile,list=QLIST_INDICES,debug=False)
-
-        infile = itrade_csv.read(None,os.path.join(itrade_config.dirSymbData,'trackers.txt'))
-        if infile:
-            self._addLines(infile,list=QLIST_TRACKERS,debug=False)
+        self._loadFile(os.path.join(itrade_config.dirSymbData,'indices.txt'),list=QLIST_INDICES)
+        self._loadFile(os.path.join(itrade_config.dirSymbData,'trackers.txt'),list=QLIST_TRACKERS)
 
         # them open and read user file
-        infile = itrade_csv.read(None,os.path.join(itrade_config.dirUserData,'usrquotes.txt'))
-        if infile:
-            self._addLines(infile,list=QLIST_USER,debug=False)
+        self._loadFile(os.path.join(itrade_config.dirUserData,'usrquotes.txt'),list=QLIST_USER)
 
     # ---[ save list of quotes / indices / trackers / ... ] ---------------------------------------------------
 
@@ -1428,15 +1648,62 @@ class Quotes(object):
 
     def removeQuote(self,key):
         if self.m_quotes.has_key(key):
+            quote = self.m_quotes[key]
+            isin,name,ticker,market,place,list = self._info(quote)
+            self._unindex(key,isin,name,ticker)
+            if isinstance(quote,Quote):
+                quote.m_registry = None
             del self.m_quotes[key]
             return True
         return False
 
     def removeQuotes(self,market,list):
-        for eachQuote in self.list():
-            if list==eachQuote.list():
-                if market==None or eachQuote.market()==market:
-                    del self.m_quotes[eachQuote.key()]
+        for eachKey,eachQuote in self.m_quotes.items():
+            fields = self._info(eachQuote)
+            if list==fields[5]:
+                if market==None or fields[3]==market:
+                    self.removeQuote(eachKey)
+
+    # ---[ Secondary indexes ] ---
+
+    def _indexAdd(self,index,value,key):
+        if index.has_key(value):
+            index[value].append(key)
+        else:
+            index[value] = [key]
+
+    def _indexRemove(self,index,value,key):
+        lst = index.get(value)
+        if lst:
+            if key in lst:
+                lst.remove(key)
+            if not lst:
+                del index[value]
+
+    def _index(self,key,isin,name,ticker,market,place):
+        self._indexAdd(self.m_isins,isin,key)
+        if not self.m_tickers.has_key(ticker):
+            self.m_sortedtickers = None
+        self._indexAdd(self.m_tickers,ticker,key)
+        self._indexAdd(self.m_names,name,key)
+        if self.m_search:
+            self.m_search.add(key,ticker,name,isin,market,place)
+
+    def _unindex(self,key,isin,name,ticker):
+        self._indexRemove(self.m_isins,isin,key)
+        self._indexRemove(self.m_tickers,ticker,key)
+        if not self.m_tickers.has_key(ticker):
+            self.m_sortedtickers = None
+        self._indexRemove(self.m_names,name,key)
+        if self.m_search:
+            self.m_search.remove(key)
+
+    def reindex(self,quote,name,ticker):
+        # called by the quote when its name or its ticker has been changed
+        # (name and ticker : values indexed before the change)
+        if name!=quote.name() or ticker!=quote.ticker():
+            self._unindex(quote.key(),quote.isin(),name,ticker)
+            self._index(quote.key(),quote.isin(),quote.name(),quote.ticker(),quote.market(),quote.place())
 
     # ---[ Lookup (optionaly, filter by market) ] ---
 
@@ -1445,7 +1712,7 @@ class Quotes(object):
             return None
 
         if self.m_quotes.has_key(key):
-            return self.m_quotes[key]
+            return self._quote(key)
 
         # key not found
         skey = key.split('.')
@@ -1455,7 +1722,7 @@ class Quotes(object):
             if not is_market_loaded(market):
                 self.loadMarket(market)
                 if self.m_quotes.has_key(key):
-                    return self.m_quotes[key]
+                    return self._quote(key)
 
         # key really not found
         return None
@@ -1463,31 +1730,51 @@ class Quotes(object):
     def lookupISIN(self,isin,market=None,place=None):
         # return list of
         ret = []
-        for eachVal in self.m_quotes.values():
-            if eachVal.isin() == isin:
-                if (market==None or (market==eachVal.market())) and (place==None or (place==eachVal.place())):
-                    ret.append(eachVal)
+        for eachKey in self.m_isins.get(isin,()):
+            if self._match(eachKey,market,place):
+                ret.append(self._quote(eachKey))
         return ret
 
     def lookupTicker(self,ticker,market=None,place=None):
         # return first one
-        for eachVal in self.m_quotes.values():
-            if (eachVal.ticker() == ticker) and (market==None or (market==eachVal.market())) and (place==None or (place==eachVal.place())):
-                    return eachVal
+        for eachKey in self.m_tickers.get(ticker,()):
+            if self._match(eachKey,market,place):
+                return self._quote(eachKey)
         return None
 
     def lookupPartialTicker(self,ticker,market=None,place=None):
         # return list of
+        if self.m_sortedtickers==None:
+            self.m_sortedtickers = self.m_tickers.keys()
+            self.m_sortedtickers.sort()
+        tickers = self.m_sortedtickers
         ret = []
-        for eachVal in self.m_quotes.values():
-            if (eachVal.ticker().find(ticker,0)==0) and (market==None or (market==eachVal.market())) and (place==None or (place==eachVal.place())):
-                    ret.append(eachVal)
+        i = bisect_left(tickers,ticker)
+        while i<len(tickers) and tickers[i].startswith(ticker):
+            for eachKey in self.m_tickers[tickers[i]]:
+                if self._match(eachKey,market,place):
+                    ret.append(self._quote(eachKey))
+            i = i + 1
         return ret
 
+    def search(self,text,market=None,place=None,limit=None):
+        # ranked records (key,isin,name,ticker,market,place,list) of the
+        # quotes whose ticker, name or isin look like text (see
+        # itrade_search), without creating the quotes : use lookupKey() for
+        # the rows the user acts on
+        if self.m_search==None:
+            self.m_search = QuoteSearchIndex()
+            for eachKey,eachQuote in self.m_quotes.iteritems():
+                isin,name,ticker,qmarket,qplace,qlist = self._info(eachQuote)
+                self.m_search.add(eachKey,ticker,name,isin,qmarket,qplace)
+        if limit==None:
+            limit = itrade_config.searchLimit
+        return [(eachKey,) + self._info(self.m_quotes[eachKey]) for eachKey in self.m_search.search(text,market,place,limit)]
+
     def lookupName(self,name,market,place=None):
-        for eachVal in self.m_quotes.values():
-            if (eachVal.name() == name) and (market==None or (market==eachVal.market())) and (place==None or (place==eachVal.place())):
-                return eachVal
+        for eachKey in self.m_names.get(name,()):
+            if self._match(eachKey,market,place):
+                return self._quote(eachKey)
         return None
 
     # ---[ Trades ] ---
@@ -1495,12 +1782,12 @@ class Quotes(object):
     def loadTrades(self,fi=None):
         # read quotes data
         for eachKey in self.m_quotes.keys():
-            self.m_quotes[eachKey].loadTrades(fi)
+            self._quote(eachKey).loadTrades(fi)
 
     def saveTrades(self,fe=None):
-        # read quotes data
-        for eachKey in self.m_quotes.keys():
-            self.m_quotes[eachKey].saveTrades(fe)
+        # read quotes data (only the quotes already used have trades)
+        for eachQuote in self.materialized():
+            eachQuote.saveTrades(fe)
 
 # ============================================================================
 # Export
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# ============================================================================
+# Project Name : iTrade
+# Module Name  : itrade_scheduler.py
+#
+# Description: Scheduler of the live updates
+#
+# The Original Code is iTrade code (http://itrade.sourceforge.net).
+#
+# The Initial Developer of the Original Code is	Gilles Dumortier.
+#
+# Portions created by the Initial Developer are Copyright (C) 2004-2008 the
+# Initial Developer. All Rights Reserved.
+#
+# Contributor(s):
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see http://www.gnu.org/licenses/gpl.html
+#
+# History       Rev   Description
+# 2026-10-18          Wrote it from scratch
+# ============================================================================
+
+# ============================================================================
+# Imports
+# ============================================================================
+
+# python system
+import logging
+import heapq
+import threading
+import time
+from datetime import datetime
+
+# pytz
+from pytz import utc
+
+# iTrade system
+from itrade_logging import *
+import itrade_config
+import itrade_import
+from itrade_market import market_isopen,market_nextopen
+
+# ============================================================================
+# LiveJob
+#
+#   one periodic live update : a quote (liveupdate_from_internet) or any
+#   action (i.e. a currency). notify(job) is called after each update.
+#   Jobs of the same group (the live connector of the quote) are polled
+#   together, the groups are staggered over the period.
+#
+#   The period of a quote depends on its market and its activity :
+#   - suspended while the market is closed, waked up just before the open
+#   - faster for the quotes of the portfolio and the quotes near a stop
+#   - slower while the last price does not change
+# ============================================================================
+
+class LiveJob(object):
+    def __init__(self,sleeptime,notify=None,quote=None,action=None,group=None,param=None):
+        self.m_sleeptime = sleeptime
+        self.m_notify = notify
+        self.m_quote = quote
+        self.m_action = action
+        self.m_param = param
+        if group==None and quote:
+            abc = quote.liveconnector()
+            if abc:
+                group = abc.name()
+        self.m_group = group
+
+        self.m_keepGoing = False
+        self.m_running = False
+        self.m_inprogress = False
+        self.m_generation = 0
+
+        # activity of the quote
+        self.m_suspended = False
+        self.m_lastvalue = None
+        self.m_unchanged = 0
+
+    def Start(self):
+        gLiveScheduler.start(self)
+
+    def Stop(self):
+        gLiveScheduler.stop(self)
+
+    def IsRunning(self):
+        return self.m_running
+
+    def run(self):
+        if self.m_action:
+            self.m_action()
+        elif self.m_quote:
+            itrade_import.liveupdate_from_internet(self.m_quote)
+
+            value = (self.m_quote.nv_close(),self.m_quote.nv_volume())
+            if value==self.m_lastvalue:
+                self.m_unchanged = self.m_unchanged + 1
+            else:
+                self.m_unchanged = 0
+            self.m_lastvalue = value
+
+    def nearStop(self):
+        quote = self.m_quote
+        value = quote.nv_close()
+        if not value:
+            return False
+        if quote.nv_stoploss()>0 and value <= quote.nv_stoploss() * (1.0 + itrade_config.liveNearStop):
+            return True
+        if quote.nv_stopwin()>0 and value >= quote.nv_stopwin() * (1.0 - itrade_config.liveNearStop):
+            return True
+        return False
+
+    def interval(self,now):
+        # delay in seconds until the next poll (after the poll at 'now')
+        self.m_suspended = False
+        period = self.m_sleeptime
+        quote = self.m_quote
+        if quote==None or self.m_action:
+            return period
+
+        # the data of a differed connector are late by delay() minutes
+        abc = quote.liveconnector()
+        if abc:
+            delay = abc.delay() * 60
+        else:
+            delay = 0
+        when = datetime.fromtimestamp(now - delay,utc)
+        if not market_isopen(quote.market(),when):
+            nextopen = market_nextopen(quote.market(),when)
+            if nextopen:
+                self.m_suspended = True
+                wait = nextopen - when
+                wait = wait.days * 86400 + wait.seconds - itrade_config.liveWakeBefore
+                return max(period,wait)
+
+        if quote.isTraded() or self.nearStop():
+            return period * itrade_config.liveFastFactor
+
+        return period * min(2 ** self.m_unchanged,itrade_config.liveMaxBackoff)
+
+# ============================================================================
+# LiveScheduler
+#
+#   a queue of (next due time,job) served by a small pool of worker threads
+#   (itrade_config.liveWorkers)
+# ============================================================================
+
+class LiveScheduler(object):
+    def __init__(self,workers=None):
+        if workers==None:
+            workers = itrade_config.liveWorkers
+        self.m_workers = max(workers,1)
+        self.m_threads = []
+        self.m_queue = []
+        self.m_seq = 0
+        self.m_phases = {}
+        self.m_cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.m_queue)
+
+    # --- [ jobs ] ---
+
+    def phase(self,group):
+        # offset of the group in the period (0..1) : golden ratio sequence
+        # so that the groups are spread whatever their number
+        if not self.m_phases.has_key(group):
+            self.m_phases[group] = (len(self.m_phases) * 0.618034) % 1.0
+        return self.m_phases[group]
+
+    def due(self,job,now):
+        # next poll of the job, aligned on the phase of its group : jobs of the
+        # same group and period are due at the same time
+        period = job.interval(now)
+        if job.m_suspended:
+            return now + period
+        offset = self.phase(job.m_group) * period
+        n = int((now - offset) / period) + 1
+        return n * period + offset
+
+    def push(self,job,due):
+        # called with the lock
+        self.m_seq = self.m_seq + 1
+        heapq.heappush(self.m_queue,(due,self.m_seq,job.m_generation,job))
+
+    def start(self,job):
+        self.m_cond.acquire()
+        try:
+            job.m_keepGoing = True
+            if not job.m_running:
+                job.m_running = True
+                job.m_generation = job.m_generation + 1
+                # first update as soon as possible
+                self.push(job,time.time())
+            self.startWorkers()
+            self.m_cond.notify()
+        finally:
+            self.m_cond.release()
+
+    def stop(self,job):
+        self.m_cond.acquire()
+        try:
+            job.m_keepGoing = False
+            if not job.m_inprogress:
+                # the entry in the queue is ignored (generation)
+                job.m_running = False
+                job.m_generation = job.m_generation + 1
+        finally:
+            self.m_cond.release()
+
+    # --- [ workers ] ---
+
+    def startWorkers(self):
+        # called with the lock
+        while len(self.m_threads) < self.m_workers:
+            t = threading.Thread(target=self.worker,name='LiveScheduler-%d' % len(self.m_threads))
+            t.setDaemon(True)
+            self.m_threads.append(t)
+            t.start()
+
+    def next(self):
+        # (called with the lock) wait for the first due job then take all the
+        # jobs of its group due in the next itrade_config.liveGroupDelay
+        while True:
+            now = time.time()
+            while self.m_queue:
+                due,seq,generation,job = self.m_queue[0]
+                if generation==job.m_generation:
+                    break
+                heapq.heappop(self.m_queue)
+            if self.m_queue and self.m_queue[0][0]<=now:
+                break
+            if self.m_queue:
+                self.m_cond.wait(self.m_queue[0][0]-now)
+            else:
+                self.m_cond.wait()
+
+        due,seq,generation,first = heapq.heappop(self.m_queue)
+        batch = [first]
+        others = []
+        limit = now + itrade_config.liveGroupDelay
+        while self.m_queue and self.m_queue[0][0]<=limit:
+            entry = heapq.heappop(self.m_queue)
+            job = entry[3]
+            if entry[2]!=job.m_generation:
+                continue
+            if job.m_group==first.m_group and not job in batch:
+                batch.append(job)
+            else:
+                others.append(entry)
+        for entry in others:
+            heapq.heappush(self.m_queue,entry)
+
+        for job in batch:
+            job.m_inprogress = True
+        return batch
+
+    def worker(self):
+        while True:
+            self.m_cond.acquire()
+            try:
+                batch = self.next()
+            finally:
+                self.m_cond.release()
+
+            # a failure of one job (or of its notification) does not stop
+            # the others nor the worker
+            try:
+                quotes = [job.m_quote for job in batch if job.m_quote and not job.m_action]
+                if len(quotes)>1:
+                    itrade_import.liveupdate_prefetch(quotes)
+            except:
+                exception('LiveScheduler: live prefetch failure : %s' % [job.m_param for job in batch])
+
+            for job in batch:
+                if job.m_keepGoing:
+                    try:
+                        job.run()
+                    except:
+                        exception('LiveScheduler: live update failure : %s' % job.m_param)
+
+            for job in batch:
+                if job.m_keepGoing and job.m_notify:
+                    try:
+                        job.m_notify(job)
+                    except:
+                        exception('LiveScheduler: notify failure : %s' % job.m_param)
+
+            self.m_cond.acquire()
+            try:
+                now = time.time()
+                for job in batch:
+                    job.m_inprogress = False
+                    if job.m_keepGoing:
+                        # late jobs are not caught up : next period
+                        try:
+                            due = self.due(job,now)
+                        except:
+                            exception('LiveScheduler: can not reschedule %s : stopped' % job.m_param)
+                            job.m_running = False
+                            continue
+                        self.push(job,due)
+                    else:
+                        job.m_running = False
+                self.m_cond.notify()
+            finally:
+                self.m_cond.release()
+
+# ============================================================================
+# Export
+# ============================================================================
+
+try:
+    ignore(gLiveScheduler)
+except NameError:
+    gLiveScheduler = LiveScheduler()
+
+# ============================================================================
+# That's all folks !
+# ============================================================================
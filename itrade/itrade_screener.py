@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# ============================================================================
+# Project Name : iTrade
+# Module Name  : itrade_screener.py
+#
+# Description: Stock screener over the quotes
+#
+# The Original Code is iTrade code (http://itrade.sourceforge.net).
+#
+# The Initial Developer of the Original Code is	Gilles Dumortier.
+#
+# Portions created by the Initial Developer are Copyright (C) 2004-2008 the
+# Initial Developer. All Rights Reserved.
+#
+# Contributor(s):
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see http://www.gnu.org/licenses/gpl.html
+#
+# History       Rev   Description
+# 2026-10-18          Wrote it from scratch
+# ============================================================================
+
+# ============================================================================
+# Imports
+# ============================================================================
+
+# python system
+import re
+import logging
+
+# numpy
+import numpy
+
+# iTrade system
+from itrade_logging import *
+import itrade_config
+import itrade_trades
+import itrade_indicators
+from itrade_quotes import quotes
+
+# ============================================================================
+# Filter expression
+#
+#   expr    := and ( 'or' and )*
+#   and     := not ( 'and' not )*
+#   not     := 'not' not | compare
+#   compare := sum [ ( '<' | '<=' | '>' | '>=' | '==' | '!=' ) sum ]
+#   sum     := product ( ( '+' | '-' ) product )*
+#   product := unary ( ( '*' | '/' ) unary )*
+#   unary   := '-' unary | atom
+#   atom    := number | column | name '(' number ( ',' number )* ')' | '(' expr ')'
+#
+# i.e. : rsi14 < 30 and close > ma150 and vma15 > 1e5
+#
+# A column is a value of the last trade of the quote (see FIELDS) ; name(...)
+# is any indicator registered in itrade_indicators (i.e. ma(33), rsi(9)).
+# ============================================================================
+
+class ScreenerError(Exception):
+    pass
+
+FIELDS = {
+    'open'   : lambda tr,i: tr.m_inOpen[i],
+    'high'   : lambda tr,i: tr.m_inHigh[i],
+    'low'    : lambda tr,i: tr.m_inLow[i],
+    'close'  : lambda tr,i: tr.m_inClose[i],
+    'volume' : lambda tr,i: tr.m_inVol[i],
+    'ma20'   : lambda tr,i: tr.ma20(i),
+    'ma50'   : lambda tr,i: tr.ma50(i),
+    'ma100'  : lambda tr,i: tr.ma100(i),
+    'ma150'  : lambda tr,i: tr.ma150(i),
+    'vma15'  : lambda tr,i: tr.vma15(i),
+    'rsi14'  : lambda tr,i: tr.rsi14(i),
+    'stoK'   : lambda tr,i: tr.stoK(i),
+    'stoD'   : lambda tr,i: tr.stoD(i),
+    'ovb'    : lambda tr,i: tr.ovb(i),
+    'bollDn' : lambda tr,i: tr.bollinger(i,0),
+    'bollM'  : lambda tr,i: tr.bollinger(i,1),
+    'bollUp' : lambda tr,i: tr.bollinger(i,2),
+    }
+
+_token = re.compile(r'\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z_]\w*)|(<=|>=|==|!=|<>|[-+*/<>(),]))')
+
+def tokenize(expr):
+    tokens = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos<len(expr):
+        m = _token.match(expr,pos)
+        if not m:
+            raise ScreenerError('unexpected character at %d: %s' % (pos,expr[pos:]))
+        num,name,op = m.groups()
+        if num:
+            tokens.append(('num',float(num)))
+        elif name:
+            if name in ('and','or','not'):
+                tokens.append(('op',name))
+            else:
+                tokens.append(('name',name))
+        else:
+            if op=='<>':
+                op = '!='
+            tokens.append(('op',op))
+        pos = m.end()
+    return tokens
+
+class _Parser(object):
+    def __init__(self,expr):
+        self.m_tokens = tokenize(expr)
+        self.m_pos = 0
+
+    def peek(self):
+        if self.m_pos<len(self.m_tokens):
+            return self.m_tokens[self.m_pos]
+        return (None,None)
+
+    def next(self):
+        tok = self.peek()
+        self.m_pos = self.m_pos + 1
+        return tok
+
+    def accept(self,*ops):
+        kind,val = self.peek()
+        if kind=='op' and val in ops:
+            self.m_pos = self.m_pos + 1
+            return val
+        return None
+
+    def expect(self,op):
+        if not self.accept(op):
+            raise ScreenerError('%s expected' % op)
+
+    def parse(self):
+        node = self.expr()
+        if self.peek()[0]!=None:
+            raise ScreenerError('unexpected %s' % (self.peek()[1],))
+        return node
+
+    def expr(self):
+        node = self.and_()
+        while self.accept('or'):
+            node = ('or',node,self.and_())
+        return node
+
+    def and_(self):
+        node = self.not_()
+        while self.accept('and'):
+            node = ('and',node,self.not_())
+        return node
+
+    def not_(self):
+        if self.accept('not'):
+            return ('not',self.not_())
+        return self.compare()
+
+    def compare(self):
+        node = self.sum()
+        op = self.accept('<','<=','>','>=','==','!=')
+        if op:
+            node = (op,node,self.sum())
+        return node
+
+    def sum(self):
+        node = self.product()
+        op = self.accept('+','-')
+        while op:
+            node = (op,node,self.product())
+            op = self.accept('+','-')
+        return node
+
+    def product(self):
+        node = self.unary()
+        op = self.accept('*','/')
+        while op:
+            node = (op,node,self.unary())
+            op = self.accept('*','/')
+        return node
+
+    def unary(self):
+        if self.accept('-'):
+            return ('neg',self.unary())
+        return self.atom()
+
+    def atom(self):
+        if self.accept('('):
+            node = self.expr()
+            self.expect(')')
+            return node
+        kind,val = self.next()
+        if kind=='num':
+            return ('num',val)
+        if kind=='name':
+            if self.accept('('):
+                if itrade_indicators.getIndicator(val)==None:
+                    raise ScreenerError('unknown indicator %s' % val)
+                params = []
+                while True:
+                    kind,p = self.next()
+                    if kind!='num':
+                        raise ScreenerError('number expected in %s()' % val)
+                    if p!=int(p) or p<1:
+                        raise ScreenerError('positive integer expected in %s()' % val)
+                    params.append(int(p))
+                    if not self.accept(','):
+                        break
+                self.expect(')')
+                checkIndicator(val,tuple(params))
+                return ('col',(val,tuple(params)))
+            if not FIELDS.has_key(val):
+                raise ScreenerError('unknown column %s' % val)
+            return ('col',(val,None))
+        raise ScreenerError('unexpected end of expression')
+
+def checkIndicator(name,params):
+    # raise ScreenerError if name(params) is not a single column indicator :
+    # number of parameters of the function of the indicator (close, high,
+    # low and volume first) then a computation on a few slots
+    func,lookback = itrade_indicators.getIndicator(name)
+    code = getattr(func,'func_code',None)
+    if code!=None:
+        nmax = code.co_argcount - 4
+        nmin = nmax - len(func.func_defaults or ())
+        if len(params)<nmin or len(params)>nmax:
+            if nmin==nmax:
+                raise ScreenerError('%s() takes %d parameter(s)' % (name,nmax))
+            raise ScreenerError('%s() takes %d to %d parameters' % (name,nmin,nmax))
+    sample = numpy.ones(4)
+    try:
+        ret = itrade_indicators.compute(name,params,sample,sample,sample,numpy.ones(4,numpy.int64))
+    except (TypeError,ValueError,IndexError),e:
+        raise ScreenerError('%s%s: %s' % (name,params,e))
+    if ret is None or isinstance(ret,tuple):
+        raise ScreenerError('%s() is not a single column indicator' % name)
+
+def parse(expr):
+    return _Parser(expr).parse()
+
+def columns(node,ret=None):
+    # columns used by the expression
+    if ret==None:
+        ret = {}
+    if node[0]=='col':
+        ret[node[1]] = True
+    elif node[0]!='num':
+        for eachNode in node[1:]:
+            columns(eachNode,ret)
+    return ret.keys()
+
+_ops = {
+    'or'  : numpy.logical_or,
+    'and' : numpy.logical_and,
+    '<'   : numpy.less,
+    '<='  : numpy.less_equal,
+    '>'   : numpy.greater,
+    '>='  : numpy.greater_equal,
+    '=='  : numpy.equal,
+    '!='  : numpy.not_equal,
+    '+'   : numpy.add,
+    '-'   : numpy.subtract,
+    '*'   : numpy.multiply,
+    '/'   : numpy.divide,
+    }
+
+def evaluate(node,cols):
+    # evaluate the expression on the arrays of 'cols' (one value per quote)
+    if node[0]=='num':
+        return node[1]
+    if node[0]=='col':
+        return cols[node[1]]
+    if node[0]=='neg':
+        return -evaluate(node[1],cols)
+    if node[0]=='not':
+        return numpy.logical_not(evaluate(node[1],cols))
+    return _ops[node[0]](evaluate(node[1],cols),evaluate(node[2],cols))
+
+# ============================================================================
+# Screener
+#
+# values of the columns of the expression are kept per quote (one array per
+# column) : a refresh gathers only the quotes having a new or changed last
+# trade, then the expression is evaluated on all the quotes at once.
+# ============================================================================
+
+class Screener(object):
+    def __init__(self,expr,qlist=None):
+        if qlist==None:
+            # the quotes without history never match : only the quotes with
+            # a history in the cache (or already used) are created
+            history = itrade_trades.historyKeys()
+            for eachQuote in quotes.materialized():
+                history[eachQuote.key()] = True
+            self.m_keys = [eachRecord[0] for eachRecord in quotes.records() if history.has_key(eachRecord[0])]
+            self.m_quotes = [None] * len(self.m_keys)
+        else:
+            self.m_quotes = list(qlist)
+            self.m_keys = [eachQuote.key() for eachQuote in self.m_quotes]
+        self.m_row = {}
+        for row,eachKey in enumerate(self.m_keys):
+            self.m_row[eachKey] = row
+        self.m_stamps = [None] * len(self.m_keys)
+        self.m_cols = {}
+        self.setExpression(expr)
+
+    def expression(self):
+        return self.m_expr
+
+    def setExpression(self,expr):
+        # raise ScreenerError if the expression is not valid (the previous
+        # expression is kept) ; only the columns of the new expression are
+        # kept
+        node = parse(expr)
+        cols = {}
+        for eachCol in columns(node):
+            if self.m_cols.has_key(eachCol):
+                cols[eachCol] = self.m_cols[eachCol]
+            else:
+                cols[eachCol] = numpy.empty(len(self.m_keys))
+                cols[eachCol].fill(numpy.nan)
+                # gather this new column for all the quotes
+                self.m_stamps = [None] * len(self.m_keys)
+        self.m_node = node
+        self.m_expr = expr
+        self.m_cols = cols
+
+    def keys(self):
+        # keys of the quotes screened
+        return self.m_keys
+
+    def _quote(self,row):
+        # the quote of the row, created on first use
+        if self.m_quotes[row]==None:
+            self.m_quotes[row] = quotes.lookupKey(self.m_keys[row])
+        return self.m_quotes[row]
+
+    def _gather(self,row):
+        quote = self._quote(row)
+        if quote==None:
+            # removed from the list of quotes : never matches
+            self.m_stamps[row] = (-1,)
+            return False
+        lt = quote.m_daytrades
+        if lt==None:
+            quote.loadTrades()
+            lt = quote.m_daytrades
+        elif self.m_stamps[row]!=None and isinstance(lt,itrade_trades.LazyTrades) and not lt.isLoaded():
+            # history not loaded since : nothing new
+            return False
+
+        tr = lt.lasttrade()
+        if tr==None:
+            stamp = (-1,)
+        else:
+            stamp = (tr.index(),tr.nv_open(),tr.nv_high(),tr.nv_low(),tr.nv_close(),tr.nv_volume())
+        if stamp==self.m_stamps[row]:
+            return False
+
+        for (name,params),col in self.m_cols.items():
+            if tr==None:
+                col[row] = numpy.nan
+            elif params==None:
+                col[row] = FIELDS[name](lt,tr.index())
+            else:
+                val = lt.indicatorAt(name,params,tr.index())
+                if val==None or isinstance(val,tuple):
+                    raise ScreenerError('%s() is not a single column indicator' % name)
+                col[row] = val
+        self.m_stamps[row] = stamp
+        return True
+
+    def refresh(self,qlist=None):
+        # gather the values of the quotes (default: all) ; return the number
+        # of quotes updated
+        if qlist==None:
+            rows = range(len(self.m_keys))
+        else:
+            rows = [self.m_row[eachQuote.key()] for eachQuote in qlist if self.m_row.has_key(eachQuote.key())]
+        n = 0
+        for row in rows:
+            if self._gather(row):
+                n = n + 1
+        if itrade_config.verbose:
+            info('Screener::refresh %d/%d quotes updated' % (n,len(rows)))
+        return n
+
+    def value(self,quote,name,params=None):
+        return self.m_cols[(name,params)][self.m_row[quote.key()]]
+
+    def result(self):
+        # quotes matching the expression (with the values as gathered)
+        olderr = numpy.seterr(invalid='ignore',divide='ignore')
+        try:
+            match = evaluate(self.m_node,self.m_cols)
+        finally:
+            numpy.seterr(**olderr)
+        match = numpy.logical_and(match,[s!=None and s[0]>=0 for s in self.m_stamps])
+        # not enough history for a column : no match (i.e. for 'not')
+        for eachCol in self.m_cols.values():
+            match = numpy.logical_and(match,numpy.isfinite(eachCol))
+        return [self._quote(row) for row in numpy.flatnonzero(match)]
+
+    def run(self,qlist=None):
+        self.refresh(qlist)
+        return self.result()
+
+# ============================================================================
+# cmdline_screen()
+# ============================================================================
+
+def colname(col):
+    name,params = col
+    if params==None:
+        return name
+    return '%s(%s)' % (name,','.join([str(p) for p in params]))
+
+def cmdline_screen(expr):
+    try:
+        screener = Screener(expr)
+        lst = screener.run()
+    except ScreenerError,e:
+        print 'screen: %s' % e
+        return None
+
+    cols = columns(screener.m_node)
+    cols.sort()
+    print '--- %d/%d quotes matching: %s ---' % (len(lst),len(screener.keys()),expr)
+    for eachQuote in lst:
+        vals = ['%s=%.2f' % (colname(eachCol),screener.value(eachQuote,*eachCol)) for eachCol in cols]
+        print '%-12s %-30s %s' % (eachQuote.ticker(),eachQuote.name(),' '.join(vals))
+    return lst
+
+# ============================================================================
+# Test
+# ============================================================================
+
+if __name__=='__main__':
+    setLevel(logging.INFO)
+
+    from itrade_local import *
+    import itrade_quotes
+
+    itrade_quotes.initQuotesModule()
+
+    info('test1 %s' % (parse('rsi14 < 30 and close > ma150 and vma15 > 1e5'),))
+    cmdline_screen('rsi14 < 30 and close > ma150')
+
+# ============================================================================
+# That's all folks !
+# ============================================================================
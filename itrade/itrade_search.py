@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# ============================================================================
+# Project Name : iTrade
+# Module Name  : itrade_search.py
+#
+# Description: Fuzzy search of the quotes (ticker, name and isin)
+#
+# The Original Code is iTrade code (http://itrade.sourceforge.net).
+#
+# The Initial Developer of the Original Code is	Gilles Dumortier.
+#
+# Portions created by the Initial Developer are Copyright (C) 2004-2008 the
+# Initial Developer. All Rights Reserved.
+#
+# Contributor(s):
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see http://www.gnu.org/licenses/gpl.html
+#
+# History       Rev   Description
+# 2026-10-18          Wrote it from scratch
+# ============================================================================
+
+# ============================================================================
+# Imports
+# ============================================================================
+
+# python system
+import logging
+import re
+
+# iTrade system
+from itrade_logging import *
+import itrade_config
+from itrade_isin import filterName
+
+# ============================================================================
+# Trigrams
+#
+#   each word is padded with two '$' at its beginning : the first trigrams
+#   of a word ('$$A', '$AI') match the prefixes of one or two characters,
+#   so the query typed so far always has at least one trigram
+# ============================================================================
+
+re_separators = re.compile('[^0-9A-Z\x80-\xff]+')
+
+def normalize(text):
+    return re_separators.sub(' ',filterName(text).upper()).strip()
+
+def trigrams(text):
+    # distinct trigrams of the words of a normalized text
+    ret = {}
+    for eachWord in text.split():
+        word = '$$' + eachWord
+        for i in range(len(word)-2):
+            ret[word[i:i+3]] = True
+    return ret.keys()
+
+# ============================================================================
+# QuoteSearchIndex
+#
+#   postings (trigram -> list of document ids) for each field of the quotes.
+#   The documents are the keys of the quotes (the quotes are not created to
+#   be indexed, see Quotes). A removed quote leaves a hole in the documents,
+#   the postings are rebuilt when there are more holes than quotes.
+# ============================================================================
+
+# fields and weights of a matching trigram
+SEARCH_TICKER = 0
+SEARCH_NAME = 1
+SEARCH_ISIN = 2
+
+search_weights = (3,1,2)
+
+class QuoteSearchIndex(object):
+    def __init__(self):
+        self.m_docs = []
+        self.m_fields = []
+        self.m_ids = {}
+        self.m_holes = 0
+        self.m_postings = ({},{},{})
+
+    def __len__(self):
+        return len(self.m_ids)
+
+    # ---[ updates ] ---
+
+    def add(self,key,ticker,name,isin,market,place):
+        if self.m_ids.has_key(key):
+            self.remove(key)
+        id = len(self.m_docs)
+        fields = (normalize(ticker),normalize(name),normalize(isin or ''))
+        self.m_docs.append((key,market,place,ticker,name,isin))
+        self.m_fields.append(fields)
+        self.m_ids[key] = id
+        for field in range(len(fields)):
+            postings = self.m_postings[field]
+            for eachGram in trigrams(fields[field]):
+                if postings.has_key(eachGram):
+                    postings[eachGram].append(id)
+                else:
+                    postings[eachGram] = [id]
+
+    def remove(self,key):
+        id = self.m_ids.get(key)
+        if id==None:
+            return
+        del self.m_ids[key]
+        self.m_docs[id] = None
+        self.m_fields[id] = None
+        self.m_holes = self.m_holes + 1
+        if self.m_holes > len(self.m_ids):
+            self.rebuild()
+
+    def rebuild(self):
+        docs = [eachDoc for eachDoc in self.m_docs if eachDoc]
+        self.m_docs = []
+        self.m_fields = []
+        self.m_ids = {}
+        self.m_holes = 0
+        self.m_postings = ({},{},{})
+        for key,market,place,ticker,name,isin in docs:
+            self.add(key,ticker,name,isin,market,place)
+
+    # ---[ search ] ---
+
+    def search(self,text,market=None,place=None,limit=None):
+        # keys of the quotes matching text, best first : weighted count of the
+        # trigrams of the query found in the ticker, the name or the isin
+        query = normalize(text)
+        grams = trigrams(query)
+        if not grams:
+            return []
+
+        scores = {}
+        matched = {}
+        for eachGram in grams:
+            # best field of each document for this trigram
+            best = {}
+            for field in range(len(self.m_postings)):
+                weight = search_weights[field]
+                for id in self.m_postings[field].get(eachGram,()):
+                    if best.get(id,0) < weight:
+                        best[id] = weight
+            for id,weight in best.iteritems():
+                scores[id] = scores.get(id,0) + weight
+                matched[id] = matched.get(id,0) + 1
+
+        # a few trigrams can be missing (typing errors)
+        threshold = max(1,int(len(grams) * itrade_config.searchMinMatch + 0.5))
+        ret = []
+        for id,count in matched.iteritems():
+            if count < threshold:
+                continue
+            doc = self.m_docs[id]
+            if doc==None:
+                continue
+            if (market!=None and market!=doc[1]) or (place!=None and place!=doc[2]):
+                continue
+            # exact ticker or isin first, then the exact name and the prefixes
+            score = scores[id]
+            ticker,name,isin = self.m_fields[id]
+            if ticker==query or isin==query:
+                score = score + 100
+            elif ticker.startswith(query) or isin.startswith(query):
+                score = score + 10
+            if name==query:
+                score = score + 50
+            elif name.startswith(query):
+                score = score + 5
+            ret.append((-score,len(ticker),ticker,id))
+        ret.sort()
+        if limit:
+            ret = ret[:limit]
+        return [self.m_docs[id][0] for score,length,ticker,id in ret]
+
+# ============================================================================
+# That's all folks !
+# ============================================================================
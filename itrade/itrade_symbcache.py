@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# ============================================================================
+# Project Name : iTrade
+# Module Name  : itrade_symbcache.py
+#
+# Description: Compiled cache of the lists of symbols
+#
+# The Original Code is iTrade code (http://itrade.sourceforge.net).
+#
+# The Initial Developer of the Original Code is	Gilles Dumortier.
+#
+# Portions created by the Initial Developer are Copyright (C) 2004-2008 the
+# Initial Developer. All Rights Reserved.
+#
+# Contributor(s):
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see http://www.gnu.org/licenses/gpl.html
+#
+# History       Rev   Description
+# 2026-10-18          Wrote it from scratch
+# ============================================================================
+
+# ============================================================================
+# Imports
+# ============================================================================
+
+# python system
+import os
+import marshal
+import logging
+
+# iTrade system
+from itrade_logging import *
+import itrade_config
+from itrade_tradescache import _rename
+
+# ============================================================================
+# File format (marshal, version 2)
+#
+#   (MAGIC,VERSION,MTIME,SIZE,LIST,RECORDS)
+#
+#   MTIME and SIZE are the ones of the text file the records have been
+#   compiled from : the cache is invalid as soon as the text file changes.
+#   RECORDS is the list of the records of the quotes, already normalized
+#   (see itrade_quotes.quote_record), in the order of the text file.
+# ============================================================================
+
+MAGIC = 'ITRS'
+VERSION = 2
+
+def cachefile(txtfile):
+    # quotes.EURONEXT.txt -> <cache>/quotes.EURONEXT.db
+    return os.path.join(itrade_config.dirCacheData,os.path.splitext(os.path.basename(txtfile))[0] + '.db')
+
+def _stamp(txtfile):
+    try:
+        st = os.stat(txtfile)
+    except OSError:
+        return None
+    return (int(st.st_mtime),st.st_size)
+
+# ============================================================================
+# read / write
+# ============================================================================
+
+def read(txtfile,list):
+    # return the records compiled from txtfile or None if there is no valid
+    # cache for the current version of txtfile
+    if not itrade_config.symbolsCache:
+        return None
+    stamp = _stamp(txtfile)
+    if stamp==None:
+        return None
+    fn = cachefile(txtfile)
+    try:
+        f = open(fn,'rb')
+    except IOError:
+        return None
+    try:
+        try:
+            data = marshal.load(f)
+        except (EOFError,ValueError,TypeError):
+            info('read(%s): damaged symbols cache file' % fn)
+            return None
+    finally:
+        f.close()
+    if type(data)!=tuple or len(data)!=6 or data[0]!=MAGIC or data[1]!=VERSION:
+        info('read(%s): not a symbols cache file' % fn)
+        return None
+    if (data[2],data[3])!=stamp or data[4]!=list:
+        # the text file has changed
+        return None
+    return data[5]
+
+def write(txtfile,list,records):
+    if not itrade_config.symbolsCache:
+        return False
+    stamp = _stamp(txtfile)
+    if stamp==None:
+        return False
+    fn = cachefile(txtfile)
+
+    # write a temporary file then rename it (see itrade_tradescache)
+    tmp = fn + '.tmp'
+    try:
+        f = open(tmp,'wb')
+        try:
+            marshal.dump((MAGIC,VERSION,stamp[0],stamp[1],list,records),f)
+        finally:
+            f.close()
+        _rename(tmp,fn)
+    except (IOError,OSError),e:
+        info('write(%s): can\'t write the symbols cache file : %s' % (fn,e))
+        return False
+    return True
+
+# ============================================================================
+# That's all folks !
+# ============================================================================
@@ -37,16 +37,17 @@
 
 # python system
 from datetime import *
-from math import pow,sqrt
 import logging
 
 # numpy
-from numpy import array
+import numpy
 
 # iTrade system
 from itrade_logging import *
 import itrade_csv
-from itrade_datation import gCal,Datation
+import itrade_tradescache
+import itrade_indicators
+from itrade_datation import gCal,Datation,str2date,date2ordinal
 from itrade_candle import *
 
 # ============================================================================
@@ -55,7 +56,9 @@ from itrade_candle import *
 
 class Trade(object):
     def __init__(self,trades,d,open,high,low,close,volume,idx):
-        if d[4]=='-':
+        if isinstance(d,date):
+            self.m_date = d
+        elif d[4]=='-':
             #debug('Trade::__init__():%s: %d %d %d' % (d,long(d[0:4]),long(d[5:7]),long(d[8:10])));
             self.m_date = date(long(d[0:4]),long(d[5:7]),long(d[8:10]))
         else:
@@ -99,13 +102,122 @@ class Trade(object):
         return self.m_index
 
 # ============================================================================
-# create_array() - function helper
+# TradesColumn
+#
+# one column of a Trades (raw values or indicator) read with the global
+# calendar index like a full calendar array. Only the frame of the history
+# is stored : m_data[i] is the value of the global index m_offset+i.
+# Outside the frame, the raw columns read 'fill' (no trade) and the
+# indicators read the value of the nearest edge of the frame : the frame
+# keeps some days without trade before the first trade and after the last
+# one, where the built-in indicators are already constant (the longest
+# window is the one of the RSI : 141 days).
 # ============================================================================
 
-def create_array(defval):
-    n = gCal.lastindex()+1
-    a = array([defval]*n)
-    return a
+TRADES_MARGIN_BEFORE = 8
+TRADES_MARGIN_AFTER = 160
+
+class TradesColumn(object):
+    def __init__(self,data,offset,fill,bEdge=False):
+        self.m_data = data
+        self.m_offset = offset
+        self.m_fill = fill
+        self.m_edge = bEdge
+
+    def __len__(self):
+        return gCal.lastindex()+1
+
+    def nbytes(self):
+        return self.m_data.nbytes
+
+    def _before(self):
+        if self.m_edge and len(self.m_data):
+            return self.m_data[0]
+        return self.m_fill
+
+    def _after(self):
+        if self.m_edge and len(self.m_data):
+            return self.m_data[-1]
+        return self.m_fill
+
+    def __getitem__(self,key):
+        if isinstance(key,slice):
+            start,stop,step = key.indices(len(self))
+            key = numpy.arange(start,stop,step)
+        elif not isinstance(key,(list,tuple,numpy.ndarray)):
+            i = int(key)
+            if i<0:
+                i = i + len(self)
+            j = i - self.m_offset
+            if j<0:
+                return self._before()
+            if j>=len(self.m_data):
+                return self._after()
+            return self.m_data[j]
+
+        # array of global indexes
+        j = numpy.asarray(key,numpy.int64) - self.m_offset
+        n = len(self.m_data)
+        ret = numpy.empty(len(j),self.m_data.dtype)
+        inside = (j>=0) & (j<n)
+        ret[inside] = self.m_data[j[inside]]
+        ret[j<0] = self._before()
+        ret[j>=n] = self._after()
+        return ret
+
+    def __setitem__(self,key,value):
+        # only inside the frame (see Trades.reserve)
+        j = int(key) - self.m_offset
+        if j<0 or j>=len(self.m_data):
+            raise IndexError('TradesColumn: index %d out of the frame' % key)
+        self.m_data[j] = value
+
+    def full(self):
+        # full calendar array
+        return self[0:len(self)]
+
+    def __array__(self,dtype=None):
+        if dtype==None:
+            return self.full()
+        return self.full().astype(dtype)
+
+# built-in indicators of Trades : columns computed together on the raw
+# columns of the frame (close,high,low,volume) on first use, and the
+# registered indicators (name,params,number of columns) giving the same
+# columns (used to recompute only the tail of the columns)
+
+def _sto(close,high,low,volume):
+    k = itrade_indicators.stoK(close,high,low,14)
+    return k,itrade_indicators.stoD(k,5)
+
+BUILTIN_INDICATORS = (
+    (('m_ma20',),lambda c,h,l,v: (itrade_indicators.ma(c,20),),(('ma',(20,),1),)),
+    (('m_ma50',),lambda c,h,l,v: (itrade_indicators.ma(c,50),),(('ma',(50,),1),)),
+    (('m_ma100',),lambda c,h,l,v: (itrade_indicators.ma(c,100),),(('ma',(100,),1),)),
+    (('m_ma150',),lambda c,h,l,v: (itrade_indicators.ma(c,150),),(('ma',(150,),1),)),
+    (('m_rsi14',),lambda c,h,l,v: (itrade_indicators.rsi(c,14),),(('rsi',(14,),1),)),
+    (('m_stoK','m_stoD'),_sto,(('stoK',(14,),1),('stoD',(14,5),1))),
+    (('m_bollDn','m_bollM','m_bollUp'),lambda c,h,l,v: itrade_indicators.bollinger(c,20),(('bollinger',(20,),3),)),
+    (('m_vma15',),lambda c,h,l,v: (itrade_indicators.vma(c,v,15),),(('vma',(15,),1),)),
+    (('m_ovb',),lambda c,h,l,v: (itrade_indicators.ovb(c,v),),(('ovb',(),1),)),
+    )
+
+def _builtin(name):
+    # attribute of Trades : the built-in indicator column 'name'
+    for names,func,specs in BUILTIN_INDICATORS:
+        if name in names:
+            break
+
+    def get(self):
+        col = self.m_columns.get(name)
+        if col==None:
+            data = func(self.m_inClose.m_data,self.m_inHigh.m_data,self.m_inLow.m_data,self.m_inVol.m_data)
+            for eachName,eachData in zip(names,data):
+                self.m_columns[eachName] = TradesColumn(eachData,self.m_offset,-1.0,bEdge=True)
+            col = self.m_columns[name]
+        return col
+
+    return property(get)
 
 # ============================================================================
 # Trades
@@ -117,6 +229,21 @@ def create_array(defval):
 # ============================================================================
 
 class Trades(object):
+    m_ma20 = _builtin('m_ma20')
+    m_ma50 = _builtin('m_ma50')
+    m_ma100 = _builtin('m_ma100')
+    m_ma150 = _builtin('m_ma150')
+    m_vma15 = _builtin('m_vma15')
+    m_ovb = _builtin('m_ovb')
+    m_rsi14 = _builtin('m_rsi14')
+
+    m_stoK = _builtin('m_stoK')
+    m_stoD = _builtin('m_stoD')
+
+    m_bollUp = _builtin('m_bollUp')
+    m_bollM = _builtin('m_bollM')
+    m_bollDn = _builtin('m_bollDn')
+
     def __init__(self,quote):
         #debug('Trades:__init__(%s)' % quote)
         self.m_quote = quote
@@ -124,63 +251,273 @@ class Trades(object):
 
     def _init_(self):
         self.m_dirty = False
+        # Trade objects already created (see _trade)
         self.m_trades = {}
         self.m_candles = {}
         self.m_firsttrade = None
         self.m_lasttrade = None
         self.m_lastimport = None
 
-        #self.m_date = {}
-        self.m_inOpen = create_array(-1.0)
-        self.m_inClose = create_array(-1.0)
-        self.m_inLow = create_array(-1.0)
-        self.m_inHigh = create_array(-1.0)
-        self.m_inVol = create_array(long(-1))
-        self.m_ma20 = create_array(-1.0)
-        self.m_ma50 = create_array(-1.0)
-        self.m_ma100 = create_array(-1.0)
-        self.m_ma150 = create_array(-1.0)
-        self.m_vma15 = create_array(-1.0)
-        self.m_ovb = create_array(long(0))
-        self.m_rsi14 = create_array(-1.0)
-
-        self.m_stoK = create_array(-1.0)
-        self.m_stoD = create_array(-1.0)
-
-        self.m_bollUp = create_array(-1.0)
-        self.m_bollM = create_array(-1.0)
-        self.m_bollDn = create_array(-1.0)
+        # dates added or changed since the binary cache was loaded or saved
+        self.m_changed = {}
+        self.m_cached = False
+        self.m_modified = 0
+
+        # ranges of trading days without trade at the import connector (see
+        # addKnownGaps) : read on first use
+        self.m_knowngaps = None
+
+        # indicators columns are up-to-date with the trades up to this index
+        # (-1: to be computed)
+        self.m_computedto = -1
+
+        # raw columns on the frame of the history (empty until the first
+        # trade) ; built-in indicators columns (see BUILTIN_INDICATORS),
+        # running state for the live updates and memoized indicators :
+        # (name,params) -> [columns,valid up to frame slot] (see setframe)
+        self.setframe(0,numpy.zeros(0),numpy.zeros(0),numpy.zeros(0),numpy.zeros(0),numpy.zeros(0,numpy.int64))
 
         self.m_candles = {}
 
     def quote(self):
         return self.m_quote
 
+    def memsize(self):
+        # estimation of the memory used by this history (in bytes)
+        n = len(self.m_trades) * TRADE_MEMSIZE
+        for eachColumn in [self.m_inOpen,self.m_inClose,self.m_inLow,self.m_inHigh,self.m_inVol] + self.m_columns.values():
+            n = n + eachColumn.nbytes()
+        if self.m_running:
+            n = n + self.m_running.memsize()
+        return n
+
+    # ---[ frame ] ---
+
+    def setframe(self,offset,open,high,low,close,volume):
+        # raw columns of the global indexes offset..offset+len(close)-1 ; the
+        # indicators are computed again on first use
+        self.m_offset = offset
+        self.m_inOpen = TradesColumn(open,offset,-1.0)
+        self.m_inHigh = TradesColumn(high,offset,-1.0)
+        self.m_inLow = TradesColumn(low,offset,-1.0)
+        self.m_inClose = TradesColumn(close,offset,-1.0)
+        self.m_inVol = TradesColumn(volume,offset,long(-1))
+        self.m_columns = {}
+        self.m_running = None
+        self.m_indicators = {}
+        gIndicatorsCache.forget(self)
+
+    def frame(self):
+        # global indexes of the first and last slots of the frame
+        return self.m_offset,self.m_offset+len(self.m_inClose.m_data)-1
+
+    def reserve(self,first,last):
+        # make room in the frame for the global indexes first..last (and the
+        # margins) ; the frame grows geometrically
+        n = gCal.lastindex()+1
+        lo = max(first-TRADES_MARGIN_BEFORE,0)
+        hi = min(last+TRADES_MARGIN_AFTER+1,n)
+        offset = self.m_offset
+        size = len(self.m_inClose.m_data)
+        if size>0:
+            if offset<=lo and hi<=offset+size:
+                return
+            lo = min(lo,offset)
+            hi = max(hi,offset+size)
+            extra = min(max(hi-lo,2*size),n) - (hi-lo)
+            if lo<offset and hi>offset+size:
+                lo = lo - extra/2
+                hi = hi + extra - extra/2
+            elif lo<offset:
+                lo = lo - extra
+            else:
+                hi = hi + extra
+            if lo<0:
+                hi = hi - lo
+                lo = 0
+            if hi>n:
+                lo = max(lo-(hi-n),0)
+                hi = n
+
+        cols = []
+        for eachColumn in (self.m_inOpen,self.m_inHigh,self.m_inLow,self.m_inClose,self.m_inVol):
+            data = numpy.empty(hi-lo,eachColumn.m_data.dtype)
+            data.fill(eachColumn.m_fill)
+            data[offset-lo:offset-lo+size] = eachColumn.m_data
+            cols.append(data)
+        self.setframe(lo,*cols)
+
+    def modified(self):
+        # stamp (gTradesCache clock) of the last change of the raw columns
+        return self.m_modified
+
+    def marketcalendar(self):
+        return gCal.marketcalendar(self.m_quote.market())
+
     def trades(self):
-        items = self.m_trades.values()
-        items.sort(key=Trade.date)
-        return items
-        #return self.m_trades
+        close = self.m_inClose.m_data
+        return [self._trade(self.m_offset+j) for j in numpy.flatnonzero(close>=0.0).tolist()]
+
+    def _trade(self,idx):
+        # Trade of the global index idx (None if no trade) : the raw columns
+        # hold the history, the Trade objects are only created on demand
+        d = gCal.date(idx)
+        if d==None:
+            return None
+        tr = self.m_trades.get(d)
+        if tr==None and self.has_trade(idx):
+            tr = Trade(self,d,self.m_inOpen[idx],self.m_inHigh[idx],self.m_inLow[idx],self.m_inClose[idx],self.m_inVol[idx],idx)
+            self.m_trades[d] = tr
+        return tr
+
+    def _rows(self,exclude=None):
+        # (ordinals,open,high,low,close,volume) of the trades sorted by date,
+        # without the day 'exclude'
+        j = numpy.flatnonzero(self.m_inClose.m_data>=0.0)
+        if exclude!=None:
+            j = j[j!=gCal.index(exclude)-self.m_offset]
+        ret = [gCal.ordinal_many(j+self.m_offset)]
+        for eachColumn in (self.m_inOpen,self.m_inHigh,self.m_inLow,self.m_inClose,self.m_inVol):
+            ret.append(eachColumn.m_data[j])
+        return ret
 
     def candles(self):
         return self.m_candles
 
     def reset(self,infile=None):
         self._init_()
+        self.m_modified = gTradesCache.tick()
         if not infile:
             idfile = os.path.join(itrade_config.dirCacheData,'%s.id' % self.m_quote.key())
             try:
                 os.remove(idfile)
             except OSError:
                 pass
-            infile = os.path.join(itrade_config.dirCacheData,'%s.txt' % self.m_quote.key())
+            try:
+                os.remove(self.cachefile())
+            except OSError:
+                pass
+            itrade_tradescache.removeJournal(self.journalfile())
+            try:
+                os.remove(self.gapsfile())
+            except OSError:
+                pass
+            infile = self.textfile()
         try:
             os.remove(infile)
         except OSError:
             pass
 
+    # ---[ cache files ] ---
+
+    def textfile(self):
+        return os.path.join(itrade_config.dirCacheData,'%s.txt' % self.m_quote.key())
+
+    def cachefile(self):
+        return os.path.join(itrade_config.dirCacheData,'%s.bin' % self.m_quote.key())
+
+    def journalfile(self):
+        return os.path.join(itrade_config.dirCacheData,'%s.jnl' % self.m_quote.key())
+
+    def gapsfile(self):
+        return os.path.join(itrade_config.dirCacheData,'%s.gap' % self.m_quote.key())
+
+    def loadCache(self):
+        # use the binary cache only if it is not older than the text file
+        fn = self.cachefile()
+        try:
+            mt = os.path.getmtime(fn)
+        except OSError:
+            return False
+        try:
+            if os.path.getmtime(self.textfile()) > mt:
+                return False
+        except OSError:
+            pass
+
+        cols = itrade_tradescache.read(fn)
+        if cols==None or cols.key()!=self.m_quote.key():
+            return False
+        # fill the frame of the (empty) history from the columns of the
+        # cache at once
+        idx = gCal.index_many(cols.m_dates)
+        ok = idx>=0
+        if not ok.all():
+            # __x need to save file
+            self.m_dirty = True
+        idx = idx[ok]
+        if len(idx):
+            self.reserve(int(idx.min()),int(idx.max()))
+            j = idx - self.m_offset
+            self.m_inOpen.m_data[j] = numpy.maximum(cols.m_open[ok],0.0)
+            self.m_inHigh.m_data[j] = numpy.maximum(cols.m_high[ok],0.0)
+            self.m_inLow.m_data[j] = numpy.maximum(cols.m_low[ok],0.0)
+            self.m_inClose.m_data[j] = numpy.maximum(cols.m_close[ok],0.0)
+            self.m_inVol.m_data[j] = numpy.maximum(cols.m_volume[ok],0)
+            self.m_firsttrade = self._trade(int(idx.min()))
+            self.m_lasttrade = self._trade(int(idx.max()))
+            self.m_lastimport = self.m_lasttrade
+
+        # replay the journal over the cache
+        for row in itrade_tradescache.readJournal(self.journalfile(),self.m_quote.key()):
+            self.addTrade(bImporting=True,*row)
+
+        self.m_changed = {}
+        self.m_cached = True
+        return True
+
+    def saveJournal(self,ajd):
+        # append the changed days (except today) to the journal ; compact the
+        # journal into the binary cache when it becomes too large
+        changed = [d for d in self.m_changed.keys() if d!=ajd and self.trade(d)]
+        if not changed:
+            return True
+        changed.sort()
+        rows = []
+        for d in changed:
+            tr = self.trade(d)
+            rows.append((d,tr.nv_open(),tr.nv_high(),tr.nv_low(),tr.nv_close(),tr.nv_volume()))
+        try:
+            n = itrade_tradescache.appendJournal(self.journalfile(),self.m_quote.key(),rows)
+        except (IOError,OSError,ValueError),e:
+            info('Trades::saveJournal %s : %s' % (self.m_quote.key(),e))
+            return False
+        for d in changed:
+            del self.m_changed[d]
+        if n>=itrade_config.tradesJournalMaxRecords:
+            if itrade_config.verbose:
+                info('Trades::saveJournal %s : compact %d records' % (self.m_quote.key(),n))
+            return self.saveCache(ajd)
+        return True
+
+    def saveCache(self,exclude=None):
+        # all the trades except the day 'exclude'
+        try:
+            itrade_tradescache.write(self.cachefile(),self.m_quote.key(),*self._rows(exclude))
+        except (IOError,OSError,ValueError),e:
+            info('Trades::saveCache %s : %s' % (self.m_quote.key(),e))
+            return False
+
+        # the cache is written (atomic rename) : the journal is now useless
+        itrade_tradescache.removeJournal(self.journalfile())
+        ajd = date.today()
+        for d in self.m_changed.keys():
+            if d!=ajd:
+                del self.m_changed[d]
+        self.m_cached = True
+        return True
+
+    # ---[ load / import / save ] ---
+
     def load(self,infile=None):
-        infile = itrade_csv.read(infile,os.path.join(itrade_config.dirCacheData,'%s.txt' % self.m_quote.key()))
+        if infile==None and itrade_config.useTradesCache:
+            if self.loadCache():
+                return
+            bConvert = True
+        else:
+            bConvert = False
+
+        infile = itrade_csv.read(infile,self.textfile())
         #print 'Trades:load::',infile
         if infile:
             # scan each line to read each trade
@@ -192,6 +529,10 @@ class Trades(object):
                         #print item
                         self.add(item,bImporting=True);
 
+            # text file found : build the binary cache for the next time
+            if bConvert:
+                self.saveCache()
+
     def imp(self,data,bLive):
         #debug('Trades::imp %s : %s : bLive=%s' % (self.m_quote.ticker(),data,bLive))
         #print data
@@ -206,45 +547,64 @@ class Trades(object):
 
     def save(self,outfile=None):
         #debug('Trades::save %s %s' % (self.m_quote.ticker(),self.m_quote.key()))
-        if self.m_trades.keys():
+        if self.m_lasttrade:
             # do not save today trade
             ajd = date.today()
-            if self.m_trades.has_key(ajd):
-                tr = self.m_trades[ajd]
-                del self.m_trades[ajd]
-                if itrade_config.verbose:
-                    info('Do not save ajd=%s:%s' % (ajd,tr))
-            else:
-                tr = None
+            tr = self.trade(ajd)
+            if tr and itrade_config.verbose:
+                info('Do not save ajd=%s:%s' % (ajd,tr))
 
             # save all trades (except today)
-            itrade_csv.write(outfile,os.path.join(itrade_config.dirCacheData,'%s.txt' % self.m_quote.key()),self.m_trades.values())
+            if outfile==None and itrade_config.useTradesCache:
+                if self.m_cached:
+                    # only new or changed days
+                    self.saveJournal(ajd)
+                else:
+                    self.saveCache(ajd)
+            else:
+                itrade_csv.write(outfile,self.textfile(),[tr for tr in self.trades() if tr.date()!=ajd])
             self.m_dirty = False
 
-            # restore today trade
-            if tr:
-                self.m_trades[ajd] = tr
-
     def add(self,item,bImporting):
         #debug('Trades::add() before: %s : bImporting=%s' % (item,bImporting));
 
-        idx = gCal.index(Datation(item[1]).date())
+        return self.addTrade(str2date(item[1]),item[2],item[3],item[4],item[5],item[6],bImporting)
+
+    def addTrade(self,d,open,high,low,close,volume,bImporting):
+        idx = gCal.index(d)
         if idx==-1:
-            #debug('invalid data: %s' % item)
+            #debug('invalid data: %s' % d)
             # __x need to save file
             self.m_dirty = True
             return False
 
-        tr = Trade(self,item[1],item[2],item[3],item[4],item[5],item[6],idx)
+        tr = Trade(self,d,open,high,low,close,volume,idx)
+
+        # only a change of the last bar can be applied to the indicators
+        bLast = self.m_lasttrade==None or idx>=self.m_lasttrade.index()
+
+        # keep track of the changes for the journal
+        if not self.m_changed.has_key(tr.date()):
+            if not self.has_trade(idx) or (self.m_inOpen[idx],self.m_inHigh[idx],self.m_inLow[idx],self.m_inClose[idx],self.m_inVol[idx])!=(tr.nv_open(),tr.nv_high(),tr.nv_low(),tr.nv_close(),tr.nv_volume()):
+                self.m_changed[tr.date()] = True
 
         # NB: replace existing date ('cause live update)
         self.m_trades[tr.date()] = tr
+        self.m_modified = gTradesCache.tick()
+        self.reserve(idx,idx)
         self.m_inOpen[idx] = tr.nv_open()
         self.m_inClose[idx] = tr.nv_close()
         self.m_inLow[idx] = tr.nv_low()
         self.m_inHigh[idx] = tr.nv_high()
         self.m_inVol[idx] = tr.nv_volume()
         #self.m_date[idx] = tr.date()
+        if self.m_computedto>=0 and bLast:
+            self.update(idx)
+        else:
+            self.m_computedto = -1
+        for eachEntry in self.m_indicators.values():
+            if eachEntry[1]>=idx-self.m_offset:
+                eachEntry[1] = idx-self.m_offset - 1
 
         #if not bImporting:
         #    print 'lasttrade: %s   new trade : %s' %(self.m_lasttrade.date(),tr.date())
@@ -278,31 +638,78 @@ class Trades(object):
         if d==None:
             tc = self.m_lasttrade
         else:
-            if self.m_trades.has_key(d):
-                tc = self.m_trades[d]
-            else:
-                return None
+            tc = self.trade(d)
         if tc:
-            idx = tc.index()
-            while idx > 0:
-                idx = idx - 1
-                if self.m_inClose[idx]>=0.0:
-                    return self.m_trades[gCal.date(idx)]
+            close = self.m_inClose.m_data
+            j = tc.index() - self.m_offset
+            while j > 0:
+                j = j - 1
+                if close[j]>=0.0:
+                    return self._trade(self.m_offset+j)
         return None
 
     def firsttrade(self):
         return self.m_firsttrade
 
     def trade(self,d):
-        if self.m_trades.has_key(d):
-            return self.m_trades[d]
-        else:
-            #info('trades:trade() not found: %s' % d)
-            return None
+        #if not found: info('trades:trade() not found: %s' % d)
+        return self._trade(gCal.index(d))
 
     def has_trade(self,idx):
         return self.m_inClose[idx] >= 0.0
 
+    def gaps(self,fromdate,todate,mingap=1):
+        # ranges (first date,last date) of the trading days of the market
+        # between fromdate and todate (included) without trade, except the
+        # known gaps. Holes of less than mingap trading days are ignored,
+        # except the one ending at todate
+        days = self.marketcalendar().globals()
+        ordinals = gCal.ordinal_many(days)
+        inside = (ordinals>=date2ordinal(fromdate)) & (ordinals<=date2ordinal(todate))
+        days = days[inside]
+        ordinals = ordinals[inside]
+        if len(days)==0:
+            return []
+
+        # runs of missing days : [start,end) in days
+        missing = numpy.zeros(len(days)+2,numpy.int8)
+        missing[1:-1] = self.m_inClose[days] < 0.0
+        for start,end in self.knowngaps():
+            missing[1:-1][(ordinals>=date2ordinal(start)) & (ordinals<=date2ordinal(end))] = 0
+        edges = numpy.diff(missing)
+        starts = numpy.flatnonzero(edges==1)
+        ends = numpy.flatnonzero(edges==-1)
+
+        ret = []
+        for start,end in zip(starts.tolist(),ends.tolist()):
+            if end-start >= mingap or end==len(days):
+                ret.append((gCal.date(days[start]),gCal.date(days[end-1])))
+        return ret
+
+    def knowngaps(self):
+        # ranges (first date,last date) of trading days the import connector
+        # has no trade for : not requested again by the imports of the holes
+        if self.m_knowngaps==None:
+            self.m_knowngaps = []
+            infile = itrade_csv.read(None,self.gapsfile())
+            if infile:
+                for eachLine in infile:
+                    item = itrade_csv.parse(eachLine,2)
+                    try:
+                        self.m_knowngaps.append((str2date(item[0]),str2date(item[1])))
+                    except (ValueError,IndexError):
+                        info('Trades::knowngaps %s : bad line %s' % (self.m_quote.key(),eachLine))
+        return self.m_knowngaps
+
+    def addKnownGaps(self,fromdate,todate):
+        # the import connector answered for fromdate..todate : the trading
+        # days still without trade are known gaps
+        ranges = self.gaps(fromdate,todate)
+        if ranges:
+            known = self.knowngaps()
+            known.extend(ranges)
+            itrade_csv.write(None,self.gapsfile(),['%s;%s' % (start,end) for start,end in known])
+
     def ma(self,period,idx):
         ''' temp '''
         if period==20:
@@ -314,41 +721,88 @@ class Trades(object):
         elif period==150:
             return self.ma150(idx)
         else:
-            return None
+            return self.indicatorAt('ma',(period,),idx)
 
     def vma(self,period,idx):
         ''' temp '''
         if period==15:
             return self.vma15(idx)
         else:
+            return self.indicatorAt('vma',(period,),idx)
+
+    def indicator(self,name,params=()):
+        # column(s) of the registered indicator 'name' (see itrade_indicators)
+        # computed on demand on the frame and memoized ; None if unknown
+        key = (name,tuple(params))
+        close = self.m_inClose.m_data
+        high = self.m_inHigh.m_data
+        low = self.m_inLow.m_data
+        volume = self.m_inVol.m_data
+        n = len(close)
+        entry = self.m_indicators.get(key)
+        if entry==None:
+            columns = itrade_indicators.compute(name,key[1],close,high,low,volume)
+            if columns is None:
+                return None
+            entry = [columns,n-1]
+            self.m_indicators[key] = entry
+        elif entry[1]<n-1:
+            # only the tail after the last changed bar
+            entry[0] = itrade_indicators.compute(name,key[1],close,high,low,volume,entry[1]+1,entry[0])
+            entry[1] = n-1
+        gIndicatorsCache.used(self,key)
+        if isinstance(entry[0],tuple):
+            return tuple([TradesColumn(eachCol,self.m_offset,-1.0,bEdge=True) for eachCol in entry[0]])
+        return TradesColumn(entry[0],self.m_offset,-1.0,bEdge=True)
+
+    def indicatorAt(self,name,params,idx):
+        if not isinstance(idx,int):
+            idx = gCal.index(idx)
+        columns = self.indicator(name,params)
+        if columns is None:
             return None
+        if isinstance(columns,tuple):
+            return tuple([eachCol[idx] for eachCol in columns])
+        return columns[idx]
+
+    def indicatorsize(self,key):
+        entry = self.m_indicators.get(key)
+        if entry==None:
+            return 0
+        if isinstance(entry[0],tuple):
+            return sum([eachCol.nbytes for eachCol in entry[0]])
+        return entry[0].nbytes
+
+    def forget(self,key):
+        if self.m_indicators.has_key(key):
+            del self.m_indicators[key]
 
     def ma20(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_ma20[idx]<0.0:
-            self.compute_ma20(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_ma20[idx]
 
     def ma50(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_ma50[idx]<0.0:
-            self.compute_ma50(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_ma50[idx]
 
     def ma100(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_ma100[idx]<0.0:
-            self.compute_ma100(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_ma100[idx]
 
     def ma150(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_ma150[idx]<0.0:
-            self.compute_ma150(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_ma150[idx]
 
     def rsi(self,period,idx):
@@ -356,41 +810,41 @@ class Trades(object):
         if period==14:
             return self.rsi14(idx)
         else:
-            return None
+            return self.indicatorAt('rsi',(period,),idx)
 
     def rsi14(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_rsi14[idx]<0.0:
-            self.compute_rsi14(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_rsi14[idx]
 
     def stoK(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_stoK[idx]<0.0:
-            self.compute_stoK(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_stoK[idx]
 
     def stoD(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_stoD[idx]<0.0:
-            self.compute_stoD(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_stoD[idx]
 
     def vma15(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_vma15[idx]<0.0:
-            self.compute_vma15(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_vma15[idx]
 
     def bollinger(self,idx,band=1):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        if self.m_bollM[idx]<0.0:
-            self.compute_bollinger(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         if band==0:
             return self.m_bollDn[idx]
         elif band==1:
@@ -401,17 +855,21 @@ class Trades(object):
     def ovb(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
+        if idx>self.m_computedto:
+            self.compute_all()
         return self.m_ovb[idx]
 
     def close(self,idx):
         if not isinstance(idx,int):
             idx = gCal.index(idx)
-        while idx>=0 and self.m_inClose[idx]<0.0:
+        close = self.m_inClose.m_data
+        j = min(idx - self.m_offset,len(close)-1)
+        while j>=0 and close[j]<0.0:
             # seek existing previous close !
-            idx = idx - 1
-        if idx < 0:
+            j = j - 1
+        if j < 0:
             return 0.0
-        return self.m_inClose[idx]
+        return close[j]
 
     def candle(self,d):
         if self.m_candles.has_key(d):
@@ -438,213 +896,295 @@ class Trades(object):
         ca = Candle(tr.nv_open(),tr.nv_high(),tr.nv_low(),tr.nv_close(),CANDLE_VOLUME_AVERAGE,CANDLE_VOLUME_TREND_NOTREND)
         self.m_candles[tr.date()] = ca
 
-        # get index given date
-        idx = tr.index()
+        # indicators are computed over the whole history at once
+        if self.m_computedto<tr.index():
+            self.compute_all()
 
-        # compute mm
-        self.compute_ma20(idx)
-        self.compute_ma50(idx)
-        self.compute_ma100(idx)
-        self.compute_ma150(idx)
-        self.compute_rsi14(idx)
+        return True
 
-        # compute stochastic (14 days)
-        self.compute_stoD(idx)
+    def compute_all(self):
+        #debug('%s: compute all indicators' % self.m_quote.ticker())
+        # the built-in indicators are computed again on first use
+        self.m_columns = {}
+        self.m_computedto = len(self.m_inClose) - 1
+        self.m_running = None
+
+    def update(self,idx):
+        # last bar changed : update the indicators of this slot (and of the
+        # days without trade before it) from the running state ; the slots
+        # of the frame are given to RunningIndicators
+        if not self.m_running:
+            self.m_running = itrade_indicators.RunningIndicators(self.m_inClose.m_data,self.m_inHigh.m_data,self.m_inLow.m_data,self.m_inVol.m_data)
+        rs = self.m_running
+        cols = {}
+        for eachName,eachColumn in self.m_columns.items():
+            cols[eachName] = eachColumn.m_data
+        for i in range(max(min(self.m_computedto+1,idx),self.m_offset),idx+1):
+            j = i - self.m_offset
+            rs.advance(j)
+            for period in (20,50,100,150):
+                if cols.has_key('m_ma%d' % period):
+                    cols['m_ma%d' % period][j] = rs.ma(j,period)
+            if cols.has_key('m_rsi14'):
+                cols['m_rsi14'][j] = rs.rsi(j)
+            if cols.has_key('m_stoK'):
+                cols['m_stoK'][j] = rs.stoK(j)
+                cols['m_stoD'][j] = rs.stoD(j,cols['m_stoK'])
+            if cols.has_key('m_bollM'):
+                cols['m_bollDn'][j],cols['m_bollM'][j],cols['m_bollUp'][j] = rs.bollinger(j,20)
+            if cols.has_key('m_vma15'):
+                cols['m_vma15'][j] = rs.vma(j,15)
+            if cols.has_key('m_ovb'):
+                cols['m_ovb'][j] = rs.ovb(j,cols['m_ovb'])
+
+        # the days after (without trade) up to the end of the frame : their
+        # windows include the changed slot
+        self._tail(idx+1-self.m_offset)
+        self.m_computedto = len(self.m_inClose) - 1
+
+    def _tail(self,start):
+        # recompute the built-in indicators columns from the frame slot start
+        close = self.m_inClose.m_data
+        if start>=len(close):
+            return
+        high = self.m_inHigh.m_data
+        low = self.m_inLow.m_data
+        volume = self.m_inVol.m_data
+        for names,func,specs in BUILTIN_INDICATORS:
+            if not self.m_columns.has_key(names[0]):
+                continue
+            i = 0
+            for name,params,count in specs:
+                columns = tuple([self.m_columns[eachName].m_data for eachName in names[i:i+count]])
+                if count==1:
+                    columns = columns[0]
+                ret = itrade_indicators.compute(name,params,close,high,low,volume,start,columns)
+                if ret is not columns:
+                    # no lookback : computed again over the whole frame
+                    if count==1:
+                        columns[start:] = ret[start:]
+                    else:
+                        for eachCol,eachRet in zip(columns,ret):
+                            eachCol[start:] = eachRet[start:]
+                i = i + count
 
-        # volumes indicators
-        self.compute_vma15(idx)
-        self.compute_ovb()
+# ============================================================================
+# TradesCache
+#
+# keep track of the histories loaded through LazyTrades and unload the least
+# recently used ones when the memory budget is exceeded
+# ============================================================================
 
-        return True
+# estimation of the memory used by one Trade object (object + date + values)
+TRADE_MEMSIZE = 400
 
-    def compute_ma150(self,i):
-        #debug('%s: compute MA150 [%d]' % (self.m_quote.ticker(),i))
-        s = 0.0
-        n = 0
-        j = i
-        while n<150 and j>=0:
-            if self.m_inClose[j]>=0.0:
-                s = s + self.m_inClose[j]
-                n = n + 1
-            j = j - 1
-        if n>0:
-            self.m_ma150[i] = s/float(n)
-        else:
-            self.m_ma150[i] = -1.0
+class TradesCache(object):
+    def __init__(self,budget=None):
+        self.m_loaded = {}
+        self.m_clock = 0
+        self.m_budget = budget
 
-    def compute_ma100(self,i):
-        #debug('%s: compute MA100 [%d]' % (self.m_quote.ticker(),i))
-        s = 0.0
-        n = 0
-        j = i
-        while n<100 and j>=0:
-            if self.m_inClose[j]>=0.0:
-                s = s + self.m_inClose[j]
-                n = n + 1
-            j = j - 1
-        if n>0:
-            self.m_ma100[i] = s/float(n)
-        else:
-            self.m_ma100[i] = -1.0
+    def budget(self):
+        # in bytes
+        if self.m_budget==None:
+            return itrade_config.tradesMemoryBudget * 1024 * 1024
+        return self.m_budget
 
-    def compute_ma50(self,i):
-        #debug('%s: compute MA50 [%d]' % (self.m_quote.ticker(),i))
-        s = 0.0
-        n = 0
-        j = i
-        while n<50 and j>=0:
-            if self.m_inClose[j]>=0.0:
-                s = s + self.m_inClose[j]
-                n = n + 1
-            j = j - 1
-        if n>0:
-            self.m_ma50[i] = s/float(n)
-        else:
-            self.m_ma50[i] = -1.0
+    def set_budget(self,budget):
+        self.m_budget = budget
+        self.evict()
 
-    def compute_ma20(self,i):
-        #debug('%s: compute MA20 [%d]' % (self.m_quote.ticker(),i))
-        s = 0.0
-        n = 0
-        j = i
-        while n<20 and j>=0:
-            if self.m_inClose[j]>=0.0:
-                s = s + self.m_inClose[j]
-                n = n + 1
-            j = j - 1
-        if n>0:
-            self.m_ma20[i] = s/float(n)
-        else:
-            self.m_ma20[i] = -1.0
-
-    def compute_rsi14(self,i):
-        #debug('%s: compute RSI14 [%d]' % (self.m_quote.ticker(),i))
-        h = 0.0
-        b = 0.0
-        n = 14*10
-        if i<n: n=i
-        while n>=0:
-            if self.m_inClose[i-n]>=0.0:
-                t = self.m_inClose[i-n] - self.close(i-n-1)
-                th = 0.0
-                tb = 0.0
-                if t>0:
-                    th = t
-                if t<0:
-                    tb = abs(t)
-
-                b = ((13.0*b) + tb) / 14.0
-                h = ((13.0*h) + th) / 14.0
-
-            n = n - 1
-        if b==0.0:
-            self.m_rsi14[i] = 100.0
-        else:
-            self.m_rsi14[i] = 100.0 - (100.0/(1.0+(h / b)))
+    def tick(self):
+        self.m_clock = self.m_clock + 1
+        return self.m_clock
 
-    def compute_minmax(self,i,period):
-        l = 9999999.0
-        h = 0.0
+    def memsize(self):
         n = 0
-        j = i
-        while n<period and j>=0:
-            if self.m_inHigh[j]>h:
-                h = self.m_inHigh[j]
+        for eachProxy in self.m_loaded.values():
+            n = n + eachProxy.memsize()
+        return n
+
+    def loaded(self,proxy):
+        self.m_loaded[proxy.key()] = proxy
+        self.evict(proxy)
+
+    def unloaded(self,proxy):
+        if self.m_loaded.has_key(proxy.key()):
+            del self.m_loaded[proxy.key()]
+
+    def evict(self,keep=None):
+        # unload LRU histories until the budget is respected ; never unload
+        # 'keep' nor histories with unsaved changes
+        size = self.memsize()
+        budget = self.budget()
+        if size<=budget:
+            return
+        lru = [(p.stamp(),p) for p in self.m_loaded.values() if p!=keep and not p.isChanged()]
+        lru.sort()
+        for stamp,eachProxy in lru:
+            if size<=budget:
+                break
+            size = size - eachProxy.memsize()
+            if itrade_config.verbose:
+                info('TradesCache::evict %s' % eachProxy.key())
+            eachProxy.unload()
+
+try:
+    ignore(gTradesCache)
+except NameError:
+    gTradesCache = TradesCache()
 
-            if self.m_inLow[j]<l:
-                l = self.m_inLow[j]
+# ============================================================================
+# IndicatorsCache
+#
+# keep track of the indicators memoized by Trades.indicator() and forget the
+# least recently used ones when the memory budget is exceeded
+# ============================================================================
 
-            n = n + 1
-            j = j - 1
-        return l,h
-
-    def compute_stoK(self,i):
-        #debug('%s: compute STO K [%d]' % (self.m_quote.ticker(),i))
-        mc = (self.close(i) + self.close(i-1) + self.close(i-2))/3
-        l1,h1 = self.compute_minmax(i,14)
-        l2,h2 = self.compute_minmax(i-1,14)
-        l3,h3 = self.compute_minmax(i-2,14)
-        ml = (l1 + l2 + l3) / 3
-        mh = (h1 + h2 + h3) / 3
-
-        t = ((mc - ml) / (mh - ml)) * 100.0
-        if t<0.0: t=0.0
-        if t>100.0: t=100.0
-        self.m_stoK[i] = t
-
-    def compute_stoD(self,i):
-        #debug('%s: compute STO D [%d]' % (self.m_quote.ticker(),i))
-        s = 0.0
-        n = 0
-        j = i
-        while n<5 and j>=0:
-            s = s + self.stoK(j)
-            n = n + 1
-            j = j - 1
-        if n>0:
-            self.m_stoD[i] = s/float(n)
-        else:
-            self.m_stoD[i] = -1
+class IndicatorsCache(object):
+    def __init__(self,budget=None):
+        self.m_used = {}
+        self.m_clock = 0
+        self.m_budget = budget
 
-    def compute_vma15(self,i):
-        #debug(<'%s: compute VMA15 [%d]' % (self.m_quote.ticker(),i))
-        s = long(0)
-        n = 0
-        j = i
-        while n<15 and j>=0:
-            if self.m_inClose[j]>=0.0:
-                s = s + self.m_inVol[j]
-                n = n + 1
-            j = j - 1
-        if n>0:
-            self.m_vma15[i] = float(s/n)
-        else:
-            self.m_vma15[i] = -1
-
-    def compute_ovb(self):
-        ovb = long(0)
-        for j in range(0,gCal.lastindex()+1):
-            if self.m_inClose[j]>=0.0:
-                pc = self.close(j-1)
-                if self.m_inClose[j]>=pc:
-                    ovb = ovb + long(self.m_inVol[j])
-                else:
-                    ovb = ovb - long(self.m_inVol[j])
+    def budget(self):
+        # in bytes
+        if self.m_budget==None:
+            return itrade_config.indicatorsMemoryBudget * 1024 * 1024
+        return self.m_budget
+
+    def set_budget(self,budget):
+        self.m_budget = budget
+        self.evict()
 
-            self.m_ovb[j] = ovb
+    def tick(self):
+        self.m_clock = self.m_clock + 1
+        return self.m_clock
 
-    def compute_bollinger(self,i):
-        #debug('%s: compute BOLLINGER n=20,d=2 [%d,%d]' % (self.m_quote.ticker(),i-20+1,i+1))
-        sm = 0.0
-        ecart = 0.0
+    def memsize(self):
         n = 0
-        j = i
-        while n<20 and j>=0:
-            if self.m_inClose[j]>=0.0:
-                sm = sm + self.m_inClose[j]
-                n = n + 1
-            j = j - 1
+        for stamp,trades,key in self.m_used.values():
+            n = n + trades.indicatorsize(key)
+        return n
+
+    def used(self,trades,key):
+        ukey = (id(trades),) + key
+        bNew = not self.m_used.has_key(ukey)
+        self.m_used[ukey] = (self.tick(),trades,key)
+        if bNew:
+            self.evict(ukey)
+
+    def forget(self,trades):
+        for eachKey in self.m_used.keys():
+            if self.m_used[eachKey][1] is trades:
+                del self.m_used[eachKey]
+
+    def evict(self,keep=None):
+        # forget LRU indicators until the budget is respected ; never 'keep'
+        size = self.memsize()
+        budget = self.budget()
+        if size<=budget:
+            return
+        lru = [(stamp,ukey) for ukey,(stamp,trades,key) in self.m_used.items() if ukey!=keep]
+        lru.sort()
+        for stamp,ukey in lru:
+            if size<=budget:
+                break
+            stamp,trades,key = self.m_used[ukey]
+            size = size - trades.indicatorsize(key)
+            trades.forget(key)
+            del self.m_used[ukey]
+
+try:
+    ignore(gIndicatorsCache)
+except NameError:
+    gIndicatorsCache = IndicatorsCache()
 
-        if n>0:
-            # calculate MA20(i)
-            self.m_bollM[i] = float(sm/n)
-
-            # calculate MA plus 2 standard deviations
-            n = 0
-            j = i
-            while n<20 and j>=0:
-                if self.m_inClose[j]>=0.0:
-                    ecart = ecart + pow(self.m_inClose[j] - self.m_bollM[i],2)
-                    n = n + 1
-                j = j - 1
+# ============================================================================
+# LazyTrades
+#
+# proxy on Trades : the history is read from the disk only when it is used
+# for the first time, and can be unloaded by gTradesCache
+# ============================================================================
 
-            ecart = 2*sqrt(float(ecart)/n)
-            self.m_bollUp[i] = self.m_bollM[i] + ecart
-            self.m_bollDn[i] = self.m_bollM[i] - ecart
-        else:
-            self.m_bollM[i] = -1.0
-            self.m_bollUp[i] = -1.0
-            self.m_bollDn[i] = -1.0
+class LazyTrades(object):
+    def __init__(self,quote):
+        self.m_quote = quote
+        self.m_daytrades = None
+        self.m_stamp = 0
+        # last change of the unloaded histories
+        self.m_modified = 0
+
+    def key(self):
+        return self.m_quote.key()
+
+    def stamp(self):
+        return self.m_stamp
+
+    def isLoaded(self):
+        return self.m_daytrades!=None
+
+    def isChanged(self):
+        return self.m_daytrades!=None and len(self.m_daytrades.m_changed)>0
+
+    def modified(self):
+        if self.m_daytrades!=None:
+            return max(self.m_modified,self.m_daytrades.modified())
+        return self.m_modified
+
+    def memsize(self):
+        if self.m_daytrades==None:
+            return 0
+        return self.m_daytrades.memsize()
+
+    def daytrades(self):
+        self.m_stamp = gTradesCache.tick()
+        if self.m_daytrades==None:
+            self.m_daytrades = Trades(self.m_quote)
+            self.m_daytrades.load()
+            gTradesCache.loaded(self)
+        return self.m_daytrades
+
+    def unload(self):
+        if self.m_daytrades!=None:
+            gIndicatorsCache.forget(self.m_daytrades)
+            self.m_modified = self.modified()
+            self.m_daytrades = None
+            gTradesCache.unloaded(self)
+
+    # --- [ no need to load the history for these ] ---
+
+    def save(self,outfile=None):
+        if self.m_daytrades!=None:
+            self.m_daytrades.save(outfile)
+
+    def reset(self,infile=None):
+        self.daytrades().reset(infile)
+        self.unload()
+
+    # --- [ everything else is delegated to the history ] ---
+
+    def __getattr__(self,name):
+        return getattr(self.daytrades(),name)
+
+# ============================================================================
+# historyKeys
+#
+#   keys of the quotes having a history in the cache (text file or binary
+#   cache, see Trades.textfile and Trades.cachefile) without creating them
+# ============================================================================
+
+def historyKeys():
+    keys = {}
+    try:
+        files = os.listdir(itrade_config.dirCacheData)
+    except OSError:
+        return keys
+    for eachFile in files:
+        key,ext = os.path.splitext(eachFile)
+        if ext in ('.txt','.bin'):
+            keys[key] = True
+    return keys
 
 # ============================================================================
 # Test
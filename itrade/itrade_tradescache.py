@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+# ============================================================================
+# Project Name : iTrade
+# Module Name  : itrade_tradescache.py
+#
+# Description: Binary columnar cache of daily trades
+#
+# The Original Code is iTrade code (http://itrade.sourceforge.net).
+#
+# The Initial Developer of the Original Code is	Gilles Dumortier.
+#
+# Portions created by the Initial Developer are Copyright (C) 2004-2008 the
+# Initial Developer. All Rights Reserved.
+#
+# Contributor(s):
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see http://www.gnu.org/licenses/gpl.html
+#
+# History       Rev   Description
+# 2026-10-18          Wrote it from scratch
+# ============================================================================
+
+# ============================================================================
+# Imports
+# ============================================================================
+
+# python system
+import os
+import struct
+import logging
+from datetime import date
+
+# numpy
+import numpy
+
+# iTrade system
+from itrade_logging import *
+import itrade_config
+import itrade_csv
+from itrade_datation import str2date,date2ordinal
+
+# ============================================================================
+# Binary file format (little endian, version 1)
+#
+#   header (HEADER_SIZE bytes) :
+#     MAGIC;VERSION;FLAGS;COUNT;FIRST;LAST;KEYLEN;KEY (padded with \0)
+#
+#   followed by COUNT rows stored column by column :
+#     DATE   int32   proleptic ordinal (date.toordinal()), sorted
+#     (padding to the next 8 bytes boundary)
+#     OPEN   float64
+#     HIGH   float64
+#     LOW    float64
+#     CLOSE  float64
+#     VOLUME int64
+#
+#   FIRST and LAST are the ordinals of the first and last rows. Ordinals are
+#   used rather than gCal indexes because the calendar index is rebuilt from
+#   the current year at each start and would shift every new year.
+# ============================================================================
+
+MAGIC = 'ITRD'
+VERSION = 1
+
+HEADER_FMT = '<4sHHIiiH'
+HEADER_SIZE = 128
+KEY_MAXLEN = HEADER_SIZE - struct.calcsize(HEADER_FMT)
+
+DATE_DTYPE = numpy.dtype('<i4')
+PRICE_DTYPE = numpy.dtype('<f8')
+VOLUME_DTYPE = numpy.dtype('<i8')
+
+def _align8(n):
+    return (n + 7) & ~7
+
+def _offsets(count):
+    # offsets of the columns : date,open,high,low,close,volume
+    offdate = HEADER_SIZE
+    offopen = offdate + _align8(count * DATE_DTYPE.itemsize)
+    psize = count * PRICE_DTYPE.itemsize
+    return (offdate,offopen,offopen+psize,offopen+2*psize,offopen+3*psize,offopen+4*psize)
+
+# ============================================================================
+# TradesColumns
+#
+# result of a read : key + the six columns (numpy arrays or memmaps)
+# ============================================================================
+
+class TradesColumns(object):
+    def __init__(self,key,dates,open,high,low,close,volume):
+        self.m_key = key
+        self.m_dates = dates
+        self.m_open = open
+        self.m_high = high
+        self.m_low = low
+        self.m_close = close
+        self.m_volume = volume
+
+    def key(self):
+        return self.m_key
+
+    def __len__(self):
+        return len(self.m_dates)
+
+    def first(self):
+        if len(self.m_dates):
+            return date.fromordinal(int(self.m_dates[0]))
+        return None
+
+    def last(self):
+        if len(self.m_dates):
+            return date.fromordinal(int(self.m_dates[-1]))
+        return None
+
+    def rows(self):
+        # generate (date,open,high,low,close,volume) python tuples
+        for i in xrange(len(self.m_dates)):
+            yield (date.fromordinal(int(self.m_dates[i])),
+                   float(self.m_open[i]),float(self.m_high[i]),float(self.m_low[i]),float(self.m_close[i]),
+                   long(self.m_volume[i]))
+
+# ============================================================================
+# read / write
+# ============================================================================
+
+def readHeader(fn):
+    # return (key,count,first,last) or None if the file is not a valid cache
+    try:
+        f = open(fn,'rb')
+    except IOError:
+        return None
+    try:
+        buf = f.read(HEADER_SIZE)
+    finally:
+        f.close()
+    if len(buf)<HEADER_SIZE:
+        return None
+    magic,version,flags,count,first,last,keylen = struct.unpack_from(HEADER_FMT,buf)
+    if magic!=MAGIC or version!=VERSION or keylen>KEY_MAXLEN:
+        info('readHeader(%s): not a trades cache file (magic=%r version=%d)' % (fn,magic,version))
+        return None
+    key = buf[struct.calcsize(HEADER_FMT):struct.calcsize(HEADER_FMT)+keylen]
+    return key,count,first,last
+
+def read(fn,mmap=True):
+    # return a TradesColumns or None
+    header = readHeader(fn)
+    if header==None:
+        return None
+    key,count,first,last = header
+
+    if count==0:
+        e = numpy.zeros(0,PRICE_DTYPE)
+        return TradesColumns(key,numpy.zeros(0,DATE_DTYPE),e,e,e,e,numpy.zeros(0,VOLUME_DTYPE))
+
+    offsets = _offsets(count)
+    if os.path.getsize(fn) < offsets[5] + count*VOLUME_DTYPE.itemsize:
+        info('read(%s): truncated trades cache file' % fn)
+        return None
+
+    dtypes = (DATE_DTYPE,PRICE_DTYPE,PRICE_DTYPE,PRICE_DTYPE,PRICE_DTYPE,VOLUME_DTYPE)
+    cols = []
+    if mmap:
+        for offset,dtype in zip(offsets,dtypes):
+            cols.append(numpy.memmap(fn,dtype=dtype,mode='r',offset=offset,shape=(count,)))
+    else:
+        f = open(fn,'rb')
+        try:
+            for offset,dtype in zip(offsets,dtypes):
+                f.seek(offset)
+                cols.append(numpy.fromfile(f,dtype=dtype,count=count))
+        finally:
+            f.close()
+
+    return TradesColumns(key,*cols)
+
+def write(fn,key,dates,opens,highs,lows,closes,volumes):
+    # dates are date objects or ordinals, sorted ascending
+    if len(key)>KEY_MAXLEN:
+        raise ValueError('key too long for trades cache : %s' % key)
+
+    count = len(dates)
+    if isinstance(dates,numpy.ndarray) and dates.dtype.kind in 'iu':
+        odates = dates.astype(DATE_DTYPE)
+    else:
+        odates = numpy.array([date2ordinal(d) for d in dates],DATE_DTYPE)
+    if count:
+        first = int(odates[0])
+        last = int(odates[-1])
+    else:
+        first = last = 0
+
+    header = struct.pack(HEADER_FMT,MAGIC,VERSION,0,count,first,last,len(key)) + key
+    header = header + '\0' * (HEADER_SIZE-len(header))
+
+    # write a temporary file then rename it : a crash never leaves a
+    # truncated cache behind
+    tmp = fn + '.tmp'
+    f = open(tmp,'wb')
+    try:
+        f.write(header)
+        odates.tofile(f)
+        f.write('\0' * (_align8(count*DATE_DTYPE.itemsize) - count*DATE_DTYPE.itemsize))
+        for col in (opens,highs,lows,closes):
+            numpy.asarray(col,PRICE_DTYPE).tofile(f)
+        numpy.asarray(volumes,VOLUME_DTYPE).tofile(f)
+    finally:
+        f.close()
+    _rename(tmp,fn)
+    return True
+
+def _rename(src,dst):
+    # os.rename() does not replace an existing file on Windows
+    try:
+        os.rename(src,dst)
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        os.rename(src,dst)
+
+# ============================================================================
+# Journal file format (little endian, version 1)
+#
+#   header (HEADER_SIZE bytes) :
+#     MAGIC;VERSION;FLAGS;KEYLEN;KEY (padded with \0)
+#
+#   followed by fixed size records appended at the end of the file :
+#     DATE;OPEN;HIGH;LOW;CLOSE;VOLUME
+#
+#   Records are replayed in order over the binary cache, the last record of a
+#   given date wins. A record partially written (crash during an append) is
+#   ignored on read.
+# ============================================================================
+
+JOURNAL_MAGIC = 'ITRJ'
+
+JOURNAL_HEADER_FMT = '<4sHHH'
+JOURNAL_RECORD_FMT = '<iddddq'
+JOURNAL_RECORD_SIZE = struct.calcsize(JOURNAL_RECORD_FMT)
+
+def _journalHeader(key):
+    if len(key)>HEADER_SIZE-struct.calcsize(JOURNAL_HEADER_FMT):
+        raise ValueError('key too long for trades journal : %s' % key)
+    header = struct.pack(JOURNAL_HEADER_FMT,JOURNAL_MAGIC,VERSION,0,len(key)) + key
+    return header + '\0' * (HEADER_SIZE-len(header))
+
+def journalCount(fn):
+    # number of complete records in the journal (0 if no journal)
+    try:
+        size = os.path.getsize(fn)
+    except OSError:
+        return 0
+    if size<HEADER_SIZE:
+        return 0
+    return (size-HEADER_SIZE) / JOURNAL_RECORD_SIZE
+
+def appendJournal(fn,key,rows):
+    # rows are (date,open,high,low,close,volume) ; return the number of
+    # records now in the journal
+    header = _journalHeader(key)
+    count = journalCount(fn)
+    if count==0:
+        # new (or damaged) journal
+        f = open(fn,'wb')
+        f.write(header)
+    else:
+        f = open(fn,'r+b')
+        # drop a record partially written by a previous crash
+        f.seek(HEADER_SIZE + count*JOURNAL_RECORD_SIZE)
+        f.truncate()
+    try:
+        for d,o,h,l,c,v in rows:
+            f.write(struct.pack(JOURNAL_RECORD_FMT,date2ordinal(d),o,h,l,c,v))
+            count = count + 1
+        f.flush()
+        os.fsync(f.fileno())
+    finally:
+        f.close()
+    return count
+
+def readJournal(fn,key):
+    # return the list of (date,open,high,low,close,volume) records
+    try:
+        f = open(fn,'rb')
+    except IOError:
+        return []
+    try:
+        buf = f.read()
+    finally:
+        f.close()
+    if len(buf)<HEADER_SIZE:
+        return []
+    magic,version,flags,keylen = struct.unpack_from(JOURNAL_HEADER_FMT,buf)
+    hsize = struct.calcsize(JOURNAL_HEADER_FMT)
+    if magic!=JOURNAL_MAGIC or version!=VERSION or buf[hsize:hsize+keylen]!=key:
+        info('readJournal(%s): not a trades journal of %s' % (fn,key))
+        return []
+    rows = []
+    n = (len(buf)-HEADER_SIZE) / JOURNAL_RECORD_SIZE
+    for i in xrange(n):
+        d,o,h,l,c,v = struct.unpack_from(JOURNAL_RECORD_FMT,buf,HEADER_SIZE + i*JOURNAL_RECORD_SIZE)
+        rows.append((date.fromordinal(d),o,h,l,c,v))
+    return rows
+
+def removeJournal(fn):
+    try:
+        os.remove(fn)
+    except OSError:
+        pass
+
+# ============================================================================
+# conversion from/to EBP text files
+#
+#   ISIN;DATE;OPEN;HIGH;LOW;CLOSE;VOLUME
+# ============================================================================
+
+def txt2bin(txtfile,binfile,key):
+    # convert an EBP text file to a binary cache file ; only lines of 'key'
+    # are converted and the last line of a given date wins
+    infile = itrade_csv.read(txtfile,None)
+    if infile==None:
+        return False
+    rows = {}
+    for eachLine in infile:
+        item = itrade_csv.parse(eachLine,7)
+        if item and len(item)>=7 and item[0]==key:
+            try:
+                rows[str2date(item[1])] = (max(float(item[2]),0.0),max(float(item[3]),0.0),max(float(item[4]),0.0),max(float(item[5]),0.0),max(long(item[6]),0))
+            except ValueError:
+                info('txt2bin(%s): invalid line %s' % (txtfile,eachLine.strip()))
+    dates = rows.keys()
+    dates.sort()
+    cols = zip(*[rows[d] for d in dates]) or ((),(),(),(),())
+    return write(binfile,key,dates,*cols)
+
+def bin2txt(binfile,txtfile):
+    # convert a binary cache file to an EBP text file
+    cols = read(binfile,mmap=False)
+    if cols==None:
+        return False
+    lines = []
+    for row in cols.rows():
+        lines.append('%s;%s;%f;%f;%f;%f;%d' % ((cols.key(),)+row))
+    itrade_csv.write(txtfile,None,lines)
+    return True
+
+# ============================================================================
+# Test
+# ============================================================================
+
+if __name__=='__main__':
+    setLevel(logging.INFO)
+
+    fn = os.path.join(itrade_config.dirCacheData,'test.bin')
+    write(fn,'TEST.EURONEXT.PAR',[date(2005,1,3),date(2005,1,4)],[1.0,2.0],[1.5,2.5],[0.5,1.5],[1.2,2.2],[100,200])
+    cols = read(fn)
+    info('test1 %s %d %s %s' % (cols.key(),len(cols),cols.first(),cols.last()))
+    for row in cols.rows():
+        info('test2 %s' % (row,))
+    del cols
+    os.remove(fn)
+
+# ============================================================================
+# That's all folks !
+# ============================================================================
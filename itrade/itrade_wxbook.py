@@ -71,7 +71,7 @@ from itrade_wxconnection import connection_UI
 from itrade_wxstops import addOrEditStops_iTradeQuote,removeStops_iTradeQuote
 from itrade_wxmixin import iTrade_wxFrame
 
-from itrade_wxpanes import iTrade_MatrixPortfolioPanel,iTrade_MatrixQuotesPanel,iTrade_MatrixStopsPanel,iTrade_MatrixIndicatorsPanel,iTrade_TradingPanel
+from itrade_wxpanes import iTrade_MatrixPortfolioPanel,iTrade_MatrixQuotesPanel,iTrade_MatrixStopsPanel,iTrade_MatrixIndicatorsPanel,iTrade_TradingPanel,iTrade_ScreenerPanel
 from itrade_wxmoney import iTradeEvaluationPanel
 from itrade_wxutil import iTradeYesNo,iTradeInformation,iTradeError,FontFromSize
 
@@ -93,6 +93,7 @@ ID_QUOTES = 200
 ID_PORTFOLIO = 201
 ID_STOPS = 202
 ID_INDICATORS = 203
+ID_SCREENER = 204
 
 ID_OPERATIONS = 210
 ID_TRADING = 211
@@ -158,6 +159,7 @@ ID_PAGE_STOPS = 2
 ID_PAGE_INDICATORS = 3
 ID_PAGE_TRADING = 4
 ID_PAGE_EVALUATION = 5
+ID_PAGE_SCREENER = 6
 
 # ============================================================================
 # iTradeMainToolbar
@@ -352,6 +354,9 @@ class iTradeMainNotebookWindow(wx.Notebook):
 
         self.win[ID_PAGE_EVALUATION] = iTradeEvaluationPanel(self,wx.NewId(),self.m_portfolio)
         self.AddPage(self.win[ID_PAGE_EVALUATION], message('page_evaluation'))
+
+        self.win[ID_PAGE_SCREENER] = iTrade_ScreenerPanel(self,parent,wx.NewId(),self.m_portfolio,self.m_matrix)
+        self.AddPage(self.win[ID_PAGE_SCREENER], message('page_screener'))
         #print ']-- book init'
 
     def OnPageChanged(self, event):
@@ -387,6 +392,7 @@ class iTradeMainNotebookWindow(wx.Notebook):
         self.win[ID_PAGE_INDICATORS].m_mustInit = True
         self.win[ID_PAGE_TRADING].m_mustInit = True
         self.win[ID_PAGE_EVALUATION].m_mustInit = True
+        self.win[ID_PAGE_SCREENER].m_mustInit = True
 
     def InitCurrentPage(self,bReset,bInit):
         if bInit:
@@ -479,6 +485,7 @@ class iTradeMainWindow(wx.Frame,iTrade_wxFrame):
         self.matrixmenu.Append(ID_PORTFOLIO, message('main_view_portfolio'),message('main_view_desc_portfolio'))
         self.matrixmenu.Append(ID_STOPS, message('main_view_stops'),message('main_view_desc_stops'))
         self.matrixmenu.Append(ID_INDICATORS, message('main_view_indicators'),message('main_view_desc_indicators'))
+        self.matrixmenu.Append(ID_SCREENER, message('main_view_screener'),message('main_view_desc_screener'))
         self.matrixmenu.AppendSeparator()
         self.matrixmenu.AppendRadioItem(ID_SMALL_VIEW, message('main_view_small'),message('main_view_desc_small'))
         self.matrixmenu.AppendRadioItem(ID_NORMAL_VIEW, message('main_view_normal'),message('main_view_desc_normal'))
@@ -587,6 +594,7 @@ class iTradeMainWindow(wx.Frame,iTrade_wxFrame):
         wx.EVT_MENU(self, ID_QUOTES, self.OnQuotes)
         wx.EVT_MENU(self, ID_STOPS, self.OnStops)
         wx.EVT_MENU(self, ID_INDICATORS, self.OnIndicators)
+        wx.EVT_MENU(self, ID_SCREENER, self.OnScreener)
         wx.EVT_MENU(self, ID_TRADING, self.OnTrading)
         wx.EVT_MENU(self, ID_OPERATIONS, self.OnOperations)
         wx.EVT_MENU(self, ID_EVALUATION, self.OnEvaluation)
@@ -848,6 +856,8 @@ class iTradeMainWindow(wx.Frame,iTrade_wxFrame):
             title = message('main_title_trading')
         elif page == ID_PAGE_EVALUATION:
             title = message('main_title_evaluation')
+        elif page == ID_PAGE_SCREENER:
+            title = message('main_title_screener')
         else:
             title = '??? %s:%s'
         self.SetTitle(title % (self.m_portfolio.name(),self.m_portfolio.accountref()))
@@ -882,6 +892,12 @@ class iTradeMainWindow(wx.Frame,iTrade_wxFrame):
             self.m_book.SetSelection(ID_PAGE_INDICATORS)
         self.updateTitle()
 
+    def OnScreener(self,e):
+        # check current page
+        if self.m_book.GetSelection() != ID_PAGE_SCREENER:
+            self.m_book.SetSelection(ID_PAGE_SCREENER)
+        self.updateTitle()
+
     def OnTrading(self,e):
         # check current page
         if self.m_book.GetSelection() != ID_PAGE_TRADING:
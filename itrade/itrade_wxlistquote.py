@@ -608,13 +608,15 @@ class iTradeQuoteListCtrlDialog(wx.Dialog, wxl.ColumnSorterMixin):
         self.currentItem = -1
 
         self.itemDataMap = {}
-        self.itemQuoteMap = {}
+        self.itemKeyMap = {}
         self.itemLineMap = {}
 
-        for eachQuote in quotes.list():
-            if  self.m_qlist==QLIST_ALL or self.m_qlist==eachQuote.list():
-                self.itemDataMap[count] = (eachQuote.isin(),eachQuote.ticker(),eachQuote.name(),eachQuote.place(),eachQuote.market(),eachQuote.liveconnector().name(),eachQuote.importconnector().name())
-                self.itemQuoteMap[count] = eachQuote
+        # records of the quotes : the quotes are created only when selected
+        for key,isin,name,ticker,market,place,qlist in quotes.records():
+            if  self.m_qlist==QLIST_ALL or self.m_qlist==qlist:
+                live,imp = quotes.connectors(key)
+                self.itemDataMap[count] = (isin,ticker,name,place,market,live.name(),imp.name())
+                self.itemKeyMap[count] = key
                 count = count + 1
 
         items = self.itemDataMap.items()
@@ -635,7 +637,7 @@ class iTradeQuoteListCtrlDialog(wx.Dialog, wxl.ColumnSorterMixin):
                 self.m_list.SetStringItem(line, IDC_IMPORT, data[6])
                 self.m_list.SetItemData(line, key)
                 self.itemLineMap[data[1]] = line
-                if self.itemQuoteMap[key]==curquote:
+                if curquote and self.itemKeyMap[key]==curquote.key():
                     curline = line
                 line += 1
 
@@ -685,7 +687,7 @@ class iTradeQuoteListCtrlDialog(wx.Dialog, wxl.ColumnSorterMixin):
     def getQuoteOnTheLine(self,x):
         if x>=0:
             key = self.m_list.GetItemData(x)
-            quote = self.itemQuoteMap[key]
+            quote = quotes.lookupKey(self.itemKeyMap[key])
             return quote
         else:
             return None
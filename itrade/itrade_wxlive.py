@@ -53,6 +53,7 @@ from itrade_local import message
 import itrade_quotes
 import itrade_import
 import itrade_currency
+from itrade_scheduler import LiveJob
 
 # ============================================================================
 # Creates a new Event class and a EVT binder function
@@ -61,50 +62,9 @@ import itrade_currency
 (UpdateLiveEvent,EVT_UPDATE_LIVE) = wx.lib.newevent.NewEvent()
 (UpdateLiveCurrencyEvent,EVT_UPDATE_LIVECURRENCY) = wx.lib.newevent.NewEvent()
 
-# ============================================================================
-# UpdateLiveThread
-# ============================================================================
-
-class UpdateLiveThread:
-
-    def __init__(self,win,quote,sleeptime,param=None):
-        self.m_win = win
-        self.m_quote = quote
-        self.m_keepGoing = False
-        self.m_running = False
-        self.m_sleeptime = sleeptime
-        self.m_param = param
-        #if itrade_config.verbose:
-        #    print 'UpdateLiveThread::__init__(): %s %f %s' % (quote,sleeptime,param)
-
-    def Start(self):
-        self.m_keepGoing = True
-        self.m_running = True
-        thread.start_new_thread(self.Run,(self.m_param,))
-        #if itrade_config.verbose:
-        #    print 'UpdateLiveThread::Start(): %s %f %s' % (self.m_quote,self.m_sleeptime,self.m_param)
-
-    def Stop(self):
-        self.m_keepGoing = False
-        #if itrade_config.verbose:
-        #    print 'UpdateLiveThread::Stop(): %s %f %s' % (self.m_quote,self.m_sleeptime,self.m_param)
-
-    def IsRunning(self):
-        return self.m_running
-
-    def Run(self,p):
-        while (self.m_keepGoing):
-            #if itrade_config.verbose:
-            #    print 'UpdateLiveThread::Run(): %s %f %s' % (self.m_quote,self.m_sleeptime,self.m_param)
-
-            # update live information
-            itrade_import.liveupdate_from_internet(self.m_quote)
-            evt = UpdateLiveEvent(quote=self.m_quote,param=p)
-            if self.m_win: wx.PostEvent(self.m_win,evt)
-
-            if self.m_keepGoing: time.sleep(self.m_sleeptime)
-
-        self.m_running = False
+# coalesced updates (see iTrade_wxLiveMixin.notifyLive)
+(UpdateLiveBatchEvent,EVT_UPDATE_LIVEBATCH) = wx.lib.newevent.NewEvent()
+(UpdateLiveCurrencyBatchEvent,EVT_UPDATE_LIVECURRENCYBATCH) = wx.lib.newevent.NewEvent()
 
 # ============================================================================
 # iTrade_wxLiveMixin
@@ -113,9 +73,42 @@ class UpdateLiveThread:
 class iTrade_wxLiveMixin:
         def __init__(self):
             self.m_threads = {}
+            self.m_livelock = thread.allocate_lock()
+            self.m_liveupdates = {}
+            self.m_liveposted = False
+            self.m_livebound = False
 
         def registerLive(self,quote,sleeptime,param=None):
-            self.m_threads[quote.key()] = UpdateLiveThread(self,quote,sleeptime,param)
+            # the live updates are done by the scheduler (see itrade_scheduler)
+            if not self.m_livebound:
+                EVT_UPDATE_LIVEBATCH(self,self.OnLiveBatch)
+                self.m_livebound = True
+            self.m_threads[quote.key()] = LiveJob(sleeptime,self.notifyLive,quote=quote,param=param)
+
+        def notifyLive(self,job):
+            # called by the scheduler after each update : only one event is
+            # posted until the window handles it, with all the quotes updated
+            # meanwhile (once each)
+            self.m_livelock.acquire()
+            try:
+                self.m_liveupdates[job.m_quote.key()] = (job.m_quote,job.m_param)
+                if self.m_liveposted:
+                    return
+                self.m_liveposted = True
+            finally:
+                self.m_livelock.release()
+            wx.PostEvent(self,UpdateLiveBatchEvent())
+
+        def OnLiveBatch(self,evt):
+            self.m_livelock.acquire()
+            try:
+                updates = self.m_liveupdates.values()
+                self.m_liveupdates = {}
+                self.m_liveposted = False
+            finally:
+                self.m_livelock.release()
+            for quote,param in updates:
+                self.OnLive(UpdateLiveEvent(quote=quote,param=param))
 
         def unregisterLive(self,quote=None):
             if quote:
@@ -191,53 +184,6 @@ class iTrade_wxLiveMixin:
                 #if itrade_config.verbose:
                 #    print '] --- stopLive'
 
-# ============================================================================
-# UpdateLiveCurrencyThread
-# ============================================================================
-
-class UpdateLiveCurrencyThread:
-
-    def __init__(self,win,key,sleeptime,param=None):
-        self.m_win = win
-        self.m_key = key
-        self.m_curTo = key[:3]
-        self.m_curFrom = key[3:]
-        self.m_keepGoing = False
-        self.m_running = False
-        self.m_sleeptime = sleeptime
-        self.m_param = param
-        #if itrade_config.verbose:
-            #print 'UpdateLiveCurrencyThread::__init__(): %s %f %s' % (key,sleeptime,param)
-
-    def Start(self):
-        self.m_keepGoing = True
-        self.m_running = True
-        thread.start_new_thread(self.Run,(self.m_param,))
-        #if itrade_config.verbose:
-            #print 'UpdateLiveCurrencyThread::Start(): %s %f %s' % (self.m_key,self.m_sleeptime,self.m_param)
-
-    def Stop(self):
-        self.m_keepGoing = False
-        #if itrade_config.verbose:
-            #print 'UpdateLiveCurrencyThread::Stop(): %s %f %s' % (self.m_key,self.m_sleeptime,self.m_param)
-
-    def IsRunning(self):
-        return self.m_running
-
-    def Run(self,p):
-        while (self.m_keepGoing):
-            if itrade_config.verbose:
-                print 'UpdateLiveCurrencyThread::Run(): %s %f %s' % (self.m_key,self.m_sleeptime,self.m_param)
-
-            # update live information
-            itrade_currency.currencies.get(self.m_curTo,self.m_curFrom)
-            evt = UpdateLiveCurrencyEvent(key=self.m_key,param=p)
-            wx.PostEvent(self.m_win,evt)
-
-            time.sleep(self.m_sleeptime)
-
-        self.m_running = False
-
 # ============================================================================
 # iTrade_wxLiveCurrencyMixin
 # ============================================================================
@@ -245,9 +191,46 @@ class UpdateLiveCurrencyThread:
 class iTrade_wxLiveCurrencyMixin:
         def __init__(self):
             self.m_threads = {}
+            self.m_currencylock = thread.allocate_lock()
+            self.m_currencyupdates = {}
+            self.m_currencyposted = False
+            self.m_currencybound = False
 
         def registerLiveCurrency(self,key,sleeptime,param=None):
-            self.m_threads[key] = UpdateLiveCurrencyThread(self,key,sleeptime,param)
+            # the live updates are done by the scheduler (see itrade_scheduler)
+            if not self.m_currencybound:
+                EVT_UPDATE_LIVECURRENCYBATCH(self,self.OnLiveCurrencyBatch)
+                self.m_currencybound = True
+            curTo = key[:3]
+            curFrom = key[3:]
+            def update():
+                itrade_currency.currencies.get(curTo,curFrom)
+            job = LiveJob(sleeptime,self.notifyLiveCurrency,action=update,group='currency',param=param)
+            job.m_key = key
+            self.m_threads[key] = job
+
+        def notifyLiveCurrency(self,job):
+            # see iTrade_wxLiveMixin.notifyLive
+            self.m_currencylock.acquire()
+            try:
+                self.m_currencyupdates[job.m_key] = job.m_param
+                if self.m_currencyposted:
+                    return
+                self.m_currencyposted = True
+            finally:
+                self.m_currencylock.release()
+            wx.PostEvent(self,UpdateLiveCurrencyBatchEvent())
+
+        def OnLiveCurrencyBatch(self,evt):
+            self.m_currencylock.acquire()
+            try:
+                updates = self.m_currencyupdates.items()
+                self.m_currencyupdates = {}
+                self.m_currencyposted = False
+            finally:
+                self.m_currencylock.release()
+            for key,param in updates:
+                self.OnLiveCurrency(UpdateLiveCurrencyEvent(key=key,param=param))
 
         def unregisterLiveCurrency(self,key=None):
             if key:
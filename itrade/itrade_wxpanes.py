@@ -49,12 +49,14 @@ from itrade_logging import *
 from itrade_local import message
 from itrade_matrix import *
 from itrade_quotes import *
+from itrade_import import dlgProgress
 from itrade_currency import currencies
+from itrade_screener import Screener,ScreenerError,columns,colname
 
 # iTrade wx system
 from itrade_wxquote import open_iTradeQuote
 from itrade_wxpropquote import open_iTradeQuoteProperty
-from itrade_wxutil import FontFromSize
+from itrade_wxutil import FontFromSize,iTradeError
 from itrade_wxlive import iTrade_wxLiveMixin,EVT_UPDATE_LIVE
 
 # ============================================================================
@@ -113,6 +115,12 @@ IDC_EMV = 10
 IDC_OVB = 11
 IDC_LAST = 12
 
+def _sv(x,format,none):
+    # string of a computed value, like the sv_xxx() of Quote
+    if x!=None:
+        return format % x
+    return none
+
 # ============================================================================
 # iTradeMatrixListCtrl
 # ============================================================================
@@ -523,6 +531,29 @@ class iTrade_MatrixPanel(wx.Panel,wxl.ColumnSorterMixin,iTrade_wxLiveMixin):
             self.refreshCurrencies()
         self.refreshList()
 
+    def updateLines(self,refreshLine,compute=None):
+        # update the quotes of all the lines at once (see updateQuotes), then
+        # compute (if any) and refresh each line
+        lines = []
+        for xline in range(0,self.m_maxlines):
+            key = self.m_list.GetItemData(xline)
+            quote = self.itemQuoteMap[key]
+            if quote:
+                lines.append((xline,quote))
+
+        if self.m_parent.hasFocus():
+            dlg = wx.ProgressDialog(message('main_refreshing'),"",self.m_maxlines,self,wx.PD_CAN_ABORT | wx.PD_APP_MODAL)
+            updateQuotes([quote for xline,quote in lines],progress=dlgProgress(dlg,self.m_maxlines,True))
+            dlg.Destroy()
+        else:
+            updateQuotes([quote for xline,quote in lines])
+
+        if compute:
+            compute()
+
+        for xline,quote in lines:
+            refreshLine(xline,True)
+
     def updateQuoteItems(self):
         op1 = (self.m_currentItem>=0) and (self.m_currentItem<self.m_maxlines)
         if op1:
@@ -713,21 +744,7 @@ class iTrade_MatrixPortfolioPanel(iTrade_MatrixPanel):
 
     # refresh all the portfolio
     def refreshList(self):
-        keepGoing = True
-        if self.m_parent.hasFocus():
-            dlg = wx.ProgressDialog(message('main_refreshing'),"",self.m_maxlines,self,wx.PD_CAN_ABORT | wx.PD_APP_MODAL)
-        else:
-            dlg = None
-
-        for xline in range(0,self.m_maxlines):
-            if keepGoing:
-                key = self.m_list.GetItemData(xline)
-                quote = self.itemQuoteMap[key]
-                if quote:
-                    if dlg:
-                        keepGoing = dlg.Update(xline,quote.name())
-                    quote.update()
-                    self.refreshPortfolioLine(xline,True)
+        self.updateLines(self.refreshPortfolioLine)
 
         self.m_portfolio.computeOperations()
         if self.m_sort_colasc:
@@ -736,9 +753,6 @@ class iTrade_MatrixPortfolioPanel(iTrade_MatrixPanel):
             key = 0
         self.refreshEvalLine(key)
 
-        if dlg:
-            dlg.Destroy()
-
     def OnLiveQuote(self,quote,xline):
         return self.refreshPortfolioLine(xline,True)
 
@@ -901,23 +915,7 @@ class iTrade_MatrixQuotesPanel(iTrade_MatrixPanel):
 
     # refresh all quotes
     def refreshList(self):
-        keepGoing = True
-        if self.m_parent.hasFocus():
-            dlg = wx.ProgressDialog(message('main_refreshing'),"",self.m_maxlines,self,wx.PD_CAN_ABORT | wx.PD_APP_MODAL)
-        else:
-            dlg = None
-
-        for xline in range(0,self.m_maxlines):
-            if keepGoing:
-                key = self.m_list.GetItemData(xline)
-                quote = self.itemQuoteMap[key]
-                if dlg:
-                    keepGoing = dlg.Update(xline,quote.name())
-                quote.update()
-                self.refreshQuoteLine(xline,True)
-
-        if dlg:
-            dlg.Destroy()
+        self.updateLines(self.refreshQuoteLine)
 
     def OnLiveQuote(self, quote, xline):
         return self.refreshQuoteLine(xline,True)
@@ -1108,23 +1106,7 @@ class iTrade_MatrixStopsPanel(iTrade_MatrixPanel):
 
     # refresh all the stop
     def refreshList(self):
-        keepGoing = True
-        if self.m_parent.hasFocus():
-            dlg = wx.ProgressDialog(message('main_refreshing'),"",self.m_maxlines,self,wx.PD_CAN_ABORT | wx.PD_APP_MODAL)
-        else:
-            dlg = None
-
-        for xline in range(0,self.m_maxlines):
-            if keepGoing:
-                key = self.m_list.GetItemData(xline)
-                quote = self.itemQuoteMap[key]
-                if dlg:
-                    keepGoing = dlg.Update(xline,quote.name())
-                quote.update()
-                self.refreshStopLine(xline,True)
-
-        if dlg:
-            dlg.Destroy()
+        self.updateLines(self.refreshStopLine)
 
     def OnLiveQuote(self,quote,xline):
         return self.refreshStopLine(xline,True)
@@ -1201,9 +1183,10 @@ class iTrade_MatrixIndicatorsPanel(iTrade_MatrixPanel):
             old = self.itemDataMap[key]
         else:
             old = None
+        ma20,ma50,ma100,rsi14,stoK,stoD = self.m_matrix.indicators(quote)
         self.itemDataMap[key] = ( quote.isin(),quote.ticker(),quote.nv_pru(xtype),\
-                                  quote.nv_ma(20),quote.nv_ma(50),quote.nv_ma(100),\
-                                  quote.nv_rsi(14),key,quote.nv_stoK(),\
+                                  ma20,ma50,ma100,\
+                                  rsi14,key,stoK,\
                                   key,key,key,\
                                   quote.nv_close()\
                                 )
@@ -1260,11 +1243,13 @@ class iTrade_MatrixIndicatorsPanel(iTrade_MatrixPanel):
                 color = quote.colorTrend()
             else:
                 color = QUOTE_NOCHANGE
-            self.m_list.SetStringItem(x,IDC_MA20,quote.sv_ma(20))
-            self.m_list.SetStringItem(x,IDC_MA50,quote.sv_ma(50))
-            self.m_list.SetStringItem(x,IDC_MA100,quote.sv_ma(100))
-            self.m_list.SetStringItem(x,IDC_RSI,quote.sv_rsi(14))
-            self.m_list.SetStringItem(x,IDC_STOCH,'%s (%s)' % (quote.sv_stoK(),quote.sv_stoD()))
+            # computed for all the lines at once (see TradingMatrix.compute)
+            ma20,ma50,ma100,rsi14,stoK,stoD = self.m_matrix.indicators(quote)
+            self.m_list.SetStringItem(x,IDC_MA20,_sv(ma20,"%3.3f"," ---.--- "))
+            self.m_list.SetStringItem(x,IDC_MA50,_sv(ma50,"%3.3f"," ---.--- "))
+            self.m_list.SetStringItem(x,IDC_MA100,_sv(ma100,"%3.3f"," ---.--- "))
+            self.m_list.SetStringItem(x,IDC_RSI,_sv(rsi14,"%3.3f"," ---.--- "))
+            self.m_list.SetStringItem(x,IDC_STOCH,'%s (%s)' % (_sv(stoK,"%3.2f"," ---.-- "),_sv(stoD,"%3.2f"," ---.-- ")))
 
             key = self.m_list.GetItemData(x)
 
@@ -1316,23 +1301,7 @@ class iTrade_MatrixIndicatorsPanel(iTrade_MatrixPanel):
 
     # refresh all indicators
     def refreshList(self):
-        keepGoing = True
-        if self.m_parent.hasFocus():
-            dlg = wx.ProgressDialog(message('main_refreshing'),"",self.m_maxlines,self,wx.PD_CAN_ABORT | wx.PD_APP_MODAL)
-        else:
-            dlg = None
-
-        for xline in range(0,self.m_maxlines):
-            if keepGoing:
-                key = self.m_list.GetItemData(xline)
-                quote = self.itemQuoteMap[key]
-                if dlg:
-                    keepGoing = dlg.Update(xline,quote.name())
-                quote.update()
-                self.refreshIndicatorLine(xline,True)
-
-        if dlg:
-            dlg.Destroy()
+        self.updateLines(self.refreshIndicatorLine,self.m_matrix.compute)
 
     def OnLiveQuote(self, quote, xline):
         quote.compute()
@@ -1406,6 +1375,125 @@ class iTrade_TradingPanel(wx.Panel):
     def refresh(self):
         pass
 
+# ============================================================================
+# iTrade_ScreenerPanel
+#
+# quotes matching a filter expression (see itrade_screener)
+# ============================================================================
+
+class iTrade_ScreenerPanel(wx.Panel):
+
+    def __init__(self,parent,wm,id,portfolio,matrix):
+        wx.Panel.__init__(self, parent, id)
+        self.m_parent = parent
+        self.m_wm = wm
+        self.m_portfolio = portfolio
+        self.m_matrix = matrix
+        self.m_screener = None
+        self.m_quotes = []
+
+        self.m_mustInit = True
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+
+        # expression
+        box = wx.BoxSizer(wx.HORIZONTAL)
+
+        label = wx.StaticText(self, -1, message('screener_expression'))
+        box.Add(label, 0, wx.ALIGN_CENTRE|wx.ALL, 5)
+
+        tID = wx.NewId()
+        self.editExpr = wx.TextCtrl(self, tID, itrade_config.screenerExpression, style = wx.TE_LEFT|wx.TE_PROCESS_ENTER)
+        wx.EVT_TEXT_ENTER(self, tID, self.OnScreen)
+        box.Add(self.editExpr, 1, wx.ALIGN_CENTRE|wx.ALL, 5)
+
+        btn = wx.Button(self, -1, message('screener_run'))
+        wx.EVT_BUTTON(self, btn.GetId(), self.OnScreen)
+        box.Add(btn, 0, wx.ALIGN_CENTRE|wx.ALL, 5)
+
+        sizer.AddSizer(box, 0, wx.GROW|wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+
+        # result
+        tID = wx.NewId()
+        self.m_list = iTradeMatrixListCtrl(self, tID,
+                                 style = wx.LC_REPORT | wx.SUNKEN_BORDER | wx.LC_SINGLE_SEL | wx.LC_VRULES | wx.LC_HRULES)
+        self.m_list.SetFont(FontFromSize(itrade_config.matrixFontSize))
+        wx.EVT_LIST_ITEM_ACTIVATED(self, tID, self.OnItemActivated)
+        sizer.Add(self.m_list, 1, wx.GROW|wx.ALL, 5)
+
+        self.SetSizer(sizer)
+        self.SetAutoLayout(True)
+
+    # ---[ Window Management ]-------------------------------------------------
+
+    def InitCurrentPage(self,bReset=True):
+        if bReset:
+            # update portfolio and matrix (just in case)
+            self.m_portfolio = self.m_parent.m_portfolio
+            self.m_matrix = self.m_parent.m_matrix
+
+        # refresh page content
+        self.refresh()
+
+    def DoneCurrentPage(self):
+        pass
+
+    def OnRefresh(self,e):
+        self.refresh()
+
+    def OnScreen(self,e):
+        expr = self.editExpr.GetValue().strip()
+        try:
+            if self.m_screener==None:
+                self.m_screener = Screener(expr)
+            else:
+                self.m_screener.setExpression(expr)
+        except ScreenerError,e:
+            iTradeError(self, message('screener_invalid') % e, message('screener_title'))
+            return
+        itrade_config.screenerExpression = expr
+        self.refresh()
+
+    def OnItemActivated(self, event):
+        x = event.m_itemIndex
+        if x>=0 and x<len(self.m_quotes):
+            open_iTradeQuote(self.m_wm,self.m_portfolio,self.m_quotes[x],0)
+
+    # ---[ Create page content ]-----------------------------------------------
+
+    def refresh(self):
+        self.m_list.ClearAll()
+        if self.m_screener==None:
+            self.m_quotes = []
+            return
+
+        wx.SetCursor(wx.HOURGLASS_CURSOR)
+        try:
+            self.m_quotes = self.m_screener.run()
+        except ScreenerError,e:
+            self.m_quotes = []
+            iTradeError(self, message('screener_invalid') % e, message('screener_title'))
+        wx.SetCursor(wx.STANDARD_CURSOR)
+
+        cols = columns(self.m_screener.m_node)
+        cols.sort()
+
+        self.m_list.InsertColumn(0, message('isin'), wx.LIST_FORMAT_LEFT, wx.LIST_AUTOSIZE)
+        self.m_list.InsertColumn(1, message('ticker'), wx.LIST_FORMAT_LEFT, wx.LIST_AUTOSIZE)
+        for c,eachCol in enumerate(cols):
+            self.m_list.InsertColumn(2+c, colname(eachCol), wx.LIST_FORMAT_RIGHT, wx.LIST_AUTOSIZE)
+        self.m_list.InsertColumn(2+len(cols), message('name'), wx.LIST_FORMAT_LEFT, wx.LIST_AUTOSIZE)
+
+        for x,eachQuote in enumerate(self.m_quotes):
+            self.m_list.InsertStringItem(x, eachQuote.isin())
+            self.m_list.SetStringItem(x, 1, eachQuote.ticker())
+            for c,eachCol in enumerate(cols):
+                self.m_list.SetStringItem(x, 2+c, '%.2f' % self.m_screener.value(eachQuote,*eachCol))
+            self.m_list.SetStringItem(x, 2+len(cols), eachQuote.name())
+
+        for c in range(3+len(cols)):
+            self.m_list.SetColumnWidth(c, wx.LIST_AUTOSIZE)
+
 # ============================================================================
 # That's all folks !
 # ============================================================================
@@ -353,10 +353,10 @@ class iTradePortfolioPropertiesDialog(iTradeSizedDialog):
         wx.EVT_COMBOBOX(self,self.wxIndicatorCtrl.GetId(),self.OnIndicator)
 
         count = 0
-        for eachCtrl in quotes.list():
-            if eachCtrl.list()==QLIST_INDICES:
-                self.wxIndicatorCtrl.Append(eachCtrl.name(),eachCtrl.isin())
-                if eachCtrl.isin()==self.m_indice:
+        for key,isin,name,ticker,market,place,qlist in quotes.records():
+            if qlist==QLIST_INDICES:
+                self.wxIndicatorCtrl.Append(name,isin)
+                if isin==self.m_indice:
                     idx = count
                 count = count + 1
 
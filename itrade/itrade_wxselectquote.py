@@ -263,18 +263,35 @@ class iTradeQuoteSelectorListCtrlDialog(iTradeSizedDialog, wxl.ColumnSorterMixin
         self.m_qlist = idx
         self.resetFields()
 
-    def isFiltered(self,quote,bDuringInit):
-        if (self.m_qlist == QLIST_ALL) or (self.m_qlist == quote.list() or self.m_filter):
+    def isFiltered(self,record,bDuringInit):
+        key,isin,name,ticker,market,place,qlist = record
+        if (self.m_qlist == QLIST_ALL) or (self.m_qlist == qlist or self.m_filter):
             # good list
-            if (not self.m_qlist_tradableOnly or quote.list() != QLIST_INDICES):
+            if (not self.m_qlist_tradableOnly or qlist != QLIST_INDICES):
                 # tradable
-                if (self.m_market==None) or (self.m_market == quote.market() or self.m_filter):
+                if (self.m_market==None) or (self.m_market == market or self.m_filter):
                     # good market
-                    if bDuringInit or ( quote.ticker().find(self.m_ticker,0)==0 and quote.isin().find(self.m_isin,0)==0 ):
+                    if bDuringInit or isin.find(self.m_isin,0)==0:
                         # begin the same
                         return True
         return False
 
+    def candidates(self,bDuringInit):
+        # records (key,isin,name,ticker,market,place,list) of all the quotes,
+        # or of the best matches of the ticker field (ticker, name or isin)
+        # while typing : the quotes are created only when selected
+        if self.m_filter:
+            # only the quotes of the matrix (already created) : no limit
+            lst = [(eachQuote.key(),eachQuote.isin(),eachQuote.name(),eachQuote.ticker(),eachQuote.market(),eachQuote.place(),eachQuote.list()) for eachQuote in quotes.materialized() if eachQuote.isMatrix()]
+            if bDuringInit or self.m_ticker=='':
+                return lst
+            matrix = dict([(eachRecord[0],True) for eachRecord in lst])
+            return [eachRecord for eachRecord in quotes.search(self.m_ticker,limit=0) if matrix.has_key(eachRecord[0])]
+        elif bDuringInit or self.m_ticker=='':
+            return quotes.records()
+        else:
+            return quotes.search(self.m_ticker,self.m_market)
+
     def PopulateList(self,bDuringInit=False):
         wx.SetCursor(wx.HOURGLASS_CURSOR)
 
@@ -292,13 +309,14 @@ class iTradeQuoteSelectorListCtrlDialog(iTradeSizedDialog, wxl.ColumnSorterMixin
         x = 0
 
         self.itemDataMap = {}
-        self.itemQuoteMap = {}
+        self.itemKeyMap = {}
         self.itemLineMap = {}
 
-        for eachQuote in quotes.list():
-            if (not self.m_filter or eachQuote.isMatrix()) and self.isFiltered(eachQuote,bDuringInit):
-                self.itemDataMap[x] = (eachQuote.isin(),eachQuote.ticker(),eachQuote.name(),eachQuote.place(),eachQuote.market())
-                self.itemQuoteMap[x] = eachQuote
+        for eachRecord in self.candidates(bDuringInit):
+            if self.isFiltered(eachRecord,bDuringInit):
+                key,isin,name,ticker,market,place,qlist = eachRecord
+                self.itemDataMap[x] = (isin,ticker,name,place,market)
+                self.itemKeyMap[x] = key
                 x = x + 1
 
         items = self.itemDataMap.items()
@@ -354,7 +372,7 @@ class iTradeQuoteSelectorListCtrlDialog(iTradeSizedDialog, wxl.ColumnSorterMixin
     def getQuoteOnTheLine(self,x):
         if x>=0:
             key = self.m_list.GetItemData(x)
-            quote = self.itemQuoteMap[key]
+            quote = quotes.lookupKey(self.itemKeyMap[key])
             #print 'getQuoteOnTheLine(%d) : returns key=%d quote=%s' % (x,key,quote.ticker())
             return quote
         else: